@@ -0,0 +1,84 @@
+"""
+应用操作（删除/移动文件）基准测试
+
+在临时文件夹中生成一批小文件并全部暂存为删除，分别用单线程逐个执行和多线程并行执行，
+比较"直接操作"和"备份"两种模式下的耗时，并校验执行结果一致。
+在网络共享或机械硬盘上，每个文件操作需要等待的时间更长，并行的效果更明显。
+
+用法:
+    python benchmarks/bench_apply.py [文件数量] [线程数] [临时文件夹]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import DatabaseManager
+from src.file_operations import FileOperations
+from src.image_loader import ImageLoader
+from src.recycle_store import OBJECTS_DIR_NAME
+
+
+def prepare(root, count):
+    """在root下创建图片文件夹和count个小文件，返回 (文件夹, 文件路径列表)"""
+    folder = os.path.join(root, "Image")
+    shutil.rmtree(folder, ignore_errors=True)
+    shutil.rmtree(f"{folder}-recycle", ignore_errors=True)
+    os.makedirs(folder)
+    paths = []
+    for i in range(count):
+        file_path = os.path.join(folder, f"{i:032X}_0.jpg")
+        with open(file_path, "wb") as f:
+            f.write(b"\xff\xd8" + os.urandom(256))
+        paths.append(file_path)
+    return folder, paths
+
+
+def run(root, count, workers, operation_mode):
+    """执行一次应用操作，返回 (耗时, 执行的操作数量, 失败数量, 是否删除了全部原文件)"""
+    folder, paths = prepare(root, count)
+    loader = ImageLoader()
+    loader.current_dir = folder
+    file_operations = FileOperations(DatabaseManager(), loader, max_workers=workers)
+    for file_path in paths:
+        file_operations.journal.stage(file_path, "delete", [(file_path, "delete")])
+
+    start = time.perf_counter()
+    success, result = file_operations.execute_operations(operation_mode)
+    elapsed = time.perf_counter() - start
+    if not success:
+        raise RuntimeError(result)
+    executed_files, _, _ = result
+    all_removed = not os.listdir(folder)
+    if operation_mode == "备份":
+        entries = [name for name in os.listdir(f"{folder}-recycle") if name != OBJECTS_DIR_NAME]
+        all_removed = all_removed and len(entries) == count
+    return elapsed, len(executed_files), len(file_operations.failed_files), all_removed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    root = sys.argv[3] if len(sys.argv) > 3 else tempfile.mkdtemp(prefix="qic_bench_")
+
+    print(f"文件数量: {count}，线程数: {workers}，临时文件夹: {root}")
+    try:
+        for operation_mode in ("直接操作", "备份"):
+            serial = run(root, count, 1, operation_mode)
+            parallel = run(root, count, workers, operation_mode)
+            print(f"[{operation_mode}]")
+            print(f"  逐个执行:  {serial[0]:8.2f} 秒  {count / serial[0]:10.0f} 个/秒")
+            print(f"  并行执行:  {parallel[0]:8.2f} 秒  {count / parallel[0]:10.0f} 个/秒")
+            print(f"  加速比:    {serial[0] / parallel[0]:8.2f}x")
+            print(f"  结果一致:  {serial[1:] == parallel[1:] == (count, 0, True)}")
+    finally:
+        if len(sys.argv) <= 3:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+操作记录写入基准测试
+
+在临时的磁盘数据库中分别用逐条提交（add_operation）和批量写入（queue_operation + flush）
+写入相同数量的操作记录，比较两者的耗时，并校验写入的记录一致。
+
+用法:
+    python benchmarks/bench_database.py [操作数量] [临时文件夹]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import DatabaseManager
+
+
+def make_operations(count):
+    """生成模拟的操作记录，每组一张保留、一张删除"""
+    root = os.path.join(os.sep, "QQ", "Image", "Group2")
+    return [
+        (os.path.join(root, f"{i // 1000:03X}", f"{i:032X}_{'0' if i % 2 else '720'}.jpg"),
+         "keep" if i % 2 else "delete")
+        for i in range(count)
+    ]
+
+
+def write_row_at_a_time(db, operations):
+    for file_path, action in operations:
+        db.add_operation(file_path, action)
+
+
+def write_batched(db, operations):
+    for file_path, action in operations:
+        db.queue_operation(file_path, action)
+    db.flush()
+
+
+def run(root, name, write, operations):
+    """在新的数据库文件中写入operations，返回 (耗时, 读回的记录)"""
+    db = DatabaseManager(os.path.join(root, f"{name}.db"))
+    start = time.perf_counter()
+    write(db, operations)
+    elapsed = time.perf_counter() - start
+    records = [(file_path, action) for file_path, action, _ in db.get_all_operations()]
+    db.close()
+    return elapsed, records
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    root = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp(prefix="qic_bench_")
+    operations = make_operations(count)
+
+    print(f"操作数量: {count}，临时文件夹: {root}")
+    try:
+        row_time, row_records = run(root, "row", write_row_at_a_time, operations)
+        batch_time, batch_records = run(root, "batch", write_batched, operations)
+    finally:
+        if len(sys.argv) <= 2:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(f"逐条提交:  {row_time:8.2f} 秒  {count / row_time:10.0f} 条/秒")
+    print(f"批量写入:  {batch_time:8.2f} 秒  {count / batch_time:10.0f} 条/秒")
+    print(f"加速比:    {row_time / batch_time:8.1f}x")
+    print(f"结果一致:  {row_records == batch_records == operations}")
+
+
+if __name__ == "__main__":
+    main()
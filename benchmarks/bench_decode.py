@@ -0,0 +1,90 @@
+"""
+图片解码基准测试
+
+生成一张JPEG测试图片，分别用旧的方式（解码原图后缩小到适应画布）和ImagePyramid.open（按适应画布需要的
+尺寸解码，JPEG在解码时直接缩小）显示适应画布的图片，比较两者的耗时、解码后保留的内存，
+以及适应画布的视图的像素差异。之后放大到原图尺寸，检查是否重新解码为原图。不需要显示窗口。
+
+用法:
+    python benchmarks/bench_decode.py [图片宽度] [图片高度] [画布宽度] [画布高度]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops
+
+from src.image_pyramid import ImagePyramid
+from src.image_viewer import fit_scale, render_region
+
+
+# 每种方式重复的次数，取平均耗时
+REPEAT = 5
+
+
+def make_jpeg(file_path, width, height):
+    """生成带渐变和轻微噪点的测试照片"""
+    gradient = Image.radial_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 16)
+    image = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    image.save(file_path, quality=90)
+
+
+def show_full(file_path, canvas_width, canvas_height):
+    """旧的方式：解码原图，再生成适应画布的视图"""
+    image = Image.open(file_path)
+    image.load()
+    pyramid = ImagePyramid(image)
+    scale = fit_scale(pyramid.size, canvas_width, canvas_height)
+    return pyramid, render_region(pyramid, scale, 0, 0, canvas_width, canvas_height)
+
+
+def show_reduced(file_path, canvas_width, canvas_height):
+    """按适应画布需要的尺寸解码，再生成适应画布的视图"""
+    pyramid = ImagePyramid.open(file_path, (canvas_width, canvas_height))
+    scale = fit_scale(pyramid.size, canvas_width, canvas_height)
+    return pyramid, render_region(pyramid, scale, 0, 0, canvas_width, canvas_height)
+
+
+def time_show(show, file_path, canvas_width, canvas_height):
+    """返回 (平均耗时, 最后一次的图像金字塔, 最后一次的视图)"""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        pyramid, rendered = show(file_path, canvas_width, canvas_height)
+    return (time.perf_counter() - start) / REPEAT, pyramid, rendered
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    canvas_width = int(sys.argv[3]) if len(sys.argv) > 3 else 800
+    canvas_height = int(sys.argv[4]) if len(sys.argv) > 4 else 600
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, "bench.jpg")
+        make_jpeg(file_path, width, height)
+        print(f"图片: {width}x{height} JPEG，画布: {canvas_width}x{canvas_height}")
+
+        full_time, full_pyramid, full_view = time_show(show_full, file_path, canvas_width, canvas_height)
+        reduced_time, pyramid, view = time_show(show_reduced, file_path, canvas_width, canvas_height)
+        max_diff = max(high for _, high in ImageChops.difference(full_view[0], view[0]).getextrema())
+
+        print(f"解码原图:      {full_time * 1000:8.1f} 毫秒  保留 {full_pyramid.nbytes / (1024 * 1024):6.1f} MB")
+        print(f"按画布尺寸解码: {reduced_time * 1000:8.1f} 毫秒  保留 {pyramid.nbytes / (1024 * 1024):6.1f} MB  "
+              f"缩小 {pyramid.base_factor} 倍解码")
+        print(f"加速比:        {full_time / reduced_time:8.1f}x")
+        print(f"适应画布的视图最大像素差: {max_diff}")
+
+        start = time.perf_counter()
+        pyramid.level_for(1.0)
+        redecode_time = time.perf_counter() - start
+        print(f"放大到原图尺寸: 重新解码 {redecode_time * 1000:.1f} 毫秒，第0层 "
+              f"{pyramid.levels[0].width}x{pyramid.levels[0].height}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+HashIndex 汉明距离查询基准测试
+
+比较多索引哈希表与逐一比较在相同数据上的查询耗时，并校验两者结果一致。
+
+用法:
+    python benchmarks/bench_hash_index.py [图片数量] [查询次数] [最大汉明距离]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.hash_index import HashIndex, brute_force_query
+
+
+def make_hashes(count, seed=0):
+    """生成随机哈希，其中约10%是其他哈希翻转少量比特得到的近似副本"""
+    rng = random.Random(seed)
+    values = {}
+    for i in range(count):
+        if values and rng.random() < 0.1:
+            value = values[rng.randrange(len(values))]
+            for _ in range(rng.randint(1, 8)):
+                value ^= 1 << rng.randrange(64)
+        else:
+            value = rng.getrandbits(64)
+        values[i] = value
+    return values
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    max_distance = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+
+    values = make_hashes(count)
+    query_keys = random.Random(1).sample(list(values), queries)
+
+    start = time.perf_counter()
+    index = HashIndex()
+    index.update(values.items())
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_results = [sorted(index.query(values[key], max_distance)) for key in query_keys]
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    brute_results = [sorted(brute_force_query(values, values[key], max_distance)) for key in query_keys]
+    brute_time = time.perf_counter() - start
+
+    assert index_results == brute_results, "索引查询结果与逐一比较不一致"
+
+    print(f"哈希数量: {count}, 查询次数: {queries}, 最大汉明距离: {max_distance}")
+    print(f"建立索引:   {build_time:.3f} 秒")
+    print(f"索引查询:   {index_time * 1000 / queries:.3f} 毫秒/次")
+    print(f"逐一比较:   {brute_time * 1000 / queries:.3f} 毫秒/次")
+    print(f"加速比:     {brute_time / index_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+ImageLoader 内存占用基准测试
+
+用相同的模拟扫描结果分别构建旧的元组列表表示和按列存储的ImageStore表示，
+比较两者常驻的内存大小，并校验展示的图片和分组一致。
+
+用法:
+    python benchmarks/bench_image_store.py [图片数量] [目录数量]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.image_loader import ImageLoader
+from src.utils import parse_image_name
+
+
+def make_batches(count, dir_count, batch_size=2000, seed=0):
+    """生成模拟的扫描批次，约70%的图片为成对出现的_0/_720文件"""
+    rng = random.Random(seed)
+    root = os.path.join(os.sep, "QQ", "Image", "Group2")
+    dirs = [os.path.join(root, f"{i:03X}", f"{rng.getrandbits(32):08X}") for i in range(dir_count)]
+    batch = []
+    produced = 0
+    while produced < count:
+        dir_path = dirs[rng.randrange(dir_count)]
+        if rng.random() < 0.35:
+            file_hash = f"{rng.getrandbits(128):032X}"
+            names = [f"{file_hash}_0.jpg", f"{file_hash}_720.jpg"]
+        else:
+            names = [f"{rng.getrandbits(128):032X}.png"]
+        for filename in names:
+            size = rng.randint(1000, 5 * 1024 * 1024)
+            mtime_ns = 1600000000 * 10 ** 9 + rng.getrandbits(40)
+            batch.append((os.path.join(dir_path, filename), size, filename, mtime_ns))
+            produced += 1
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_legacy(batches):
+    """按原来的方式保存：元组列表、分组字典嵌套字典，以及以完整路径为键的映射"""
+    image_files = []
+    image_groups = {}
+    group_positions = {}
+    path_groups = {}
+    for batch in batches:
+        for file_path, size, filename, _ in batch:
+            record = (file_path, size, filename)
+            parsed = parse_image_name(filename)
+            if not parsed:
+                image_files.append(record)
+                continue
+            file_hash, suffix = parsed
+            group_key = os.path.join(os.path.dirname(file_path), file_hash)
+            path_groups[file_path] = group_key
+            variants = image_groups.get(group_key)
+            if variants is None:
+                image_groups[group_key] = {suffix: record}
+                group_positions[group_key] = len(image_files)
+                image_files.append(record)
+                continue
+            variants[suffix] = record
+            if variants.get('0', (None, -1))[1] > variants.get('720', (None, -1))[1]:
+                image_files[group_positions[group_key]] = variants['0']
+            else:
+                image_files[group_positions[group_key]] = variants['720']
+    return image_files, image_groups, group_positions, path_groups
+
+
+def build_compact(batches):
+    """使用ImageLoader（按列存储）保存"""
+    loader = ImageLoader()
+    for batch in batches:
+        loader.add_images(batch)
+    return loader
+
+
+def measure(build, *args):
+    """返回 (构建结果, 常驻内存字节数, 耗时)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(*args)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    dir_count = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    legacy, legacy_bytes, legacy_time = measure(build_legacy, make_batches(count, dir_count))
+    legacy_files = [record[0] for record in legacy[0]]
+    del legacy
+
+    loader, compact_bytes, compact_time = measure(build_compact, make_batches(count, dir_count))
+    compact_files = [record[0] for record in loader.get_image_files()]
+
+    print(f"图片数量: {count}，目录数量: {dir_count}，展示图片: {len(compact_files)}")
+    print(f"元组列表:  {legacy_bytes / 1024 / 1024:8.1f} MB  构建 {legacy_time:.2f} 秒")
+    print(f"按列存储:  {compact_bytes / 1024 / 1024:8.1f} MB  构建 {compact_time:.2f} 秒")
+    print(f"内存减少:  {1 - compact_bytes / legacy_bytes:8.1%}")
+    print(f"结果一致:  {legacy_files == compact_files}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+进程池流水线基准测试
+
+用模拟的CPU密集任务分别在当前进程中和ProcessPipeline中处理相同的数据，比较两者的耗时并输出每个工作进程的吞吐量。
+之后让处理某些元素的工作进程直接退出（os._exit），检查流水线是否继续处理其余的数据块，
+退出的进程中的元素是否记为失败，以及其余结果是否与正常处理一致。
+
+用法:
+    python benchmarks/bench_pipeline.py [元素数量] [进程数量]
+"""
+
+import os
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pipeline import ProcessPipeline
+
+
+# 每个元素的模拟计算量
+WORK = 20000
+CHUNK_SIZE = 16
+
+
+def work_chunk(crash_items, chunk):
+    """模拟解码和哈希：对每个元素做固定量的计算，遇到crash_items中的元素时工作进程直接退出"""
+    results = []
+    for item in chunk:
+        if item in crash_items:
+            os._exit(1)
+        value = item
+        for i in range(WORK):
+            value = (value * 31 + i) & 0xFFFFFFFF
+        results.append((value, None))
+    return results
+
+
+def run(pipeline, items):
+    """运行流水线，返回 (耗时, {元素: 结果})"""
+    start = time.perf_counter()
+    results = dict(pipeline.run(items))
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    items = list(range(count))
+    print(f"元素数量: {count}，进程数量: {workers}")
+
+    serial_time, expected = run(ProcessPipeline(partial(work_chunk, ()), max_workers=1, chunk_size=CHUNK_SIZE), items)
+    pipeline = ProcessPipeline(partial(work_chunk, ()), max_workers=workers, chunk_size=CHUNK_SIZE)
+    pool_time, results = run(pipeline, items)
+    print(f"当前进程:  {serial_time:8.3f} 秒")
+    print(f"进程池:    {pool_time:8.3f} 秒  加速比 {serial_time / pool_time:.1f}x  结果一致: {results == expected}")
+    for pid, processed, rate in pipeline.get_worker_stats():
+        print(f"  进程 {pid}: {processed} 个, {rate:.0f} 个/秒")
+
+    # 两个数据块中的工作进程退出
+    crash_items = {count // 3, count * 2 // 3}
+    pipeline = ProcessPipeline(partial(work_chunk, crash_items), max_workers=workers, chunk_size=CHUNK_SIZE)
+    _, results = run(pipeline, items)
+    failed = {item for item, _ in pipeline.errors}
+    print(f"工作进程退出: 成功 {len(results)} 个, 失败 {len(failed)} 个")
+    print(f"  退出的元素记为失败: {crash_items <= failed}")
+    print(f"  全部元素都有结果或错误: {failed | set(results) == set(items)}")
+    print(f"  成功的结果一致: {all(expected[item] == value for item, value in results.items())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+清理规则基准测试
+
+用模拟的扫描结果构建ImageLoader，分别用numpy向量化计算和逐行计算试运行相同的清理规则
+（未保留的_0/_720版本、超过N天未修改、小于X KB），比较两者的耗时，并校验选中的文件和报告一致。
+GIF尺寸规则需要读取真实文件，不包含在内。
+
+用法:
+    python benchmarks/bench_policy.py [图片数量]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import cleanup_policy
+from src.cleanup_policy import CleanupPolicy
+from src.image_loader import ImageLoader
+
+
+NOW = 1700000000
+
+
+def make_images(count, seed=0):
+    """生成模拟的扫描结果，约70%的图片为成对出现的_0/_720文件，修改时间分布在两年内"""
+    rng = random.Random(seed)
+    root = os.path.join(os.sep, "QQ", "Image", "Group2")
+    images = []
+    while len(images) < count:
+        dir_path = os.path.join(root, f"{rng.randrange(256):02X}")
+        if rng.random() < 0.35:
+            file_hash = f"{rng.getrandbits(128):032X}"
+            names = [(f"{file_hash}_0.jpg", rng.randint(2000, 30000)),
+                     (f"{file_hash}_720.jpg", rng.randint(30000, 2 * 1024 * 1024))]
+        else:
+            names = [(f"{rng.getrandbits(128):032X}.png", rng.randint(500, 5 * 1024 * 1024))]
+        for filename, size in names:
+            mtime_ns = (NOW - rng.randrange(2 * 365 * 86400)) * 10 ** 9
+            images.append((os.path.join(dir_path, filename), size, filename, mtime_ns))
+    return images
+
+
+def run(policy, columns, vectorized):
+    """试运行规则，返回 (耗时, 结果)"""
+    numpy_module = cleanup_policy.np
+    if not vectorized:
+        cleanup_policy.np = None
+    try:
+        start = time.perf_counter()
+        result = policy.evaluate(columns, now=NOW)
+        return time.perf_counter() - start, result
+    finally:
+        cleanup_policy.np = numpy_module
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    loader = ImageLoader()
+    loader.begin_load(os.path.join(os.sep, "QQ", "Image", "Group2"))
+    loader.add_images(make_images(count))
+    columns = loader.get_columns()
+    policy = CleanupPolicy(delete_variants=True, max_age_days=365, min_size=4 * 1024)
+    print(f"图片数量: {count}，规则: {'、'.join(policy.get_rules())}")
+
+    row_time, row_result = run(policy, columns, vectorized=False)
+    print(f"逐行计算:  {row_time:8.3f} 秒")
+    if cleanup_policy.np is None:
+        print("未安装numpy，跳过向量化计算")
+        return
+    vector_time, vector_result = run(policy, columns, vectorized=True)
+    print(f"向量化:    {vector_time:8.3f} 秒")
+    print(f"加速比:    {row_time / vector_time:8.1f}x")
+
+    ops, report, total_size = vector_result
+    for label, rule_count, size in report:
+        print(f"  {label}: {rule_count} 个文件, {size / (1024 * 1024):.1f} MB")
+    print(f"  合计: {len(ops)} 个文件, {total_size / (1024 * 1024):.1f} MB")
+    print(f"结果一致:  {row_result == vector_result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+批量暂存基准测试
+
+用模拟的扫描结果构建ImageLoader，分别逐个调用keep_image和一次调用stage_bulk暂存相同的保留操作，
+比较两者的耗时，并校验暂存的操作一致、批量暂存的操作可以一次撤销。
+
+用法:
+    python benchmarks/bench_staging.py [图片数量]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.file_operations import FileOperations
+from src.image_loader import ImageLoader
+
+
+def make_images(count, seed=0):
+    """生成模拟的扫描结果，约70%的图片为成对出现的_0/_720文件"""
+    rng = random.Random(seed)
+    root = os.path.join(os.sep, "QQ", "Image", "Group2")
+    images = []
+    while len(images) < count:
+        dir_path = os.path.join(root, f"{rng.randrange(256):02X}")
+        if rng.random() < 0.35:
+            file_hash = f"{rng.getrandbits(128):032X}"
+            names = [f"{file_hash}_0.jpg", f"{file_hash}_720.jpg"]
+        else:
+            names = [f"{rng.getrandbits(128):032X}.png"]
+        for filename in names:
+            images.append((os.path.join(dir_path, filename), rng.randint(1000, 5 * 1024 * 1024), filename))
+    return images
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    loader = ImageLoader()
+    loader.begin_load(os.path.join(os.sep, "QQ", "Image", "Group2"))
+    loader.add_images(make_images(count))
+    paths = [record.file_path for record in loader.get_image_files()]
+    print(f"图片数量: {count}，保留展示的 {len(paths)} 张图片")
+
+    single = FileOperations(None, loader)
+    start = time.perf_counter()
+    for file_path in paths:
+        single.keep_image(file_path)
+    single_time = time.perf_counter() - start
+
+    bulk = FileOperations(None, loader)
+    start = time.perf_counter()
+    success, (keep_count, delete_count, _) = bulk.stage_bulk(paths, "keep")
+    bulk_time = time.perf_counter() - start
+
+    print(f"逐个暂存:  {single_time:8.3f} 秒")
+    print(f"批量暂存:  {bulk_time:8.3f} 秒  保留 {keep_count} 个, 删除 {delete_count} 个")
+    print(f"加速比:    {single_time / bulk_time:8.1f}x")
+    print(f"结果一致:  {success and single.get_pending_operations() == bulk.get_pending_operations()}")
+    bulk.undo_action()
+    print(f"一次撤销:  {bulk.get_operations_count() == 0}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+图片显示基准测试
+
+在不同缩放比例下分别用旧的方式（缩放整张图片）和ImageViewer.render_view（只缩放画布可见部分，
+缩小时从图像金字塔的层级重新采样）生成画布上显示的图片，比较两者的耗时和生成的位图大小，
+并比较可见部分的像素差异。缩放后整张图片超过内存上限时跳过旧的方式。
+之后模拟连续的滚轮缩放，比较每次都从原图重新采样和使用图像金字塔的平均耗时。不需要显示窗口。
+
+用法:
+    python benchmarks/bench_viewer.py [图片宽度] [图片高度] [画布宽度] [画布高度]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops
+
+from src.image_viewer import ImageViewer
+
+
+SCALES = (0.2, 1.0, 2.0, 5.0)
+# 模拟滚轮缩放的步数，每步缩放1.1倍
+WHEEL_STEPS = 30
+# 旧的方式中缩放后整张图片的内存上限
+FULL_RESIZE_LIMIT = 512 * 1024 * 1024
+
+
+def make_image(width, height):
+    """生成带渐变和细节的测试图片"""
+    gradient = Image.radial_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+
+
+def render_full(image, scale, offset_x, offset_y, canvas_width, canvas_height):
+    """旧的方式：缩放整张图片，返回 (缩放后的整张图片, 画布上的x坐标, 画布上的y坐标)"""
+    scaled_width = int(image.width * scale)
+    scaled_height = int(image.height * scale)
+    resized = image.resize((scaled_width, scaled_height), Image.LANCZOS)
+    x = (canvas_width - scaled_width) // 2 + offset_x
+    y = (canvas_height - scaled_height) // 2 + offset_y
+    return resized, x, y
+
+
+def render_from_original(viewer, canvas_width, canvas_height):
+    """只缩放可见部分，但总是从原图重新采样（不使用图像金字塔）"""
+    pyramid = viewer.pyramid
+    level_for = pyramid.level_for
+    pyramid.level_for = lambda scale: (pyramid.levels[0], 1)
+    try:
+        return viewer.render_view(canvas_width, canvas_height)
+    finally:
+        pyramid.level_for = level_for
+
+
+def time_wheel(viewer, render, canvas_width, canvas_height):
+    """从适应画布的缩放比例开始连续缩小再放大，返回每步的平均耗时"""
+    viewer.offset_x = viewer.offset_y = 0
+    viewer.scale = viewer.calculate_initial_scale(canvas_width, canvas_height)
+    # 第一次绘制生成需要的层级，不计入耗时
+    render(viewer, canvas_width, canvas_height)
+    start = time.perf_counter()
+    for step in range(WHEEL_STEPS):
+        viewer.scale = max(viewer.min_scale, viewer.scale / 1.1) if step < WHEEL_STEPS // 2 else viewer.scale * 1.1
+        render(viewer, canvas_width, canvas_height)
+    return (time.perf_counter() - start) / WHEEL_STEPS
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    canvas_width = int(sys.argv[3]) if len(sys.argv) > 3 else 800
+    canvas_height = int(sys.argv[4]) if len(sys.argv) > 4 else 600
+
+    image = make_image(width, height)
+    viewer = ImageViewer(None)
+    viewer.set_image(image)
+    print(f"图片: {width}x{height}，画布: {canvas_width}x{canvas_height}")
+
+    for scale in SCALES:
+        viewer.scale = scale
+        # 缩放比例为1时不使用偏移量
+        offset = 0 if scale == 1.0 else 100
+        viewer.offset_x = viewer.offset_y = offset
+
+        start = time.perf_counter()
+        visible, x, y = viewer.render_view(canvas_width, canvas_height)
+        crop_time = time.perf_counter() - start
+        line = f"缩放 {scale:4.1f}x  可见部分: {crop_time:7.3f} 秒 {visible.width}x{visible.height}"
+
+        full_bytes = int(width * scale) * int(height * scale) * 3
+        if full_bytes > FULL_RESIZE_LIMIT:
+            print(f"{line}  整张缩放: 跳过（需要 {full_bytes / (1024 * 1024):.0f} MB）")
+            continue
+        start = time.perf_counter()
+        resized, full_x, full_y = render_full(image, scale, offset, offset, canvas_width, canvas_height)
+        full_time = time.perf_counter() - start
+        expected = resized.crop((x - full_x, y - full_y, x - full_x + visible.width, y - full_y + visible.height))
+        max_diff = max(high for _, high in ImageChops.difference(expected, visible).getextrema())
+        print(f"{line}  整张缩放: {full_time:7.3f} 秒 {resized.width}x{resized.height}  最大像素差: {max_diff}")
+
+    original_time = time_wheel(viewer, render_from_original, canvas_width, canvas_height)
+    pyramid_time = time_wheel(
+        viewer, lambda viewer, width, height: viewer.render_view(width, height), canvas_width, canvas_height
+    )
+    print(f"滚轮缩放 {WHEEL_STEPS} 步，平均每步:")
+    print(f"  从原图重新采样:  {original_time * 1000:8.1f} 毫秒")
+    print(f"  使用图像金字塔:  {pyramid_time * 1000:8.1f} 毫秒  已生成 {len(viewer.pyramid.levels)} 层, "
+          f"{viewer.pyramid.nbytes / (1024 * 1024):.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from tkinter import ttk
+import multiprocessing
 import os
+import time
 import tkinter as tk
 from PIL import Image
 
@@ -16,7 +18,27 @@ def load_config():
     
     # 默认配置
     default_config = {
-        "INIT_WARNING": True
+        "INIT_WARNING": True,
+        "RECURSIVE_SCAN": False,
+        "SCAN_MAX_DEPTH": -1,
+        "SCAN_EXCLUDE": "",
+        "SCAN_INDEX": True,
+        "SIMILAR_HASH_METHOD": "dhash",
+        "SIMILAR_MAX_DISTANCE": 6,
+        "HASH_WORKERS": 0,
+        "APPLY_WORKERS": 8,
+        "APPLY_JOURNAL": True,
+        "RECYCLE_MANIFEST": True,
+        "ARCHIVE_PACK_MB": 256,
+        "POLICY_DELETE_VARIANTS": True,
+        "POLICY_MAX_AGE_DAYS": 0,
+        "POLICY_MIN_SIZE_KB": 0,
+        "POLICY_MAX_SIZE_MB": 0,
+        "POLICY_GIF_MIN_WIDTH": 0,
+        "POLICY_GIF_MIN_HEIGHT": 0,
+        "VIEW_CACHE_MB": 256,
+        "PREFETCH_AHEAD": 2,
+        "PREFETCH_BEHIND": 1
     }
     
     # 检查配置文件是否存在
@@ -42,7 +64,12 @@ def load_config():
                         config[key] = True
                     elif value.lower() == 'false':
                         config[key] = False
-                    # 其他类型暂不处理，保持默认值
+                    # 整数值
+                    elif value.lstrip('-').isdigit():
+                        config[key] = int(value)
+                    # 其他值按字符串保存
+                    else:
+                        config[key] = value
     except Exception as e:
         print(f"读取配置文件错误: {e}")
     
@@ -76,10 +103,17 @@ except ImportError:
     input("按回车键退出...")
     exit()
 
-from src import DatabaseManager, UIManager, ImageLoader, ImageViewer, FileOperations
+from src import DatabaseManager, UIManager, ImageLoader, ImageViewer, FileOperations, BackgroundTask, ScanIndex
+from src import ApplyJournal, RecycleManifest
+from src import DuplicateFinder, NearDuplicateFinder, CleanupPolicy, ImagePrefetcher
+from src.perceptual_hash import require_numpy
 from src.utils import format_file_size
 
 
+# 撤销或重做时逐个记录文件的最大数量，超过时只记录数量
+LOG_OPS_LIMIT = 50
+
+
 class QQImageCleaner:
     """QQ缓存图片清理工具主类"""
 
@@ -97,38 +131,77 @@ class QQImageCleaner:
         # 初始化当前索引
         self.current_index = 0
         
+        # 后台加载任务
+        self.load_task = None
+        self.group_task = None
+        self.apply_task = None
+        # 相似图片查找器，保存当前文件夹的感知哈希索引
+        self.similar_finder = None
+        # 用户选择暂不处理的未完成应用
+        self.deferred_applies = set()
+        
         # 初始化各个模块
-        self.db_manager = DatabaseManager()
-        self.image_loader = ImageLoader()
-        self.file_operations = FileOperations(self.db_manager, self.image_loader)
+        # 已执行的操作历史保存在运行目录下
+        self.db_manager = DatabaseManager(os.path.join(os.getcwd(), "qic_history.db"))
+        # 持久化扫描索引，保存在运行目录下，再次打开同一文件夹时只重新扫描有变化的目录
+        self.scan_index = None
+        if config.get("SCAN_INDEX", True):
+            self.scan_index = ScanIndex(os.path.join(os.getcwd(), "qic_index.db"))
+        self.image_loader = ImageLoader(self.scan_index)
+        # 持久化应用日志，程序在应用过程中退出后，下次启动时可继续执行或从备份文件夹恢复
+        self.apply_journal = None
+        if config.get("APPLY_JOURNAL", True):
+            self.apply_journal = ApplyJournal(os.path.join(os.getcwd(), "qic_apply.db"))
+        # 备份文件夹清单，记录每次应用移动的文件，应用后仍可撤销
+        self.recycle_manifest = None
+        if config.get("RECYCLE_MANIFEST", True):
+            self.recycle_manifest = RecycleManifest(os.path.join(os.getcwd(), "qic_recycle.db"))
+        # APPLY_WORKERS为并行删除/移动文件的线程数，ARCHIVE_PACK_MB为归档模式下单个压缩包的大小上限
+        self.file_operations = FileOperations(
+            self.db_manager, self.image_loader, max_workers=config.get("APPLY_WORKERS", 8),
+            apply_journal=self.apply_journal, recycle_manifest=self.recycle_manifest,
+            pack_size=config.get("ARCHIVE_PACK_MB", 256) * 1024 * 1024
+        )
         
         # 创建UI管理器，传入回调函数
         callbacks = {
             'browse_folder': self.browse_folder,
+            'find_duplicates': self.find_duplicates,
+            'find_similar': self.find_similar,
+            'apply_cleanup_policy': self.apply_cleanup_policy,
+            'cancel_task': self.cancel_task,
             'prev_image': self.prev_image,
             'next_image': self.next_image,
             'keep_image': self.keep_image,
             'delete_image': self.delete_image,
             'undo_action': self.undo_action,
+            'redo_action': self.redo_action,
             'apply_operations': self.apply_operations
         }
         self.ui = UIManager(root, callbacks)
         
         # 创建图片查看器
         canvas = self.ui.get_widget('canvas')
-        self.image_viewer = ImageViewer(canvas)
+        # VIEW_CACHE_MB为缓存已解码图片及其缩小层级的内存上限
+        self.image_viewer = ImageViewer(canvas, cache_bytes=config.get("VIEW_CACHE_MB", 256) * 1024 * 1024)
+        # 在后台预先解码前后的图片，切换图片时不必等待读取和解码
+        self.prefetcher = ImagePrefetcher()
         
         # 绑定画布事件
         self.ui.bind_canvas_events(
             self.image_viewer.on_mouse_wheel,
             self.image_viewer.on_mouse_down,
             self.image_viewer.on_mouse_drag,
-            self.image_viewer.on_mouse_up
+            self.image_viewer.on_mouse_up,
+            self.image_viewer.on_configure
         )
         
         # 绑定快捷键
         self.ui.bind_shortcuts()
         
+        # 根据配置设置默认扫描方式
+        self.ui.set_recursive_scan(config.get("RECURSIVE_SCAN", False))
+        
         # 绑定窗口关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -140,41 +213,357 @@ class QQImageCleaner:
             self.load_images()
 
     def load_images(self):
-        """加载并处理图片"""
+        """在后台线程中加载图片，扫描到的图片分批显示，无需等待整个文件夹扫描完成"""
+        if self._is_applying():
+            return
+        
         folder_path = self.ui.get_path()
         
-        success, result = self.image_loader.load_images_from_folder(folder_path)
+        if not folder_path or not os.path.exists(folder_path):
+            self.ui.show_error("错误", "请选择有效的文件夹路径")
+            return
+        
+        # 取消正在进行的加载任务
+        if self.load_task and self.load_task.is_running():
+            self.load_task.cancel()
+        
+        # 递归扫描参数：SCAN_MAX_DEPTH小于0表示不限制深度，SCAN_EXCLUDE为逗号分隔的文件夹名称或通配符
+        max_depth = config.get("SCAN_MAX_DEPTH", -1)
+        exclude = [p.strip() for p in str(config.get("SCAN_EXCLUDE", "")).split(',') if p.strip()]
+        scan_options = {
+            'recursive': self.ui.is_recursive_scan(),
+            'max_depth': max_depth if max_depth >= 0 else None,
+            'exclude': exclude
+        }
+        
+        self.image_loader.begin_load(folder_path)
+        self.similar_finder = None
+        # 丢弃之前文件夹中预取和缓存的图片
+        self.prefetcher.clear()
+        self.image_viewer.evict_all()
+        self.current_index = 0
+        self.ui.log_message(f"开始加载文件夹: {folder_path}")
+        self.show_current_image()
+        
+        task = BackgroundTask(self.root, self._scan_worker)
+        task.on_message = lambda batch: self._on_images_batch(task, batch)
+        task.on_done = lambda success, result: self._on_load_finished(task, success, result)
+        self.load_task = task
+        task.start(folder_path, scan_options)
+
+    def _scan_worker(self, task, folder_path, scan_options):
+        """后台线程：扫描文件夹并分批发送图片记录
+        
+        Returns:
+            bool: 扫描是否完整结束（被取消时返回False）
+        """
+        batches = self.image_loader.iter_scan_batches(folder_path, **scan_options)
+        try:
+            for batch in batches:
+                if task.is_cancelled():
+                    return False
+                task.post(batch)
+        except OSError as e:
+            raise Exception(f"无法读取文件夹内容: {e}")
+        finally:
+            batches.close()
+        return True
+
+    def _on_images_batch(self, task, batch):
+        """主线程：合并一批新扫描到的图片并刷新显示"""
+        if task is not self.load_task or task.is_cancelled():
+            return
+        
+        was_empty = self.image_loader.get_image_count() == 0
+        _, replaced_indices, regrouped = self.image_loader.add_images(batch)
+        
+        # 后到的_0/_720文件加入已暂存操作的分组时，补充暂存删除操作
+        if regrouped and self.file_operations.get_operations_count():
+            groups = [(self.image_loader.find_related_images(new_path), [new_path]) for _, new_path in regrouped]
+            for op_path, _ in self.file_operations.reconcile_groups(groups):
+                self.ui.log_message(f"暂存删除: {os.path.basename(op_path)} (分组补充)")
+            self.ui.update_pending_label(self.file_operations.get_operations_count())
+        
+        # 第一批到达或当前图片被同组更大的文件替换时重新显示，否则只更新计数
+        if was_empty or self.current_index in replaced_indices:
+            self.show_current_image()
+        else:
+            self._update_image_label()
+
+    def _on_load_finished(self, task, success, result):
+        """主线程：加载任务结束后输出统计信息"""
+        if task is not self.load_task:
+            return
         
         if not success:
             self.ui.show_error("错误", result)
+        elif not result:
+            self.ui.log_message("加载已取消")
+        else:
+            count = self.image_loader.get_image_count()
+            self.ui.log_message(f"加载完成，共找到 {count} 个图片组")
+            
+            # 记录扫描吞吐量
+            stats = self.image_loader.get_scan_stats()
+            self.ui.log_message(
+                f"扫描 {stats['entries']} 个目录项，用时 {stats['elapsed']:.2f} 秒 "
+                f"({stats['rate']:.0f} 项/秒)"
+            )
+            if stats['dirs_cached']:
+                self.ui.log_message(f"{stats['dirs_cached']}/{stats['dirs']} 个目录未变化，使用扫描索引")
+            
+            # 记录跳过的文件
+            skipped_files = self.image_loader.scanner.skipped_files
+            if skipped_files:
+                self.ui.log_message("以下文件因错误被跳过:")
+                for filename, error in skipped_files:
+                    self.ui.log_message(f"  - {filename}: {error}")
+        
+        self._update_image_label()
+
+    def _update_image_label(self):
+        """更新图片索引标签，加载过程中附加提示"""
+        count = self.image_loader.get_image_count()
+        text = f"{self.current_index + 1}/{count}" if count else "0/0"
+        if self.load_task and self.load_task.is_running():
+            text += " (加载中...)"
+        self.ui.update_image_label(text)
+
+    def find_duplicates(self):
+        """在后台查找内容完全相同的图片，并合并到图片分组中"""
+        def search(task, images):
+            finder = DuplicateFinder()
+            groups = finder.find_duplicates(
+                images,
+                is_cancelled=task.is_cancelled,
+                progress=lambda stage, count: task.post(f"{stage}: {count} 个文件")
+            )
+            return groups, finder.skipped_files
+        
+        self._start_group_search("内容相同", "content", search)
+
+    def find_similar(self):
+        """在后台计算感知哈希，查找缩放或重新压缩过的相似图片，并合并到图片分组中"""
+        try:
+            require_numpy()
+        except ImportError as e:
+            self.ui.show_error("错误", str(e))
             return
         
-        count, skipped_files = result
-        self.current_index = 0
-        self.ui.log_message(f"开始加载文件夹: {folder_path}")
-        self.ui.log_message(f"加载完成，共找到 {count} 个图片组")
+        method = config.get("SIMILAR_HASH_METHOD", "dhash")
+        max_distance = config.get("SIMILAR_MAX_DISTANCE", 6)
+        
+        # 同一文件夹复用哈希索引，再次查找时只计算新增的图片
+        folder_path = self.image_loader.get_current_dir()
+        finder = self.similar_finder
+        if not finder or finder.folder_path != folder_path or finder.method != method:
+            try:
+                # HASH_WORKERS为解码图片的进程数量，0表示使用CPU核心数
+                workers = config.get("HASH_WORKERS", 0)
+                finder = NearDuplicateFinder(
+                    method, self.scan_index, folder_path, max_workers=workers if workers > 0 else None
+                )
+            except ValueError as e:
+                self.ui.show_error("错误", str(e))
+                return
+            self.similar_finder = finder
+        
+        def search(task, images):
+            hashed = finder.update(
+                images,
+                is_cancelled=task.is_cancelled,
+                progress=lambda done, total: task.post(f"感知哈希: {done}/{total}")
+            )
+            task.post(f"新计算 {hashed} 个图片的哈希，索引中共 {len(finder.index)} 个")
+            for pid, count, rate in finder.hasher.worker_stats:
+                task.post(f"  进程 {pid}: {count} 张, {rate:.0f} 张/秒")
+            return finder.find_groups(images, max_distance), finder.skipped_files
+        
+        self._start_group_search("相似", "similar", search)
+
+    def _start_group_search(self, description, kind, search):
+        """在后台运行分组查找任务，完成后把结果合并到图片分组中
+        
+        Args:
+            description: 日志中的描述，如"内容相同"
+            kind: 分组类型，如"content"
+            search: 在工作线程中执行的函数 search(task, images)，返回 (分组字典, 跳过的文件列表)
+        """
+        if self._is_applying():
+            return
         
-        # 记录跳过的文件
+        if self.load_task and self.load_task.is_running():
+            self.ui.show_info("提示", "请等待图片加载完成")
+            return
+        if self.group_task and self.group_task.is_running():
+            return
+        if not self.image_loader.get_image_count():
+            return
+        
+        images = self.image_loader.get_all_images()
+        load_task = self.load_task
+        
+        def on_done(success, result):
+            # 查找期间重新加载了文件夹，结果已失效
+            if self.load_task is not load_task:
+                return
+            if task.is_cancelled():
+                self.ui.log_message(f"已取消查找{description}的图片")
+                return
+            self._on_groups_found(description, kind, success, result)
+        
+        self.ui.log_message(f"开始查找{description}的图片，共 {len(images)} 个文件")
+        task = BackgroundTask(
+            self.root, lambda task: search(task, images), on_message=self.ui.log_message, on_done=on_done
+        )
+        self.group_task = task
+        task.start()
+
+    def cancel_task(self):
+        """取消正在进行的加载或查找任务"""
+        for task in (self.load_task, self.group_task, self.apply_task):
+            if task and task.is_running() and not task.is_cancelled():
+                task.cancel()
+                self.ui.log_message("正在取消...")
+
+    def _on_groups_found(self, description, kind, success, result):
+        """主线程：把查找到的分组合并到图片分组中"""
+        if not success:
+            self.ui.show_error("错误", f"查找{description}图片失败: {result}")
+            return
+        
+        groups, skipped_files = result
         if skipped_files:
             self.ui.log_message("以下文件因错误被跳过:")
             for filename, error in skipped_files:
                 self.ui.log_message(f"  - {filename}: {error}")
         
-        # 显示第一张图片
+        current_info = self.image_loader.get_image_info(self.current_index)
+        hidden = self.image_loader.merge_groups(groups, kind)
+        file_count = sum(len(records) for records in groups.values())
+        self.ui.log_message(
+            f"发现 {len(groups)} 组{description}的图片（{file_count} 个文件），"
+            f"{hidden} 张图片已合并到分组中"
+        )
+        
+        # 尽量保持当前显示的图片
+        self._relocate_current(current_info[0] if current_info else None)
         self.show_current_image()
 
+    def apply_cleanup_policy(self):
+        """按配置中的清理规则在后台试运行，列出每条规则的文件数量和可释放空间，确认后一次暂存全部删除操作"""
+        if self._is_applying():
+            return
+
+        if self.load_task and self.load_task.is_running():
+            self.ui.show_info("提示", "请等待图片加载完成")
+            return
+        if self.group_task and self.group_task.is_running():
+            return
+        if not self.image_loader.get_image_count():
+            return
+
+        # POLICY_GIF_MIN_WIDTH和POLICY_GIF_MIN_HEIGHT都大于0时删除宽和高都小于该尺寸的GIF
+        gif_width = config.get("POLICY_GIF_MIN_WIDTH", 0)
+        gif_height = config.get("POLICY_GIF_MIN_HEIGHT", 0)
+        policy = CleanupPolicy(
+            delete_variants=config.get("POLICY_DELETE_VARIANTS", True),
+            max_age_days=config.get("POLICY_MAX_AGE_DAYS", 0),
+            min_size=config.get("POLICY_MIN_SIZE_KB", 0) * 1024,
+            max_size=config.get("POLICY_MAX_SIZE_MB", 0) * 1024 * 1024,
+            gif_min_size=(gif_width, gif_height) if gif_width > 0 and gif_height > 0 else None
+        )
+        if policy.is_empty():
+            self.ui.show_info("规则清理", "未启用任何清理规则，请在配置文件qic_config中设置POLICY_开头的配置项")
+            return
+
+        # 已暂存操作的文件以用户的选择为准，不受规则影响
+        columns = self.image_loader.get_columns()
+        skip_paths = set()
+        if not self.file_operations.applied:
+            skip_paths = {op_path for op_path, _ in self.file_operations.get_pending_operations()}
+        load_task = self.load_task
+
+        def search(task):
+            return policy.evaluate(columns, skip_paths, is_cancelled=task.is_cancelled), policy.skipped_files
+
+        def on_done(success, result):
+            if self.load_task is not load_task:
+                return
+            if task.is_cancelled():
+                self.ui.log_message("已取消规则清理")
+                return
+            self._on_policy_evaluated(success, result)
+
+        self.ui.log_message(f"开始按规则查找要删除的文件: {'、'.join(policy.get_rules())}")
+        task = BackgroundTask(self.root, search, on_message=self.ui.log_message, on_done=on_done)
+        self.group_task = task
+        task.start()
+
+    def _on_policy_evaluated(self, success, result):
+        """主线程：输出试运行报告，用户确认后把选中的文件作为一个操作组暂存删除"""
+        if not success:
+            self.ui.show_error("错误", f"规则清理失败: {result}")
+            return
+
+        (ops, report, total_size), skipped_files = result
+        if skipped_files:
+            self.ui.log_message("以下文件因错误被跳过:")
+            for filename, error in skipped_files:
+                self.ui.log_message(f"  - {filename}: {error}")
+
+        lines = [f"{label}: {count} 个文件, {format_file_size(size)}" for label, count, size in report]
+        self.ui.log_message("规则清理试运行结果:")
+        for line in lines:
+            self.ui.log_message(f"  {line}")
+        self.ui.log_message(f"  合计: {len(ops)} 个文件, {format_file_size(total_size)}")
+        if not ops:
+            self.ui.show_info("规则清理", "没有符合规则的文件")
+            return
+
+        message = "\n".join(lines)
+        message += f"\n\n合计: {len(ops)} 个文件, 可释放 {format_file_size(total_size)}"
+        message += "\n（同一文件满足多条规则时只计算一次）\n\n确定暂存这些删除操作吗？"
+        if not self.ui.show_confirm("规则清理", message):
+            self.ui.log_message("规则清理仅试运行，未暂存操作")
+            return
+
+        # 试运行期间用户可能暂存了新的操作
+        if not self.file_operations.applied:
+            ops = [op for op in ops if op[0] not in self.file_operations.journal]
+        success, result = self.file_operations.stage_operations(ops)
+        if success:
+            self.ui.log_message(f"暂存删除: {len(ops)} 个文件 (规则清理)")
+            self.ui.update_pending_label(self.file_operations.get_operations_count())
+        else:
+            self.ui.show_error("错误", f"规则清理失败: {result}")
+
+    def _relocate_current(self, file_path):
+        """图片列表变化后重新定位当前索引
+        
+        Args:
+            file_path: 之前显示的图片路径，找不到时保持索引并确保不越界
+        """
+        index = self.image_loader.index_of(file_path) if file_path else None
+        if index is not None:
+            self.current_index = index
+            return
+        count = self.image_loader.get_image_count()
+        if self.current_index >= count:
+            self.current_index = max(count - 1, 0)
+
     def show_current_image(self):
         """显示当前图片"""
         image_files = self.image_loader.get_image_files()
         
         if not image_files:
             self.image_viewer.clear()
-            self.ui.update_image_label("0/0")
+            self._update_image_label()
             self.ui.update_file_info_label("")
             return
         
         # 更新当前图片索引显示
-        self.ui.update_image_label(f"{self.current_index + 1}/{len(image_files)}")
+        self._update_image_label()
         
         # 获取当前图片信息
         image_info = self.image_loader.get_image_info(self.current_index)
@@ -188,28 +577,39 @@ class QQImageCleaner:
         self.ui.update_file_info_label(f"文件名: {filename} | 大小: {size_mb:.2f} MB")
         
         try:
-            # 加载图片
-            image = Image.open(file_path)
+            # 把后台预取完成的图片放入查看器的缓存，当前图片正在预取时等待其完成
+            for key, pyramid in self.prefetcher.collect(wait_for=file_path).items():
+                self.image_viewer.cache_image(key, pyramid)
             
-            # 设置图片到查看器
-            self.image_viewer.set_image(image)
-            
-            # 计算初始缩放比例
-            canvas = self.ui.get_widget('canvas')
-            initial_scale = self.image_viewer.calculate_initial_scale(
-                canvas.winfo_width(),
-                canvas.winfo_height()
-            )
-            self.image_viewer.scale = initial_scale
+            # 未缓存时按适应画布的尺寸解码图片
+            self.image_viewer.open_image(file_path)
             
-            # 绘制图片
-            self.image_viewer.draw_image()
+            # 按适应画布的缩放比例绘制图片
+            self.image_viewer.fit_to_canvas()
             
         except Exception as e:
             self.ui.log_message(f"无法显示图片 {filename}: {e}")
             self.image_viewer.clear()
             canvas = self.ui.get_widget('canvas')
             canvas.create_text(100, 100, text=f"无法显示图片\n{filename}", anchor=tk.NW)
+        
+        self._prefetch_neighbors()
+
+    def _prefetch_neighbors(self):
+        """在后台预先解码当前图片之后PREFETCH_AHEAD张和之前PREFETCH_BEHIND张图片"""
+        count = self.image_loader.get_image_count()
+        ahead = config.get("PREFETCH_AHEAD", 2)
+        behind = config.get("PREFETCH_BEHIND", 1)
+        indices = list(range(self.current_index + 1, min(self.current_index + 1 + ahead, count)))
+        indices += range(self.current_index - 1, max(self.current_index - 1 - behind, -1), -1)
+        
+        paths = []
+        for index in indices:
+            file_path = self.image_loader.get_image_info(index)[0]
+            if file_path not in self.image_viewer.pyramids:
+                paths.append(file_path)
+        canvas = self.ui.get_widget('canvas')
+        self.prefetcher.request(paths, (canvas.winfo_width(), canvas.winfo_height()))
 
     def prev_image(self):
         """显示上一张图片"""
@@ -226,6 +626,9 @@ class QQImageCleaner:
 
     def keep_image(self):
         """保留当前图片（暂存操作）"""
+        if self._is_applying():
+            return
+        
         image_info = self.image_loader.get_image_info(self.current_index)
         if not image_info:
             return
@@ -258,6 +661,9 @@ class QQImageCleaner:
 
     def delete_image(self):
         """删除当前图片（暂存操作）"""
+        if self._is_applying():
+            return
+        
         image_info = self.image_loader.get_image_info(self.current_index)
         if not image_info:
             return
@@ -286,42 +692,126 @@ class QQImageCleaner:
             self.ui.show_error("错误", f"删除图片失败: {result}")
 
     def undo_action(self):
-        """撤销上一次暂存的操作"""
+        """撤销上一次暂存的操作；操作已应用时，把上次应用移动到备份文件夹的文件移回原位置"""
+        if self._is_applying():
+            return
+        
+        if self.file_operations.applied:
+            self.restore_last_apply()
+            return
+        
         success, result = self.file_operations.undo_action()
         
         if success:
-            file_path, action, undone_ops = result
+            _, _, undone_ops = result
             
             # 记录所有被撤销的操作
-            related_files = []
-            for op_path, op_action in undone_ops:
-                related_files.append(op_path)
-                action_name = "删除" if op_action == "delete" else "保留"
-                self.ui.log_message(f"撤销{action_name}操作: {os.path.basename(op_path)}")
-            
-            self.ui.update_pending_label(self.file_operations.get_operations_count())
+            self._log_ops("撤销", undone_ops)
             
-            # 定位到被撤销操作的图片
-            image_files = self.image_loader.get_image_files()
-            target_path = file_path
+            self._show_operation_target(undone_ops)
+        else:
+            self.ui.show_error("错误", result)
+
+    def redo_action(self):
+        """重做上一次撤销的操作"""
+        if self._is_applying():
+            return
+        
+        success, result = self.file_operations.redo_action()
+        
+        if success:
+            _, _, redone_ops = result
             
-            # 尝试找到第一个在图片列表中的文件
-            for op_path, _ in undone_ops:
-                for i, (img_path, _, _) in enumerate(image_files):
-                    if img_path == op_path:
-                        self.current_index = i
-                        target_path = op_path
-                        break
-                if target_path != file_path:
-                    break
+            self._log_ops("重做", redone_ops)
             
-            # 显示图片
-            self.show_current_image()
+            self._show_operation_target(redone_ops)
         else:
             self.ui.show_error("错误", result)
 
+    def restore_last_apply(self):
+        """在后台把上次应用移动到备份文件夹的文件移回原位置，并重新加入图片列表"""
+        restore_count = self.file_operations.get_last_batch_count()
+        if not restore_count:
+            self.ui.show_error("错误", "操作已应用，无法撤销")
+            return
+        if not self.ui.show_confirm(
+            "撤销应用", f"确定要把上次应用移动到备份文件夹的 {restore_count} 个文件移回原位置吗？"
+        ):
+            return
+        
+        batch_id = self.file_operations.last_batch_id
+        
+        def work(is_cancelled, progress):
+            return self.file_operations.restore_recycled(batch_id, is_cancelled=is_cancelled, progress=progress)
+        
+        self.ui.log_message(f"开始恢复 {restore_count} 个文件")
+        self._start_apply_task("恢复文件", restore_count, work, self._on_files_restored)
+
+    def _on_files_restored(self, task, success, result):
+        """主线程：恢复文件结束后把恢复的图片重新加入图片列表"""
+        self.ui.reset_progress()
+        if success:
+            success, result = result
+        if not success:
+            self.ui.show_error("错误", f"恢复文件失败: {result}")
+            return
+        
+        restored_files, skipped_files = result
+        # 只有当前文件夹中的图片需要重新加入列表
+        current_dir = self.image_loader.get_current_dir()
+        if current_dir:
+            prefix = os.path.join(current_dir, "")
+            images = [
+                (file_path, size, os.path.basename(file_path))
+                for file_path, size in restored_files if file_path.startswith(prefix)
+            ]
+            self.image_loader.add_images(images)
+        
+        for file_path, _ in restored_files:
+            self.ui.log_message(f"已恢复: {os.path.basename(file_path)}")
+        if skipped_files:
+            self.ui.log_message("以下文件未恢复:")
+            for filename, reason in skipped_files:
+                self.ui.log_message(f"  - {filename}: {reason}")
+        
+        self.ui.show_info("恢复文件", f"已恢复 {len(restored_files)} 个文件")
+        self.show_current_image()
+
+    def _log_ops(self, verb, ops):
+        """逐个记录撤销或重做的操作，文件较多时（如批量暂存的操作组）只记录数量
+        
+        Args:
+            verb: 日志中的动作，如"撤销"
+            ops: 操作列表 [(文件路径, 操作类型)]
+        """
+        if len(ops) > LOG_OPS_LIMIT:
+            keep_count = sum(1 for _, op_action in ops if op_action == "keep")
+            self.ui.log_message(
+                f"{verb}保留操作: {keep_count} 个文件, {verb}删除操作: {len(ops) - keep_count} 个文件"
+            )
+            return
+        for op_path, op_action in ops:
+            action_name = "删除" if op_action == "delete" else "保留"
+            self.ui.log_message(f"{verb}{action_name}操作: {os.path.basename(op_path)}")
+
+    def _show_operation_target(self, ops):
+        """撤销或重做后更新待操作数量，并定位到第一个在图片列表中的文件"""
+        self.ui.update_pending_label(self.file_operations.get_operations_count())
+        
+        for op_path, _ in ops:
+            index = self.image_loader.index_of(op_path)
+            if index is not None:
+                self.current_index = index
+                break
+        
+        # 显示图片
+        self.show_current_image()
+
     def apply_operations(self):
         """应用所有暂存的操作"""
+        if self._is_applying():
+            return
+        
         status, result = self.file_operations.apply_operations()
         
         if status == "confirm":
@@ -336,76 +826,232 @@ class QQImageCleaner:
             self.ui.show_error("错误", result)
 
     def execute_operations(self):
-        """执行所有暂存的操作（在用户确认后）"""
+        """在后台执行所有暂存的操作（在用户确认后），通过进度条显示进度，可中途取消"""
         # 记录当前图片的路径
         current_image_path = None
-        image_files = self.image_loader.get_image_files()
-        if image_files and self.current_index < len(image_files):
-            current_image_path = image_files[self.current_index][0]
+        current_info = self.image_loader.get_image_info(self.current_index)
+        if current_info:
+            current_image_path = current_info[0]
         
         # 获取当前操作模式
         current_mode = self.ui.widgets.get('backup_var', tk.StringVar(value="备份")).get()
+        total = self.file_operations.get_operations_count()
         
-        success, result = self.file_operations.execute_operations(current_mode)
+        def work(is_cancelled, progress):
+            return self.file_operations.execute_operations(current_mode, is_cancelled, progress)
         
-        if success:
-            executed_files, deleted_files = result
-            
-            for file_path, action in executed_files:
-                action_name = "删除" if action == "delete" else "保留"
-                self.ui.log_message(f"已执行{action_name}: {os.path.basename(file_path)}")
+        def on_finished(task, success, result):
+            self._on_operations_executed(task, current_image_path, success, result)
+        
+        self.ui.log_message(f"开始应用 {total} 个操作")
+        self._start_apply_task("应用操作", total, work, on_finished)
+
+    def _start_apply_task(self, label, total, work, on_finished):
+        """在后台执行文件操作，通过进度条显示进度和剩余时间，可中途取消
+        
+        Args:
+            label: 进度条上显示的操作名称
+            total: 操作总数
+            work: 在后台线程中调用的函数 work(is_cancelled, progress)，返回 (成功标志, 结果)
+            on_finished: 主线程中的结束回调 on_finished(task, success, result)
+        """
+        start_time = time.perf_counter()
+        
+        def worker(task):
+            last_post = [0.0]
             
-            # 从图片列表中移除被删除的图片
-            files_to_remove = []
+            def progress(done, total):
+                # 限制消息频率，避免大量操作时淹没主线程
+                now = time.perf_counter()
+                if done == total or now - last_post[0] >= 0.1:
+                    last_post[0] = now
+                    task.post((done, total))
             
-            for i, (file_path, _, _) in enumerate(image_files):
-                # 检查该图片是否被删除
-                for deleted_path in deleted_files:
-                    if file_path == deleted_path:
-                        files_to_remove.append(i)
-                        break
+            return work(task.is_cancelled, progress)
+        
+        def on_progress(message):
+            done, total = message
+            elapsed = time.perf_counter() - start_time
+            eta = elapsed / done * (total - done) if done else 0
+            self.ui.update_progress(done, total, f"{label}: {done}/{total}，剩余约 {eta:.0f} 秒")
+        
+        def on_done(success, result):
+            on_finished(task, success, result)
+        
+        self.ui.update_progress(0, total, f"{label}: 0/{total}")
+        task = BackgroundTask(self.root, worker, on_message=on_progress, on_done=on_done)
+        self.apply_task = task
+        task.start()
+
+    def _on_operations_executed(self, task, current_image_path, success, result):
+        """主线程：应用操作结束后更新待操作列表和图片列表"""
+        self.ui.reset_progress()
+        # worker返回值为execute_operations的 (成功标志, 结果)
+        if success:
+            success, result = result
+        if not success:
+            self.ui.show_error("错误", f"执行操作失败: {result}")
+            return
+        
+        executed_files, deleted_files, remaining_ops = result
+        self.file_operations.finish_operations(remaining_ops)
+        
+        for file_path, action in executed_files:
+            action_name = "删除" if action == "delete" else "保留"
+            self.ui.log_message(f"已执行{action_name}: {os.path.basename(file_path)}")
+        
+        failed_files = self.file_operations.failed_files
+        if failed_files:
+            self.ui.log_message("以下文件操作失败，仍保留在待操作列表中:")
+            for filename, error in failed_files:
+                self.ui.log_message(f"  - {filename}: {error}")
+        
+        # 从相似图片索引中移除被删除的图片
+        if self.similar_finder:
+            self.similar_finder.remove(deleted_files)
+        
+        # 从图片列表和图片缓存中移除被删除的图片
+        self.image_loader.remove_images(deleted_files)
+        self.prefetcher.discard(deleted_files)
+        self.image_viewer.evict(deleted_files)
+        
+        # 尝试找到原来的图片位置，原来的图片被删除时确保索引有效
+        self._relocate_current(current_image_path)
+        
+        self.ui.update_pending_label(self.file_operations.get_operations_count())
+        if task.is_cancelled():
+            self.ui.show_info(
+                "已取消", f"已应用 {len(executed_files)} 个操作，剩余 {len(remaining_ops)} 个操作仍在待操作列表中"
+            )
+        else:
+            self.ui.show_info("成功", f"已应用 {len(executed_files)} 个操作")
+        
+        # 刷新显示
+        self.show_current_image()
+
+    def check_unfinished_apply(self):
+        """检查上次运行中未正常结束的应用，询问用户继续执行剩余的操作还是从备份文件夹恢复"""
+        unfinished = [
+            entry for entry in self.file_operations.get_unfinished_applies()
+            if entry[0] not in self.deferred_applies
+        ]
+        if not unfinished:
+            return
+        
+        apply_id, folder, backup_dir, started_at, total, done, operation_mode = unfinished[0]
+        if not backup_dir:
+            mode_text = "直接删除（已删除的文件无法恢复）"
+        elif operation_mode == "归档":
+            mode_text = f"归档到 {backup_dir}"
+        else:
+            mode_text = f"备份到 {backup_dir}"
+        message = f"上次应用操作没有正常结束：\n\n"
+        message += f"文件夹: {folder}\n"
+        message += f"开始时间: {started_at}\n"
+        message += f"操作模式: {mode_text}\n"
+        message += f"已确认完成: {done}/{total} 个操作\n\n"
+        message += "是：继续执行剩余的操作\n"
+        message += "否：撤销已执行的操作，把文件从备份文件夹移回原位置\n"
+        message += "取消：暂不处理，下次启动时再询问"
+        choice = self.ui.ask_yes_no_cancel("未完成的应用", message)
+        
+        if choice is None:
+            self.deferred_applies.add(apply_id)
+            self.check_unfinished_apply()
+        elif choice:
+            self.ui.log_message(f"继续执行上次未完成的应用: {folder}")
             
-            # 从后往前移除，避免索引混乱
-            for i in sorted(files_to_remove, reverse=True):
-                self.image_loader.remove_image(i)
+            def work(is_cancelled, progress):
+                return self.file_operations.resume_apply(
+                    apply_id, folder, backup_dir, operation_mode, is_cancelled, progress
+                )
             
-            # 尝试找到原来的图片位置
-            new_image_files = self.image_loader.get_image_files()
-            if current_image_path:
-                for i, (file_path, _, _) in enumerate(new_image_files):
-                    if file_path == current_image_path:
-                        self.current_index = i
-                        break
-                else:
-                    # 如果原来的图片被删除了，确保索引有效
-                    if self.current_index >= len(new_image_files) and len(new_image_files) > 0:
-                        self.current_index = len(new_image_files) - 1
-            else:
-                # 没有当前图片，确保索引有效
-                if self.current_index >= len(new_image_files) and len(new_image_files) > 0:
-                    self.current_index = len(new_image_files) - 1
+            self._start_apply_task("继续应用", total - done, work, self._on_apply_resumed)
+        else:
+            self.ui.log_message(f"撤销上次未完成的应用: {folder}")
             
-            self.ui.update_pending_label(self.file_operations.get_operations_count())
-            self.ui.show_info("成功", f"已应用 {len(executed_files)} 个操作")
+            def work(is_cancelled, progress):
+                return self.file_operations.rollback_apply(apply_id, backup_dir, is_cancelled, progress)
             
-            # 刷新显示
-            self.show_current_image()
+            self._start_apply_task("恢复文件", total, work, self._on_apply_rolled_back)
+
+    def _on_apply_resumed(self, task, success, result):
+        """主线程：继续执行未完成的应用结束"""
+        self.ui.reset_progress()
+        if success:
+            success, result = result
+        if not success:
+            self.ui.show_error("错误", f"继续应用失败: {result}")
+            return
+        
+        executed_count, failed_files = result
+        for filename, error in failed_files:
+            self.ui.log_message(f"  - {filename}: {error}")
+        if task.is_cancelled() or failed_files:
+            self.ui.show_info(
+                "未完成", f"已执行 {executed_count} 个操作，剩余的操作将在下次启动时再次询问"
+            )
         else:
-            self.ui.show_error("错误", f"执行操作失败: {result}")
+            self.ui.show_info("成功", f"已继续执行 {executed_count} 个操作")
+        self.check_unfinished_apply()
+
+    def _on_apply_rolled_back(self, task, success, result):
+        """主线程：撤销未完成的应用结束"""
+        self.ui.reset_progress()
+        if success:
+            success, result = result
+        if not success:
+            self.ui.show_error("错误", f"恢复文件失败: {result}")
+            return
+        
+        restored_count, lost_count, failed_files = result
+        for filename, error in failed_files:
+            self.ui.log_message(f"  - {filename}: {error}")
+        message = f"已恢复 {restored_count} 个文件"
+        if lost_count:
+            message += f"，{lost_count} 个已删除的文件无法恢复"
+        if task.is_cancelled() or failed_files:
+            message += "\n未恢复的文件将在下次启动时再次询问"
+        self.ui.show_info("恢复文件", message)
+        self.check_unfinished_apply()
+
+    def _is_applying(self):
+        """检查是否正在应用操作，是则提示用户等待"""
+        if self.apply_task and self.apply_task.is_running():
+            self.ui.show_info("提示", "正在应用操作，请等待完成或取消")
+            return True
+        return False
 
     def on_close(self):
         """窗口关闭事件处理"""
+        for task in (self.load_task, self.group_task):
+            if task and task.is_running():
+                task.cancel()
+        # 等待正在执行的文件操作在当前文件处停止，再关闭数据库
+        if self.apply_task and self.apply_task.is_running():
+            self.apply_task.cancel()
+            self.apply_task.thread.join()
         self.db_manager.close()
+        if self.apply_journal:
+            self.apply_journal.close()
+        if self.recycle_manifest:
+            self.recycle_manifest.close()
+        if self.scan_index:
+            self.scan_index.close()
         self.root.destroy()
 
 
 def main():
     """主函数"""
+    # 打包为可执行文件后，解码图片的子进程需要由此进入
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = QQImageCleaner(root)
     
     # 显示欢迎对话框
     if app.ui.show_welcome_dialog(config, config_file):
+        # 检查上次未正常结束的应用
+        root.after(0, app.check_unfinished_apply)
         root.mainloop()
     else:
         # 用户不同意并退出
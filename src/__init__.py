@@ -5,22 +5,72 @@ QQ缓存图片清理工具 - 模块化版本
 - database: 数据库操作模块
 - ui: UI界面管理模块
 - image_loader: 图片加载和处理模块
+- image_store: 按列存储的图片信息模块
+- scanner: 目录扫描模块
+- scan_index: 持久化扫描索引模块
 - image_viewer: 图片显示和交互模块
+- image_pyramid: 图像金字塔缓存模块
+- prefetcher: 图片后台预取模块
 - file_operations: 文件操作管理模块
+- operation_journal: 暂存操作日志模块
+- apply_journal: 持久化应用日志模块
+- recycle_manifest: 备份文件夹清单模块
+- recycle_store: 按内容寻址的备份文件夹模块
+- recycle_archive: 备份压缩包模块
+- duplicate_finder: 内容重复查找模块
+- perceptual_hash: 感知哈希相似图片查找模块
+- cleanup_policy: 规则批量清理模块
+- hash_index: 汉明距离近邻索引模块
+- background: 后台任务模块
+- pipeline: 多进程处理流水线模块
 - utils: 工具函数模块
 """
 
 from .database import DatabaseManager
 from .ui import UIManager
 from .image_loader import ImageLoader
+from .image_store import ImageStore
+from .scanner import DirectoryScanner
+from .scan_index import ScanIndex
 from .image_viewer import ImageViewer
+from .image_pyramid import ImagePyramid, PyramidCache
+from .prefetcher import ImagePrefetcher
 from .file_operations import FileOperations
+from .operation_journal import OperationJournal
+from .apply_journal import ApplyJournal
+from .recycle_manifest import RecycleManifest
+from .recycle_store import RecycleStore
+from .recycle_archive import RecycleArchive
+from .background import BackgroundTask
+from .pipeline import ProcessPipeline
+from .duplicate_finder import DuplicateFinder
+from .perceptual_hash import PerceptualHasher, NearDuplicateFinder
+from .hash_index import HashIndex
+from .cleanup_policy import CleanupPolicy
 
 __version__ = "1.0.0"
 __all__ = [
     "DatabaseManager",
     "UIManager",
     "ImageLoader",
+    "ImageStore",
+    "DirectoryScanner",
+    "ScanIndex",
     "ImageViewer",
-    "FileOperations"
+    "ImagePyramid",
+    "PyramidCache",
+    "ImagePrefetcher",
+    "FileOperations",
+    "OperationJournal",
+    "ApplyJournal",
+    "RecycleManifest",
+    "RecycleStore",
+    "RecycleArchive",
+    "BackgroundTask",
+    "ProcessPipeline",
+    "DuplicateFinder",
+    "PerceptualHasher",
+    "NearDuplicateFinder",
+    "HashIndex",
+    "CleanupPolicy"
 ]
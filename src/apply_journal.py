@@ -0,0 +1,217 @@
+import sqlite3
+import threading
+import time
+
+
+# 操作记录的状态
+STATE_PENDING = 0   # 已记录意图，尚未确认完成
+STATE_KEPT = 1      # 保留，未做文件操作
+STATE_MOVED = 2     # 已移动到备份文件夹
+STATE_REMOVED = 3   # 已删除原文件
+STATE_MISSING = 4   # 要删除的文件已不存在
+STATE_FAILED = 5    # 执行失败，文件未被改动
+
+
+class ApplyJournal:
+    """持久化的应用日志，记录每次应用操作中每个文件的执行意图和完成情况
+
+    开始应用时在一个事务中写入全部操作的意图，执行过程中批量写入完成记录，应用结束后删除。
+    程序在应用过程中退出时日志会保留下来，下次启动时可据此继续执行或从备份文件夹恢复。
+    完成记录批量写入，最近一批尚未写入的操作在恢复时通过检查文件是否存在来判断
+    """
+
+    def __init__(self, db_path, batch_size=512, flush_interval=0.5):
+        """初始化应用日志
+
+        Args:
+            db_path: SQLite数据库文件路径
+            batch_size: 累计多少条完成记录后写入一次
+            flush_interval: 距上次写入超过多少秒后写入一次
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = None
+        # 文件操作在多个线程中执行，连接和待写入的完成记录由锁保护
+        self.lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.perf_counter()
+        self.init_database()
+
+    def init_database(self):
+        """初始化数据库，创建日志表"""
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # 每次提交都同步到磁盘，断电后已写入的记录也不会丢失
+            self.conn.execute("PRAGMA synchronous=FULL")
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS applies (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    folder TEXT,
+                    backup_dir TEXT,
+                    mode TEXT,
+                    started_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    apply_id INTEGER,
+                    seq INTEGER,
+                    file_path TEXT,
+                    action TEXT,
+                    state INTEGER,
+                    recycled_path TEXT,
+                    content_hash TEXT,
+                    size INTEGER,
+                    PRIMARY KEY (apply_id, seq)
+                ) WITHOUT ROWID;
+            ''')
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"应用日志初始化错误: {e}")
+            self.conn = None
+
+    def begin(self, folder, backup_dir, operations, mode=""):
+        """开始一次应用，在一个事务中写入全部操作的意图
+
+        Args:
+            folder: 当前文件夹路径
+            backup_dir: 备份文件夹，None表示直接删除
+            operations: 操作列表 [(文件路径, 操作类型)]，序号为其在列表中的位置
+            mode: 操作模式
+
+        Returns:
+            int: 本次应用的ID，日志不可用时返回None
+        """
+        if self.conn is None:
+            return None
+        try:
+            with self.lock, self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO applies (folder, backup_dir, mode) VALUES (?, ?, ?)", (folder, backup_dir, mode)
+                )
+                apply_id = cursor.lastrowid
+                self.conn.executemany(
+                    "INSERT INTO entries (apply_id, seq, file_path, action, state) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (apply_id, seq, file_path, action, STATE_PENDING)
+                        for seq, (file_path, action) in enumerate(operations)
+                    ]
+                )
+            self._buffer = []
+            self._last_flush = time.perf_counter()
+            return apply_id
+        except sqlite3.Error as e:
+            print(f"写入应用日志错误: {e}")
+            return None
+
+    def record(self, apply_id, seq, state, recycled=None):
+        """记录一个操作的完成状态，达到批量大小或时间间隔时写入数据库（可在多个线程中调用）
+
+        Args:
+            apply_id: 应用ID
+            seq: 操作序号
+            state: 操作状态
+            recycled: 移动到备份文件夹时为 (备份文件夹中的路径, 内容哈希, 文件大小)
+        """
+        if apply_id is None:
+            return
+        recycled_path, digest, size = recycled or (None, None, None)
+        with self.lock:
+            self._buffer.append((state, recycled_path, digest, size, apply_id, seq))
+            if (len(self._buffer) >= self.batch_size
+                    or time.perf_counter() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        """写入全部待写入的完成记录
+
+        Returns:
+            bool: 是否已全部写入
+        """
+        with self.lock:
+            return self._flush_locked()
+
+    def _flush_locked(self):
+        """在持有锁时写入待写入的完成记录，返回是否已全部写入"""
+        self._last_flush = time.perf_counter()
+        if not self._buffer:
+            return True
+        if self.conn is None:
+            return False
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE entries SET state = ?, recycled_path = ?, content_hash = ?, size = ? "
+                    "WHERE apply_id = ? AND seq = ?",
+                    self._buffer
+                )
+            self._buffer = []
+            return True
+        except sqlite3.Error as e:
+            print(f"写入应用日志错误: {e}")
+            return False
+
+    def finish(self, apply_id):
+        """应用结束（包括中途取消），删除本次应用的日志"""
+        if apply_id is None or self.conn is None:
+            return
+        try:
+            with self.lock, self.conn:
+                self._buffer = [entry for entry in self._buffer if entry[-2] != apply_id]
+                self.conn.execute("DELETE FROM entries WHERE apply_id = ?", (apply_id,))
+                self.conn.execute("DELETE FROM applies WHERE id = ?", (apply_id,))
+        except sqlite3.Error as e:
+            print(f"删除应用日志错误: {e}")
+
+    def get_unfinished(self):
+        """获取上次运行中未正常结束的应用
+
+        Returns:
+            list: [(应用ID, 文件夹路径, 备份文件夹, 开始时间, 操作总数, 已确认完成的数量, 操作模式)]
+        """
+        if self.conn is None:
+            return []
+        try:
+            with self.lock:
+                return self.conn.execute(
+                    "SELECT applies.id, applies.folder, applies.backup_dir, applies.started_at, "
+                    "COUNT(entries.seq), COALESCE(SUM(entries.state != ?), 0), applies.mode "
+                    "FROM applies LEFT JOIN entries ON entries.apply_id = applies.id "
+                    "GROUP BY applies.id ORDER BY applies.id",
+                    (STATE_PENDING,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"读取应用日志错误: {e}")
+            return []
+
+    def get_entries(self, apply_id):
+        """按序号获取一次应用的全部操作
+
+        Returns:
+            list: [(序号, 文件路径, 操作类型, 状态, 备份信息)]，备份信息为 (备份文件夹中的路径, 内容哈希, 文件大小)，
+                  未移动到备份文件夹时为None
+        """
+        if self.conn is None:
+            return []
+        try:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT seq, file_path, action, state, recycled_path, content_hash, size "
+                    "FROM entries WHERE apply_id = ? ORDER BY seq",
+                    (apply_id,)
+                ).fetchall()
+            return [
+                (seq, file_path, action, state, (recycled_path, digest, size) if recycled_path else None)
+                for seq, file_path, action, state, recycled_path, digest, size in rows
+            ]
+        except sqlite3.Error as e:
+            print(f"读取应用日志错误: {e}")
+            return []
+
+    def close(self):
+        """写入待写入的记录并关闭数据库连接"""
+        if self.conn:
+            with self.lock:
+                self._flush_locked()
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,91 @@
+import queue
+import threading
+
+
+class BackgroundTask:
+    """后台任务，在工作线程中运行耗时操作，并通过root.after轮询把消息交给主线程处理
+
+    tkinter组件只能在主线程中访问，因此工作线程只通过post()发送消息，
+    所有界面更新都在主线程的轮询回调中完成
+    """
+
+    def __init__(self, root, target, on_message=None, on_done=None, poll_interval=50):
+        """初始化后台任务
+
+        Args:
+            root: tkinter根窗口，用于调度轮询
+            target: 在工作线程中执行的函数，调用方式为 target(task, *args)，返回值作为任务结果
+            on_message: 主线程中处理消息的回调函数 on_message(message)
+            on_done: 任务结束后在主线程中调用的回调函数 on_done(成功标志, 结果或错误信息)
+            poll_interval: 轮询间隔（毫秒）
+        """
+        self.root = root
+        self.target = target
+        self.on_message = on_message
+        self.on_done = on_done
+        self.poll_interval = poll_interval
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.finished = False
+        self.running = False
+        self.result = None
+
+    def start(self, *args):
+        """启动后台任务
+
+        Args:
+            *args: 传递给target的参数
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=args, daemon=True)
+        self.thread.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    def _run(self, *args):
+        """工作线程入口"""
+        try:
+            self.result = (True, self.target(self, *args))
+        except Exception as e:
+            self.result = (False, str(e))
+        finally:
+            self.finished = True
+
+    def post(self, message):
+        """从工作线程发送消息到主线程
+
+        Args:
+            message: 任意消息对象
+        """
+        self.messages.put(message)
+
+    def _poll(self):
+        """在主线程中处理积压的消息，任务结束后调用完成回调"""
+        # 先读取结束标志再清空队列，保证结束前发出的消息都已处理
+        finished = self.finished
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if self.on_message:
+                self.on_message(message)
+
+        if finished:
+            self.running = False
+            if self.on_done:
+                self.on_done(*self.result)
+        else:
+            self.root.after(self.poll_interval, self._poll)
+
+    def cancel(self):
+        """请求取消任务，工作线程需要定期调用is_cancelled()检查"""
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        """检查任务是否已被请求取消"""
+        return self.cancel_event.is_set()
+
+    def is_running(self):
+        """检查任务是否仍在运行（包括尚未处理完的消息）"""
+        return self.running
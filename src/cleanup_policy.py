@@ -0,0 +1,202 @@
+import struct
+import time
+from .utils import format_file_size
+
+# numpy为可选依赖，未安装时逐行计算
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 除文件名分组外，"未保留的版本"规则还会处理的合并分组类型；相似图片需要人工确认，不自动删除
+VARIANT_KINDS = ("content",)
+# 一天的纳秒数
+DAY_NS = 86400 * 10 ** 9
+
+
+def read_gif_size(file_path):
+    """从GIF文件头读取图片尺寸，不需要解码图片
+
+    Args:
+        file_path: 图片路径
+
+    Returns:
+        tuple: (宽, 高)，文件不是GIF时返回None
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(10)
+    if len(header) < 10 or header[:6] not in (b'GIF87a', b'GIF89a'):
+        return None
+    return struct.unpack('<HH', header[6:10])
+
+
+class CleanupPolicy:
+    """按规则批量选择要删除的文件
+
+    规则作用于全部已加载的文件（包括分组中未展示的文件）。大小、修改时间、分组等规则在按行号排列的列上
+    一次性计算出选中的行，安装numpy时向量化计算，否则逐行计算；GIF尺寸规则只读取扩展名为.gif的文件头。
+    同一文件满足多条规则时只删除一次
+    """
+
+    def __init__(self, delete_variants=False, max_age_days=0, min_size=0, max_size=0, gif_min_size=None):
+        """初始化清理规则
+
+        Args:
+            delete_variants: 是否删除分组中未保留（未展示）的_0/_720版本和内容相同的副本
+            max_age_days: 删除超过该天数未修改的文件，0表示不启用
+            min_size: 删除小于该大小（字节）的文件，0表示不启用
+            max_size: 删除大于该大小（字节）的文件，0表示不启用
+            gif_min_size: (宽, 高)，删除宽和高都小于该尺寸的GIF，None表示不启用
+        """
+        self.delete_variants = delete_variants
+        self.max_age_days = max_age_days
+        self.min_size = min_size
+        self.max_size = max_size
+        self.gif_min_size = gif_min_size
+        # 读取GIF文件头失败的文件 [(文件名, 错误信息)]
+        self.skipped_files = []
+
+    def get_rules(self):
+        """获取已启用的规则名称，顺序与evaluate返回的报告一致"""
+        rules = []
+        if self.delete_variants:
+            rules.append("未保留的_0/_720版本和重复副本")
+        if self.max_age_days > 0:
+            rules.append(f"超过 {self.max_age_days} 天未修改")
+        if self.min_size > 0:
+            rules.append(f"小于 {format_file_size(self.min_size)}")
+        if self.max_size > 0:
+            rules.append(f"大于 {format_file_size(self.max_size)}")
+        if self.gif_min_size:
+            rules.append(f"小于 {self.gif_min_size[0]}x{self.gif_min_size[1]} 的GIF")
+        return rules
+
+    def is_empty(self):
+        """是否没有启用任何规则"""
+        return not self.get_rules()
+
+    def evaluate(self, columns, skip_paths=(), now=None, is_cancelled=None):
+        """试运行全部规则，统计每条规则选中的文件，不修改任何文件或暂存操作（可在后台线程中运行）
+
+        Args:
+            columns: ImageLoader.get_columns()返回的列快照
+            skip_paths: 不受规则影响的文件路径（如已暂存操作的文件）
+            now: 计算文件年龄使用的当前时间（秒），None表示当前时间
+            is_cancelled: 返回是否取消的函数
+
+        Returns:
+            tuple: (删除操作列表 [(文件路径, "delete")], 报告 [(规则名称, 文件数量, 总大小)], 可释放的总大小)，
+                   被取消时返回None
+        """
+        self.skipped_files = []
+        now_ns = int((time.time() if now is None else now) * 10 ** 9)
+        if np is not None:
+            matches, gif_rows = self._match_vectorized(columns, now_ns)
+        else:
+            matches, gif_rows = self._match_rows(columns, now_ns)
+
+        store = columns['store']
+        # 不受规则影响的文件按行号排除，只为最终选中的行生成路径
+        skip_rows = set()
+        for path in skip_paths:
+            row = store.find(path)
+            if row is not None:
+                skip_rows.add(row)
+
+        if self.gif_min_size:
+            max_width, max_height = self.gif_min_size
+            small_gifs = []
+            for row in gif_rows:
+                if row in skip_rows:
+                    continue
+                if is_cancelled and is_cancelled():
+                    return None
+                try:
+                    gif_size = read_gif_size(store.path(row))
+                except OSError as e:
+                    self.skipped_files.append((columns['names'][row], str(e)))
+                    continue
+                if gif_size and gif_size[0] < max_width and gif_size[1] < max_height:
+                    small_gifs.append(row)
+            matches.append(small_gifs)
+
+        sizes = columns['sizes']
+        report = []
+        selected = set()
+        for label, rows in zip(self.get_rules(), matches):
+            if skip_rows:
+                rows = [row for row in rows if row not in skip_rows]
+            selected.update(rows)
+            report.append((label, len(rows), sum(map(sizes.__getitem__, rows))))
+        selected = sorted(selected)
+        ops = [(store.path(row), "delete") for row in selected]
+        return ops, report, sum(map(sizes.__getitem__, selected))
+
+    def _match_vectorized(self, columns, now_ns):
+        """用numpy在各列上计算规则选中的行
+
+        Returns:
+            tuple: (每条列规则选中的行号列表, 需要读取文件头的GIF行号列表)
+        """
+        sizes = np.frombuffer(columns['sizes'], dtype=np.int64)
+        mtimes = np.frombuffer(columns['mtimes'], dtype=np.int64)
+        groups = np.frombuffer(columns['groups'], dtype=np.int64)
+        positions = np.frombuffer(columns['positions'], dtype=np.int64)
+        # 已从列表中移除的行既不在展示列表中也不属于任何分组
+        live = (positions >= 0) | (groups >= 0)
+
+        matches = []
+        if self.delete_variants:
+            # 只处理有展示文件的分组，展示的文件即为保留的版本
+            eligible = np.zeros(columns['group_count'], dtype=bool)
+            eligible[groups[(groups >= 0) & (positions >= 0)]] = True
+            for group_id, kind in columns['merged_kinds'].items():
+                if kind not in VARIANT_KINDS:
+                    eligible[group_id] = False
+            hidden = np.flatnonzero((groups >= 0) & (positions < 0))
+            matches.append(hidden[eligible[groups[hidden]]].tolist())
+        if self.max_age_days > 0:
+            cutoff = now_ns - self.max_age_days * DAY_NS
+            # 修改时间为0表示未知，不按年龄删除
+            matches.append(np.flatnonzero(live & (mtimes > 0) & (mtimes < cutoff)).tolist())
+        if self.min_size > 0:
+            matches.append(np.flatnonzero(live & (sizes < self.min_size)).tolist())
+        if self.max_size > 0:
+            matches.append(np.flatnonzero(live & (sizes > self.max_size)).tolist())
+
+        gif_rows = []
+        if self.gif_min_size:
+            names = columns['names']
+            is_gif = np.fromiter((name[-4:].lower() == '.gif' for name in names), dtype=bool, count=len(names))
+            gif_rows = np.flatnonzero(live & is_gif).tolist()
+        return matches, gif_rows
+
+    def _match_rows(self, columns, now_ns):
+        """未安装numpy时逐行计算规则选中的行，结果与_match_vectorized相同"""
+        sizes = columns['sizes']
+        mtimes = columns['mtimes']
+        groups = columns['groups']
+        positions = columns['positions']
+        live = [row for row in range(len(sizes)) if positions[row] >= 0 or groups[row] >= 0]
+
+        matches = []
+        if self.delete_variants:
+            eligible = {groups[row] for row in live if groups[row] >= 0 and positions[row] >= 0}
+            eligible.difference_update(
+                group_id for group_id, kind in columns['merged_kinds'].items() if kind not in VARIANT_KINDS
+            )
+            matches.append([row for row in live if positions[row] < 0 and groups[row] in eligible])
+        if self.max_age_days > 0:
+            cutoff = now_ns - self.max_age_days * DAY_NS
+            matches.append([row for row in live if 0 < mtimes[row] < cutoff])
+        if self.min_size > 0:
+            matches.append([row for row in live if sizes[row] < self.min_size])
+        if self.max_size > 0:
+            matches.append([row for row in live if sizes[row] > self.max_size])
+
+        gif_rows = []
+        if self.gif_min_size:
+            names = columns['names']
+            gif_rows = [row for row in live if names[row][-4:].lower() == '.gif']
+        return matches, gif_rows
@@ -1,65 +1,229 @@
 import sqlite3
+import threading
+import time
+
+
+# 固定的SQL文本，sqlite3模块按文本缓存编译好的语句，重复执行时不再重新解析
+INSERT_OPERATION_SQL = "INSERT INTO operations (file_path, action, timestamp) VALUES (?, ?, ?)"
 
 
 class DatabaseManager:
     """数据库管理类，负责SQLite数据库的初始化和操作"""
 
-    def __init__(self):
-        """初始化数据库管理器"""
+    def __init__(self, db_path=":memory:", batch_size=1000, flush_interval=1.0):
+        """初始化数据库管理器
+
+        Args:
+            db_path: SQLite数据库文件路径，默认保存在内存中
+            batch_size: queue_operation累计多少条记录后写入一次
+            flush_interval: queue_operation距上次写入超过多少秒后写入一次
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self.conn = None
+        # 应用操作在后台线程中进行，连接允许跨线程使用并由锁保护
+        self.lock = threading.Lock()
+        # 等待批量写入的操作记录 [(文件路径, 操作类型, 时间)]
+        self._pending = []
+        self._last_flush = time.perf_counter()
         self.init_database()
 
     def init_database(self):
-        """初始化SQLite数据库，创建操作记录表"""
+        """初始化SQLite数据库，创建操作记录表
+
+        数据库文件无法打开时改为保存在内存中，本次运行的操作记录仍可正常写入和查询
+        """
         try:
-            self.conn = sqlite3.connect(":memory:")
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS operations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_path TEXT,
-                    action TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.conn.commit()
+            self._open(self.db_path)
         except sqlite3.Error as e:
             print(f"数据库初始化错误: {e}")
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            if self.db_path != ":memory:":
+                try:
+                    self._open(":memory:")
+                except sqlite3.Error as e:
+                    print(f"数据库初始化错误: {e}")
+                    self.conn = None
+
+    def _open(self, db_path):
+        """打开数据库连接并创建操作记录表"""
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        if db_path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS operations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_path TEXT,
+                action TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_operations_file_path ON operations (file_path);
+            CREATE INDEX IF NOT EXISTS idx_operations_timestamp ON operations (timestamp);
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def _timestamp():
+        """当前时间字符串，与CURRENT_TIMESTAMP一致使用UTC时间"""
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
 
     def add_operation(self, file_path, action):
         """添加操作记录到数据库"""
+        if self.conn is None:
+            return None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "INSERT INTO operations (file_path, action) VALUES (?, ?)",
-                (file_path, action)
-            )
-            self.conn.commit()
-            return cursor.lastrowid
+            with self.lock:
+                cursor = self.conn.cursor()
+                cursor.execute(INSERT_OPERATION_SQL, (file_path, action, self._timestamp()))
+                self.conn.commit()
+                return cursor.lastrowid
         except sqlite3.Error as e:
             print(f"添加操作记录错误: {e}")
             return None
 
+    def add_operations(self, operations):
+        """在一个事务中批量添加操作记录
+
+        Args:
+            operations: 操作列表 [(文件路径, 操作类型)]
+
+        Returns:
+            int: 写入的记录数量
+        """
+        if self.conn is None:
+            return 0
+        timestamp = self._timestamp()
+        records = [(file_path, action, timestamp) for file_path, action in operations]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(INSERT_OPERATION_SQL, records)
+            return len(records)
+        except sqlite3.Error as e:
+            print(f"添加操作记录错误: {e}")
+            return 0
+
+    def queue_operation(self, file_path, action):
+        """暂存一条操作记录，累计达到batch_size条或距上次写入超过flush_interval秒时批量写入
+
+        调用方在一批操作结束后应调用flush写入剩余的记录
+        """
+        with self.lock:
+            self._pending.append((file_path, action, self._timestamp()))
+            if (len(self._pending) >= self.batch_size
+                    or time.perf_counter() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        """写入全部暂存的操作记录"""
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """在持有锁时用一个事务写入暂存的操作记录"""
+        self._last_flush = time.perf_counter()
+        if not self._pending or self.conn is None:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(INSERT_OPERATION_SQL, self._pending)
+            self._pending = []
+        except sqlite3.Error as e:
+            print(f"批量写入操作记录错误: {e}")
+
     def get_all_operations(self):
         """获取所有操作记录"""
+        if self.conn is None:
+            return []
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT file_path, action, timestamp FROM operations ORDER BY id")
-            return cursor.fetchall()
+            with self.lock:
+                self._flush_locked()
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT file_path, action, timestamp FROM operations ORDER BY id")
+                return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"获取操作记录错误: {e}")
             return []
 
+    def query_operations(self, file_path=None, action=None, since=None, until=None, limit=None):
+        """按条件查询操作历史，结果按时间从新到旧排列
+
+        Args:
+            file_path: 只查询该文件的记录
+            action: 只查询该类型的操作，"keep" 或 "delete"
+            since: 起始时间（含），格式为"YYYY-MM-DD HH:MM:SS"（UTC）
+            until: 结束时间（不含），格式同上
+            limit: 最多返回的记录数量
+
+        Returns:
+            list: [(文件路径, 操作类型, 时间)]
+        """
+        conditions = []
+        params = []
+        for column, op, value in (
+            ("file_path", "=", file_path), ("action", "=", action),
+            ("timestamp", ">=", since), ("timestamp", "<", until)
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        sql = "SELECT file_path, action, timestamp FROM operations"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        if self.conn is None:
+            return []
+        try:
+            with self.lock:
+                self._flush_locked()
+                return self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"查询操作记录错误: {e}")
+            return []
+
+    def count_operations(self, action=None):
+        """统计操作记录数量
+
+        Args:
+            action: 只统计该类型的操作，None表示全部
+        """
+        if self.conn is None:
+            return 0
+        try:
+            with self.lock:
+                self._flush_locked()
+                if action is None:
+                    return self.conn.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+                return self.conn.execute(
+                    "SELECT COUNT(*) FROM operations WHERE action = ?", (action,)
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"统计操作记录错误: {e}")
+            return 0
+
     def clear_operations(self):
         """清空所有操作记录"""
+        if self.conn is None:
+            return
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM operations")
-            self.conn.commit()
+            with self.lock:
+                self._pending = []
+                cursor = self.conn.cursor()
+                cursor.execute("DELETE FROM operations")
+                self.conn.commit()
         except sqlite3.Error as e:
             print(f"清空操作记录错误: {e}")
 
     def close(self):
-        """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        """写入暂存的记录并关闭数据库连接"""
+        with self.lock:
+            if self.conn:
+                self._flush_locked()
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,170 @@
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# xxhash为可选依赖，未安装时使用标准库中的BLAKE2
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# 部分哈希读取的首尾块大小
+PARTIAL_BLOCK_SIZE = 4096
+# 完整哈希时每次送入哈希函数的数据量，避免一次性占用整个映射区域
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_hasher():
+    """创建内容哈希对象，优先使用xxhash"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def partial_hash(file_path, size, block_size=PARTIAL_BLOCK_SIZE):
+    """计算文件首尾两个块的哈希
+
+    Args:
+        file_path: 文件路径
+        size: 文件大小
+        block_size: 首尾块大小
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    hasher = new_hasher()
+    with open(file_path, 'rb') as f:
+        hasher.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            hasher.update(f.read(block_size))
+    return hasher.hexdigest()
+
+
+def full_hash(file_path):
+    """通过内存映射读取整个文件并计算哈希
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    hasher = new_hasher()
+    with open(file_path, 'rb') as f:
+        # 空文件无法映射
+        if os.fstat(f.fileno()).st_size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), HASH_CHUNK_SIZE):
+                    hasher.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return hasher.hexdigest()
+
+
+class DuplicateFinder:
+    """内容重复查找器，找出字节完全相同但文件名不同的图片
+
+    分三个阶段逐步缩小范围：
+    1. 按文件大小分桶，大小唯一的文件不可能重复
+    2. 对同大小的文件计算首尾4KB的部分哈希
+    3. 只对部分哈希仍然相同的文件计算完整哈希
+    """
+
+    def __init__(self, block_size=PARTIAL_BLOCK_SIZE, max_workers=4):
+        """初始化内容重复查找器
+
+        Args:
+            block_size: 部分哈希的首尾块大小
+            max_workers: 读取文件的线程数
+        """
+        self.block_size = block_size
+        self.max_workers = max_workers
+        self.skipped_files = []
+        self.stats = {}
+
+    def find_duplicates(self, images, is_cancelled=None, progress=None):
+        """查找内容完全相同的图片
+
+        Args:
+            images: 图片列表 [(file_path, size, filename)]
+            is_cancelled: 返回是否取消的函数，None表示不可取消
+            progress: 进度回调函数 progress(阶段名称, 需要处理的文件数)
+
+        Returns:
+            dict: {内容哈希: [(file_path, size, filename)]}，每组至少包含两个文件；被取消时返回空字典
+        """
+        self.skipped_files = []
+        self.stats = {"files": 0, "size_candidates": 0, "partial_candidates": 0, "duplicates": 0}
+
+        # 阶段1：按大小分桶（空文件不参与比较）
+        by_size = {}
+        for record in images:
+            size = record[1]
+            if size > 0:
+                by_size.setdefault(size, []).append(record)
+        self.stats["files"] = len(images)
+        candidates = [records for records in by_size.values() if len(records) > 1]
+        self.stats["size_candidates"] = sum(len(records) for records in candidates)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 阶段2：首尾部分哈希
+            if progress:
+                progress("部分哈希", self.stats["size_candidates"])
+            flat = [record for records in candidates for record in records]
+            partial_groups = self._group_by(
+                executor, flat, lambda r: (r[1], partial_hash(r[0], r[1], self.block_size))
+            )
+            if is_cancelled and is_cancelled():
+                return {}
+
+            # 不超过两个块的文件，部分哈希已经覆盖全部内容
+            confirmed = {}
+            to_verify = []
+            for (size, digest), records in partial_groups.items():
+                if len(records) < 2:
+                    continue
+                if size <= 2 * self.block_size:
+                    confirmed[digest] = records
+                else:
+                    to_verify.extend(records)
+            self.stats["partial_candidates"] = len(to_verify)
+
+            # 阶段3：完整哈希
+            if progress:
+                progress("完整哈希", len(to_verify))
+            full_groups = self._group_by(executor, to_verify, lambda r: full_hash(r[0]))
+            if is_cancelled and is_cancelled():
+                return {}
+
+        for digest, records in full_groups.items():
+            if len(records) > 1:
+                confirmed[digest] = records
+
+        self.stats["duplicates"] = sum(len(records) for records in confirmed.values())
+        return confirmed
+
+    def _group_by(self, executor, records, key_func):
+        """并行计算每条记录的键并分组，读取失败的文件记录到skipped_files
+
+        Returns:
+            dict: {键: [记录]}
+        """
+        def safe_key(record):
+            try:
+                return key_func(record), None
+            except (OSError, ValueError) as e:
+                return None, str(e)
+
+        groups = {}
+        for record, (key, error) in zip(records, executor.map(safe_key, records)):
+            if error is not None:
+                self.skipped_files.append((record[2], error))
+                continue
+            groups.setdefault(key, []).append(record)
+        return groups
@@ -1,25 +1,49 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .operation_journal import OperationJournal
+from .recycle_store import RecycleStore
+from .recycle_archive import RecycleArchive, DEFAULT_PACK_SIZE
+from .apply_journal import (
+    STATE_PENDING, STATE_KEPT, STATE_MOVED, STATE_REMOVED, STATE_MISSING, STATE_FAILED
+)
 from .utils import get_current_timestamp
 
 
+# 每个线程累计多少个已存入备份文件夹的文件后，写入应用日志并删除这些原文件
+REMOVE_BATCH_SIZE = 128
+
+
 class FileOperations:
     """文件操作管理器，负责图片的保留、删除和撤销操作
     
-    所有操作先暂存到内存中，只有调用apply_operations时才真正执行文件操作
+    所有操作先暂存到内存中的操作日志（OperationJournal），只有调用apply_operations时才真正执行文件操作
     """
 
-    def __init__(self, database_manager, image_loader):
+    def __init__(self, database_manager, image_loader, max_workers=8, apply_journal=None,
+                 recycle_manifest=None, pack_size=DEFAULT_PACK_SIZE):
         """初始化文件操作管理器
         
         Args:
             database_manager: 数据库管理器实例
             image_loader: 图片加载器实例
+            max_workers: 并行执行删除/移动的线程数，小于等于1时逐个执行
+            apply_journal: 持久化应用日志实例（ApplyJournal），None表示不记录
+            recycle_manifest: 备份文件夹清单实例（RecycleManifest），None表示不记录
+            pack_size: 归档模式下单个压缩包的大小上限（字节）
         """
         self.db = database_manager
         self.image_loader = image_loader
-        self.pending_operations = []
-        self.undone_operations = []
+        self.max_workers = max_workers
+        self.apply_journal = apply_journal
+        self.recycle_manifest = recycle_manifest
+        self.pack_size = pack_size
+        # 最近一次应用在备份文件夹清单中的批次ID，应用后撤销时恢复该批次
+        self.last_batch_id = None
+        self.journal = OperationJournal()
         self.applied = False
+        # 最近一次执行中失败的文件 [(文件名, 错误信息)]
+        self.failed_files = []
 
     def keep_image(self, file_path):
         """保留图片，暂存操作
@@ -31,33 +55,13 @@ class FileOperations:
             tuple: (成功标志, (相关文件列表, 被覆盖的操作列表) 或错误信息)
         """
         try:
-            if self.applied:
-                self.pending_operations = []
-                self.applied = False
-            
             # 查找所有相关文件
             related_files = self.image_loader.find_related_images(file_path)
             
-            # 检查是否有旧操作需要移除
-            overwritten_ops = []
-            indices_to_remove = []
-            
-            for i, (op_path, op_action) in enumerate(self.pending_operations):
-                if op_path in related_files:
-                    indices_to_remove.append(i)
-                    overwritten_ops.append((op_path, op_action))
-            
-            # 从后往前移除旧操作
-            for i in sorted(indices_to_remove, reverse=True):
-                del self.pending_operations[i]
-            
             # 保留传入的文件，删除其他相关文件
             # 因为传入的图片已经是经过查重筛选的，是成对图片中较大的那一个
-            for f in related_files:
-                if f == file_path:
-                    self.pending_operations.append((f, "keep"))
-                else:
-                    self.pending_operations.append((f, "delete"))
+            ops = [(f, "keep" if f == file_path else "delete") for f in related_files]
+            overwritten_ops = self._stage(file_path, "keep", ops)
             
             return True, (related_files, overwritten_ops)
         except Exception as e:
@@ -74,93 +78,142 @@ class FileOperations:
             tuple: (成功标志, (相关文件列表, 被覆盖的操作列表) 或错误信息)
         """
         try:
-            if self.applied:
-                self.pending_operations = []
-                self.applied = False
-            
             # 查找所有相关文件
             related_files = self.image_loader.find_related_images(file_path)
             
-            # 检查是否有旧操作需要移除
-            overwritten_ops = []
-            indices_to_remove = []
-            
-            for i, (op_path, op_action) in enumerate(self.pending_operations):
-                if op_path in related_files:
-                    indices_to_remove.append(i)
-                    overwritten_ops.append((op_path, op_action))
-            
-            # 从后往前移除旧操作
-            for i in sorted(indices_to_remove, reverse=True):
-                del self.pending_operations[i]
-            
             # 暂存删除操作
-            for f in related_files:
-                self.pending_operations.append((f, "delete"))
+            ops = [(f, "delete") for f in related_files]
+            overwritten_ops = self._stage(file_path, "delete", ops)
             
             return True, (related_files, overwritten_ops)
         except Exception as e:
             return False, str(e)
 
+    def stage_bulk(self, items, action):
+        """批量保留或删除图片，在一次调用中暂存为一个操作组，撤销时整组撤销
+
+        结果与逐个调用keep_image/delete_image相同：保留时保留指定的文件并删除其相关文件，删除时删除全部相关文件，
+        多个条目涉及同一文件时以后面的条目为准。相关文件通过image_groups一次查出
+
+        Args:
+            items: 可迭代对象，元素为文件路径，或作为一组处理的文件路径列表（保留时保留列表中的第一个文件）
+            action: "keep" 或 "delete"
+
+        Returns:
+            tuple: (成功标志, (保留数量, 删除数量, 被覆盖的操作列表) 或错误信息)
+        """
+        if action not in ("keep", "delete"):
+            return False, f"未知的操作类型: {action}"
+
+        try:
+            entries = []
+            for item in items:
+                paths = [item] if isinstance(item, str) else list(item)
+                if paths:
+                    entries.append(paths)
+            related = iter(self.image_loader.find_related_groups([path for paths in entries for path in paths]))
+
+            ops = {}
+            for paths in entries:
+                target = paths[0]
+                for _ in paths:
+                    for f in next(related):
+                        # 先删除再写入，使后面的条目覆盖的操作排在暂存顺序的后面
+                        ops.pop(f, None)
+                        ops[f] = "keep" if action == "keep" and f == target else "delete"
+
+            success, result = self.stage_operations(list(ops.items()))
+            if not success:
+                return False, result
+            keep_count = sum(1 for op_action in ops.values() if op_action == "keep")
+            return True, (keep_count, len(ops) - keep_count, result)
+        except Exception as e:
+            print(f"批量暂存错误: {e}")
+            return False, str(e)
+
+    def stage_operations(self, ops):
+        """把一批操作（如清理规则选中的文件）在一次调用中作为一个操作组暂存，撤销时整组撤销
+
+        Args:
+            ops: 操作列表 [(文件路径, 操作类型)]
+
+        Returns:
+            tuple: (成功标志, 被覆盖的操作列表 或错误信息)
+        """
+        if not ops:
+            return False, "没有需要暂存的操作"
+        file_path, action = ops[0]
+        return True, self._stage(file_path, action, ops)
+
+    def _stage(self, file_path, action, ops):
+        """把一组操作作为一个操作组暂存，应用后的第一次暂存会开始新的操作日志
+        
+        Returns:
+            list: 被覆盖的旧操作 [(文件路径, 旧操作类型)]
+        """
+        if self.applied:
+            self.journal.clear()
+            self.applied = False
+        return self.journal.stage(file_path, action, ops)
+
     def undo_action(self):
-        """撤销上一次操作
+        """撤销上一次操作（一次保留或删除暂存的整组操作），并恢复被其覆盖的操作
         
         Returns:
             tuple: (成功标志, (撤销的文件路径, 操作类型, 所有被撤销的操作列表) 或错误信息)
         """
-        if not self.pending_operations:
+        if self.applied:
+            return False, "操作已应用，无法撤销"
+        
+        group = self.journal.undo()
+        if group is None:
             return False, "没有可撤销的操作"
         
-        try:
-            if self.applied:
-                return False, "操作已应用，无法撤销"
-            
-            # 获取最后一次操作
-            last_op = self.pending_operations[-1]
-            last_file_path, last_action = last_op
-            
-            # 查找所有相关操作
-            related_files = self.image_loader.find_related_images(last_file_path)
-            related_ops = []
-            
-            # 从后往前查找，找到所有相关操作
-            for i in range(len(self.pending_operations) - 1, -1, -1):
-                op = self.pending_operations[i]
-                op_path, op_action = op
-                
-                # 检查是否为相关文件的操作
-                for related_file in related_files:
-                    if op_path == related_file:
-                        related_ops.append((i, op))
-                        break
-                
-                # 如果找到了所有相关操作，停止查找
-                if len(related_ops) == len(related_files):
-                    break
+        # 用户操作的图片排在最前面，便于定位
+        undone_ops = sorted(group.ops, key=lambda op: op[0] != group.file_path)
+        return True, (group.file_path, group.action, undone_ops)
+
+    def redo_action(self):
+        """重做上一次撤销的操作
+        
+        Returns:
+            tuple: (成功标志, (重做的文件路径, 操作类型, 所有重做的操作列表) 或错误信息)
+        """
+        if self.applied:
+            return False, "操作已应用，无法重做"
+        
+        group = self.journal.redo()
+        if group is None:
+            return False, "没有可重做的操作"
+        
+        redone_ops = sorted(group.ops, key=lambda op: op[0] != group.file_path)
+        return True, (group.file_path, group.action, redone_ops)
+
+    def reconcile_groups(self, groups):
+        """为增量加载中后到的分组成员补充暂存操作
+        
+        用户已经对分组暂存过操作（保留其中一个或全部删除）时，
+        后到的_0/_720文件按照该操作的含义应当被删除
+        
+        Args:
+            groups: [(分组内所有文件路径列表, 后到的文件路径列表)]
             
-            # 撤销所有相关操作
-            if related_ops:
-                # 按索引从大到小排序，确保正确删除
-                related_ops.sort(key=lambda x: x[0], reverse=True)
-                
-                # 记录被撤销的操作
-                undone_ops = []
-                for i, op in related_ops:
-                    undone_ops.append(op)
-                    del self.pending_operations[i]
-                
-                # 添加到已撤销操作列表
-                for op in undone_ops:
-                    self.undone_operations.append(op)
-                
-                return True, (last_file_path, last_action, undone_ops)
-            else:
-                # 如果没有找到相关操作，只撤销最后一次操作
-                last_op = self.pending_operations.pop()
-                self.undone_operations.append(last_op)
-                return True, (last_file_path, last_action, [last_op])
-        except Exception as e:
-            return False, str(e)
+        Returns:
+            list: 新暂存的操作列表
+        """
+        if self.applied or not len(self.journal):
+            return []
+        
+        new_ops = []
+        for related_files, new_files in groups:
+            # 只有分组中已有文件被暂存过操作时才需要补充，补充的操作与原操作组一起撤销
+            staged = next((f for f in related_files if f not in new_files and f in self.journal), None)
+            if staged is None:
+                continue
+            ops = [(f, "delete") for f in new_files if f not in self.journal]
+            self.journal.extend_group(staged, ops)
+            new_ops.extend(ops)
+        return new_ops
 
     def apply_operations(self):
         """应用所有暂存的操作，执行文件操作
@@ -168,13 +221,13 @@ class FileOperations:
         Returns:
             tuple: (成功标志, 结果信息或错误信息)
         """
-        if not self.pending_operations:
+        if not len(self.journal):
             return False, "没有待应用的操作"
         
         try:
             # 统计操作信息
-            keep_count = sum(1 for _, action in self.pending_operations if action == "keep")
-            delete_count = sum(1 for _, action in self.pending_operations if action == "delete")
+            keep_count = self.journal.count("keep")
+            delete_count = self.journal.count("delete")
             
             # 构建确认信息
             confirm_message = f"确定要应用以下操作吗？\n\n"
@@ -189,24 +242,33 @@ class FileOperations:
         except Exception as e:
             return False, str(e)
 
-    def execute_operations(self, operation_mode="直接操作"):
-        """执行所有暂存的操作（在用户确认后调用）
+    def execute_operations(self, operation_mode="直接操作", is_cancelled=None, progress=None):
+        """执行所有暂存的操作（在用户确认后调用，可在后台线程中运行）
+        
+        执行期间不能修改暂存操作；执行结束后需要调用finish_operations更新待操作列表。
+        文件操作由多个线程并行执行（归档模式按顺序写入压缩包），单个文件操作失败时记录到failed_files并继续执行其余操作
         
         Args:
-            operation_mode: 操作模式，"备份"或"直接操作"
+            operation_mode: 操作模式，"备份"、"归档"或"直接操作"
+            is_cancelled: 返回是否取消的函数，取消后不再执行剩余的操作
+            progress: 进度回调函数 progress(已处理数量, 总数量)
             
         Returns:
-            tuple: (成功标志, 执行结果或错误信息)
+            tuple: (成功标志, (执行的操作列表, 删除的文件列表, 未执行的操作列表) 或错误信息)
         """
-        if not self.pending_operations:
+        pending_operations = self.journal.items()
+        if not pending_operations:
             return False, "没有待应用的操作"
         
         try:
+            self.failed_files = []
             executed_files = []
             deleted_files = []
+            remaining_ops = []
             
-            # 备份模式：需要创建备份文件夹并移动文件
-            if operation_mode == "备份":
+            # 备份和归档模式：需要创建备份文件夹并移动文件
+            backup_dir = None
+            if operation_mode in ("备份", "归档"):
                 # 获取当前文件夹路径
                 current_dir = self.image_loader.current_dir
                 if not current_dir:
@@ -220,60 +282,622 @@ class FileOperations:
                 # 创建备份文件夹（如果不存在）
                 if not os.path.exists(backup_dir):
                     os.makedirs(backup_dir)
-                
-                # 执行操作
-                for file_path, action in self.pending_operations:
+            
+            # 执行前先把全部操作的意图写入应用日志
+            apply_id = None
+            if self.apply_journal:
+                apply_id = self.apply_journal.begin(
+                    self.image_loader.current_dir, backup_dir, pending_operations, operation_mode
+                )
+            
+            outcomes, recycled = self._run_mode_operations(
+                operation_mode, backup_dir, pending_operations, is_cancelled, progress, apply_id
+            )
+            
+            # 按暂存顺序汇总每个文件的执行结果
+            moved_files = []
+            for (file_path, action), outcome, recycled_info in zip(pending_operations, outcomes, recycled):
+                if outcome is None:
+                    # 取消时尚未执行
+                    remaining_ops.append((file_path, action))
+                elif isinstance(outcome, OSError):
+                    self.failed_files.append((os.path.basename(file_path), str(outcome)))
+                    remaining_ops.append((file_path, action))
+                elif outcome != STATE_MISSING:
+                    executed_files.append((file_path, action))
                     if action == "delete":
-                        if os.path.exists(file_path):
-                            # 移动文件到备份文件夹
-                            filename = os.path.basename(file_path)
-                            backup_path = os.path.join(backup_dir, filename)
-                            
-                            # 如果备份文件夹中已存在同名文件，则删除原文件
-                            if os.path.exists(backup_path):
-                                os.remove(file_path)
-                            else:
-                                os.rename(file_path, backup_path)
-                            
-                            executed_files.append((file_path, "delete"))
-                            deleted_files.append(file_path)
-                            self.db.add_operation(file_path, "delete")
-                    elif action == "keep":
-                        # 保留文件，不做任何操作
-                        executed_files.append((file_path, "keep"))
-                        self.db.add_operation(file_path, "keep")
+                        deleted_files.append(file_path)
+                    if outcome == STATE_MOVED:
+                        moved_files.append((file_path, recycled_info))
+                    self.db.queue_operation(file_path, action)
+            self.db.flush()
+            self.last_batch_id = self._record_batch(self.image_loader.current_dir, backup_dir, moved_files)
+            
+            # 未执行的操作仍在暂存列表中，本次应用的日志不再需要
+            if self.apply_journal:
+                self.apply_journal.finish(apply_id)
+            
+            return True, (executed_files, deleted_files, remaining_ops)
+        except Exception as e:
+            return False, str(e)
+
+    def _run_mode_operations(self, operation_mode, backup_dir, operations, is_cancelled=None, progress=None,
+                             apply_id=None, seqs=None):
+        """按操作模式执行文件操作，参数和返回值与_run_operations相同"""
+        if operation_mode == "归档" and backup_dir:
+            archive = RecycleArchive(backup_dir, self.pack_size)
+            return self._run_archive_operations(operations, archive, is_cancelled, progress, apply_id, seqs)
+        recycle_store = RecycleStore(backup_dir) if backup_dir else None
+        return self._run_operations(operations, recycle_store, is_cancelled, progress, apply_id, seqs)
+
+    def _run_operations(self, operations, recycle_store, is_cancelled=None, progress=None,
+                        apply_id=None, seqs=None):
+        """把文件操作分配给多个线程并行执行
+        
+        删除和移动的耗时主要是等待磁盘或网络共享的响应，多个线程同时执行可以重叠这些等待。
+        在备份文件夹中建立同名硬链接前需要检查名称是否被占用，因此文件名相同的操作分配给同一个线程按顺序执行。
+        存入备份文件夹的文件先批量把备份信息写入应用日志，再删除原文件，程序中途退出时可以按日志恢复
+        
+        Args:
+            operations: 操作列表 [(文件路径, 操作类型)]
+            recycle_store: 备份文件夹（RecycleStore），None表示直接删除
+            is_cancelled: 返回是否取消的函数
+            progress: 进度回调函数 progress(已处理数量, 总数量)，会在工作线程中调用
+            apply_id: 应用日志中的应用ID，None表示不记录
+            seqs: 每个操作在应用日志中的序号，None表示序号与位置相同
+            
+        Returns:
+            tuple: (执行结果列表, 备份信息列表)，均与operations等长。执行结果中操作状态（STATE_*）为已执行，
+                   OSError为执行失败，None为取消时尚未执行；备份信息为 (备份文件夹中的路径, 内容哈希, 文件大小)，
+                   未移动到备份文件夹时为None
+        """
+        total = len(operations)
+        outcomes = [None] * total
+        recycled = [None] * total
+        workers = max(1, min(self.max_workers, total))
+        buckets = [[] for _ in range(workers)]
+        for i, (file_path, _) in enumerate(operations):
+            buckets[hash(os.path.normcase(os.path.basename(file_path))) % workers].append(i)
+        
+        done_count = [0]
+        lock = threading.Lock()
+        
+        def record(i, state):
+            if apply_id is not None:
+                self.apply_journal.record(apply_id, seqs[i] if seqs else i, state, recycled[i])
+        
+        def unstage(i, error):
+            # 原文件未删除，撤销存入备份文件夹，保留在待操作列表中
+            outcomes[i] = error
+            entry_path, digest, _ = recycled[i]
+            recycled[i] = None
+            try:
+                recycle_store.unstage(operations[i][0], entry_path, digest)
+            except OSError as e:
+                print(f"清理备份文件错误: {e}")
+        
+        def remove_staged(staged):
+            # 备份信息写入应用日志后才删除原文件
+            if apply_id is not None and not self.apply_journal.flush():
+                for i in staged:
+                    unstage(i, OSError("无法写入应用日志，原文件未删除"))
+                staged.clear()
+                return
+            for i in staged:
+                try:
+                    os.remove(operations[i][0])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    unstage(i, e)
+                    record(i, STATE_FAILED)
+                    continue
+                outcomes[i] = STATE_MOVED
+            staged.clear()
+        
+        def run(bucket):
+            # 已存入备份文件夹、尚未删除原文件的操作位置
+            staged = []
+            try:
+                for i in bucket:
+                    if is_cancelled and is_cancelled():
+                        return
+                    file_path, action = operations[i]
+                    try:
+                        state, recycled[i] = self._execute_operation(file_path, action, recycle_store)
+                    except OSError as e:
+                        outcomes[i] = e
+                        state = STATE_FAILED
+                    else:
+                        if state == STATE_MOVED:
+                            staged.append(i)
+                        else:
+                            outcomes[i] = state
+                    record(i, state)
+                    if len(staged) >= REMOVE_BATCH_SIZE:
+                        remove_staged(staged)
+                    if progress:
+                        with lock:
+                            done_count[0] += 1
+                            done = done_count[0]
+                        progress(done, total)
+            finally:
+                # 取消时也删除已存入备份文件夹的原文件，这些操作不必重新执行
+                remove_staged(staged)
+        
+        try:
+            if workers == 1:
+                run(buckets[0])
             else:
-                # 直接操作模式：直接删除文件
-                for file_path, action in self.pending_operations:
-                    if action == "delete":
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            executed_files.append((file_path, "delete"))
-                            deleted_files.append(file_path)
-                            self.db.add_operation(file_path, "delete")
-                    elif action == "keep":
-                        executed_files.append((file_path, "keep"))
-                        self.db.add_operation(file_path, "keep")
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for future in [executor.submit(run, bucket) for bucket in buckets]:
+                        future.result()
+        finally:
+            if apply_id is not None:
+                self.apply_journal.flush()
+        return outcomes, recycled
+
+    def _run_archive_operations(self, operations, archive, is_cancelled=None, progress=None,
+                                apply_id=None, seqs=None):
+        """把要删除的文件依次写入备份压缩包，每个压缩包同步到磁盘后再删除其中文件的原文件
+        
+        压缩包写入完成前原文件保持不动，程序中途退出时不会丢失文件；
+        删除原文件前先把完成记录写入应用日志，继续执行或撤销时可以找到对应的压缩包
+        
+        Args:
+            operations: 操作列表 [(文件路径, 操作类型)]
+            archive: 备份压缩包（RecycleArchive）
+            其余参数与_run_operations相同
             
-            # 清空待操作列表
-            self.pending_operations = []
-            self.applied = True
+        Returns:
+            tuple: 与_run_operations相同，备份信息为 (压缩包路径, 内容哈希, 文件大小)
+        """
+        total = len(operations)
+        outcomes = [None] * total
+        recycled = [None] * total
+        # 已写入当前压缩包、尚未删除原文件的操作位置
+        pack_indices = []
+        
+        def record(i, state):
+            if apply_id is not None:
+                self.apply_journal.record(apply_id, seqs[i] if seqs else i, state, recycled[i])
+        
+        def commit_pack():
+            try:
+                archive.seal()
+            except OSError as e:
+                # 压缩包未能完整写入，已被丢弃，其中文件的原文件保留不动
+                for i in pack_indices:
+                    outcomes[i] = e
+                    recycled[i] = None
+                    record(i, STATE_FAILED)
+                pack_indices.clear()
+                return
+            for i in pack_indices:
+                record(i, STATE_MOVED)
+            # 完成记录写入应用日志后才删除原文件
+            if apply_id is not None and not self.apply_journal.flush():
+                for i in pack_indices:
+                    outcomes[i] = OSError("无法写入应用日志，原文件未删除")
+                    recycled[i] = None
+                pack_indices.clear()
+                return
+            for i in pack_indices:
+                try:
+                    os.remove(operations[i][0])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # 原文件删除失败，保留在待操作列表中，压缩包中的副本不再记录
+                    outcomes[i] = e
+                    recycled[i] = None
+                    record(i, STATE_FAILED)
+                    continue
+                outcomes[i] = STATE_MOVED
+            pack_indices.clear()
+        
+        try:
+            for i, (file_path, action) in enumerate(operations):
+                if is_cancelled and is_cancelled():
+                    break
+                if action == "keep":
+                    outcomes[i] = STATE_KEPT
+                    record(i, STATE_KEPT)
+                elif action != "delete" or not os.path.exists(file_path):
+                    outcomes[i] = STATE_MISSING
+                    record(i, STATE_MISSING)
+                else:
+                    try:
+                        recycled[i] = archive.add(file_path)
+                        pack_indices.append(i)
+                    except OSError as e:
+                        outcomes[i] = e
+                        record(i, STATE_FAILED)
+                        if not archive.is_open():
+                            # 写入失败时整个压缩包已丢弃，其中的文件视为尚未执行
+                            for j in pack_indices:
+                                recycled[j] = None
+                            pack_indices.clear()
+                    if archive.is_full():
+                        commit_pack()
+                if progress:
+                    progress(i + 1, total)
+            # 取消时也写完当前压缩包，已写入的文件不必重新执行
+            commit_pack()
+        finally:
+            archive.abort()
+            if apply_id is not None:
+                self.apply_journal.flush()
+        return outcomes, recycled
+
+    @staticmethod
+    def _execute_operation(file_path, action, recycle_store=None):
+        """执行单个文件操作
+        
+        Args:
+            file_path: 文件路径
+            action: "delete" 或 "keep"
+            recycle_store: 备份文件夹（RecycleStore），None表示直接删除
             
-            return True, (executed_files, deleted_files)
+        Returns:
+            tuple: (操作状态, 备份信息)。操作状态为STATE_KEPT、STATE_MOVED、STATE_REMOVED，
+                   要删除的文件已不存在时为STATE_MISSING；存入备份文件夹时备份信息为
+                   (备份文件夹中的路径, 内容哈希, 文件大小)，否则为None。
+                   存入备份文件夹（STATE_MOVED）时原文件尚未删除，由调用方写入应用日志后删除
+        """
+        if action == "keep":
+            # 保留文件，不做任何操作
+            return STATE_KEPT, None
+        if action != "delete" or not os.path.exists(file_path):
+            return STATE_MISSING, None
+        if recycle_store is None:
+            os.remove(file_path)
+            return STATE_REMOVED, None
+        
+        # 按内容存入备份文件夹，同名文件不会互相覆盖
+        return STATE_MOVED, recycle_store.stage(file_path)
+
+    def _record_batch(self, folder, backup_dir, moved_files):
+        """把移动到备份文件夹的文件作为一个批次记录到备份文件夹清单
+        
+        Args:
+            folder: 应用时的文件夹路径
+            backup_dir: 备份文件夹，None表示直接删除
+            moved_files: [(原文件路径, (备份文件夹中的路径, 内容哈希, 文件大小))]
+            
+        Returns:
+            int: 批次ID，没有记录时返回None
+        """
+        if not self.recycle_manifest or not backup_dir or not moved_files:
+            return None
+        items = [
+            (file_path, recycled_path, digest, size)
+            for file_path, (recycled_path, digest, size) in moved_files
+        ]
+        return self.recycle_manifest.add_batch(folder, backup_dir, items)
+
+    def _release_recycled(self, released):
+        """删除已恢复的文件在备份文件夹中不再被清单引用的硬链接和内容文件
+        
+        Args:
+            released: [(备份文件夹, 备份文件夹中的路径, 内容哈希, 原文件名)]
+        """
+        released = [item for item in released if item[2]]
+        if not released:
+            return
+        if self.recycle_manifest:
+            referenced_paths, referenced_hashes = self.recycle_manifest.get_referenced(
+                [item[1] for item in released], [item[2] for item in released]
+            )
+        else:
+            # 没有清单时无法判断内容文件是否仍被其他备份引用，只删除硬链接
+            referenced_paths, referenced_hashes = set(), {item[2] for item in released}
+        # 压缩包中的文件全部恢复后删除整个压缩包
+        for _, recycled_path, _, _ in released:
+            if RecycleArchive.is_pack(recycled_path) and recycled_path not in referenced_paths:
+                try:
+                    RecycleArchive.release(recycled_path)
+                except OSError as e:
+                    print(f"清理备份文件错误: {e}")
+        released = [item for item in released if not RecycleArchive.is_pack(item[1])]
+        
+        # 先删除全部硬链接再删除内容文件，删除硬链接前需要用内容文件确认两者是同一个文件
+        for remove_blobs in (False, True):
+            for backup_dir, recycled_path, digest, filename in released:
+                try:
+                    RecycleStore(backup_dir).release(
+                        recycled_path, digest, filename,
+                        remove_entry=not remove_blobs and recycled_path not in referenced_paths,
+                        remove_blob=remove_blobs and digest not in referenced_hashes
+                    )
+                except OSError as e:
+                    print(f"清理备份文件错误: {e}")
+
+    @staticmethod
+    def _restore_file(archives, backup_dir, recycled_path, digest, original_path, references=None):
+        """从备份文件夹或备份压缩包把一个文件恢复到原位置
+        
+        Args:
+            archives: 恢复过程中打开的备份压缩包 {备份文件夹: RecycleArchive}，恢复结束后需要关闭
+            backup_dir: 备份文件夹
+            recycled_path: 备份文件夹中的路径或压缩包路径
+            digest: 内容哈希
+            original_path: 原文件路径
+            references: 每个内容哈希尚未恢复的引用数量 {内容哈希: 数量}，恢复成功后减一；
+                        只有最后一个引用以硬链接恢复，其余复制。None表示无法确定，全部复制
+        """
+        if digest and RecycleArchive.is_pack(recycled_path):
+            archive = archives.get(backup_dir)
+            if archive is None:
+                archive = archives[backup_dir] = RecycleArchive(backup_dir)
+            archive.extract(recycled_path, digest, original_path)
+        else:
+            last_reference = references is not None and references.get(digest) == 1
+            RecycleStore(backup_dir).restore(recycled_path, digest, original_path, last_reference)
+        if references is not None and digest in references:
+            references[digest] -= 1
+
+    def get_last_batch_count(self):
+        """获取最近一次应用移动到备份文件夹、仍可恢复的文件数量"""
+        if not self.recycle_manifest or self.last_batch_id is None:
+            return 0
+        return len(self.recycle_manifest.find_items(self.last_batch_id))
+
+    def restore_recycled(self, batch_id=None, path_prefix=None, since=None, until=None,
+                         is_cancelled=None, progress=None):
+        """把备份文件夹中的文件移回原位置（可在后台线程中运行）
+        
+        通过备份文件夹清单的索引一次查出需要恢复的文件，逐个恢复后在一个事务中更新清单，
+        再删除不再被引用的内容文件。原位置已有同名文件时不覆盖，该文件保留在备份文件夹中
+        
+        Args:
+            batch_id: 只恢复该批次的文件
+            path_prefix: 只恢复原路径以该前缀开头的文件
+            since: 移动时间下限（含），格式为"YYYY-MM-DD HH:MM:SS"（UTC）
+            until: 移动时间上限（不含），格式同上
+            is_cancelled: 返回是否取消的函数
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+            
+        Returns:
+            tuple: (成功标志, (恢复的文件列表[(文件路径, 大小)], 未恢复的文件列表[(文件名, 原因)]) 或错误信息)
+        """
+        if not self.recycle_manifest:
+            return False, "未启用备份文件夹清单"
+        
+        try:
+            items = self.recycle_manifest.find_items(batch_id, path_prefix, since, until)
+            if not items:
+                return False, "没有可恢复的文件"
+            
+            # 清单中同一内容的其他记录仍需要内容文件，只有最后一个引用可以直接使用它
+            references = self.recycle_manifest.count_references(item[3] for item in items if item[3])
+            restored_files = []
+            skipped_files = []
+            # 已恢复或在备份文件夹中已不存在的记录
+            finished_ids = []
+            released = []
+            archives = {}
+            created_dirs = set()
+            total = len(items)
+            for i, (item_id, original_path, recycled_path, digest, size, backup_dir) in enumerate(items):
+                if is_cancelled and is_cancelled():
+                    break
+                if os.path.exists(original_path):
+                    skipped_files.append((os.path.basename(original_path), "原位置已有同名文件"))
+                else:
+                    try:
+                        parent_dir = os.path.dirname(original_path)
+                        if parent_dir not in created_dirs:
+                            os.makedirs(parent_dir, exist_ok=True)
+                            created_dirs.add(parent_dir)
+                        self._restore_file(archives, backup_dir, recycled_path, digest, original_path, references)
+                    except FileNotFoundError:
+                        skipped_files.append((os.path.basename(original_path), "备份文件夹中已不存在"))
+                        finished_ids.append(item_id)
+                    except OSError as e:
+                        skipped_files.append((os.path.basename(original_path), str(e)))
+                    else:
+                        restored_files.append((original_path, size))
+                        finished_ids.append(item_id)
+                        released.append((backup_dir, recycled_path, digest, os.path.basename(original_path)))
+                        self.db.queue_operation(original_path, "restore")
+                if progress:
+                    progress(i + 1, total)
+            
+            for archive in archives.values():
+                archive.close()
+            self.db.flush()
+            self.recycle_manifest.remove_items(finished_ids)
+            self._release_recycled(released)
+            return True, (restored_files, skipped_files)
+        except Exception as e:
+            return False, str(e)
+
+    def get_unfinished_applies(self):
+        """获取上次运行中未正常结束的应用
+        
+        Returns:
+            list: [(应用ID, 文件夹路径, 备份文件夹, 开始时间, 操作总数, 已确认完成的数量, 操作模式)]
+        """
+        if not self.apply_journal:
+            return []
+        return self.apply_journal.get_unfinished()
+
+    def resume_apply(self, apply_id, folder, backup_dir, operation_mode="备份", is_cancelled=None, progress=None):
+        """继续执行未正常结束的应用中尚未确认完成的操作（可在后台线程中运行）
+        
+        中断前已执行但尚未写入日志的操作会因文件已不存在而跳过；
+        已存入备份文件夹但原文件尚未删除的操作，备份仍在时直接删除原文件，否则重新执行
+        
+        Args:
+            apply_id: 应用ID
+            folder: 该次应用的文件夹路径
+            backup_dir: 该次应用的备份文件夹，None表示直接删除
+            operation_mode: 该次应用的操作模式
+            is_cancelled: 返回是否取消的函数
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+            
+        Returns:
+            tuple: (成功标志, (执行的操作数量, 失败的文件列表[(文件名, 错误信息)]) 或错误信息)
+        """
+        try:
+            # 上次恢复时失败的操作也重新执行
+            entries = []
+            executed_count = 0
+            failed_files = []
+            for entry in self.apply_journal.get_entries(apply_id):
+                _, file_path, action, state, recycled_info = entry
+                if state in (STATE_PENDING, STATE_FAILED):
+                    entries.append(entry)
+                elif state == STATE_MOVED and os.path.exists(file_path):
+                    # 已存入备份文件夹，中断时原文件尚未删除
+                    if not recycled_info or not os.path.exists(recycled_info[0]):
+                        entries.append(entry)
+                        continue
+                    try:
+                        os.remove(file_path)
+                    except OSError as e:
+                        failed_files.append((os.path.basename(file_path), str(e)))
+                        continue
+                    executed_count += 1
+                    self.db.queue_operation(file_path, action)
+            
+            operations = [(file_path, action) for _, file_path, action, _, _ in entries]
+            if backup_dir and not os.path.exists(backup_dir):
+                os.makedirs(backup_dir)
+            outcomes, _ = self._run_mode_operations(
+                operation_mode, backup_dir, operations, is_cancelled, progress, apply_id,
+                [entry[0] for entry in entries]
+            )
+            
+            for (file_path, action), outcome in zip(operations, outcomes):
+                if isinstance(outcome, OSError):
+                    failed_files.append((os.path.basename(file_path), str(outcome)))
+                elif outcome is not None and outcome != STATE_MISSING:
+                    executed_count += 1
+                    self.db.queue_operation(file_path, action)
+            self.db.flush()
+            
+            # 中途取消或有操作失败时保留日志，下次启动时仍可继续或恢复
+            if not (is_cancelled and is_cancelled()) and not failed_files:
+                # 中断前和本次移动的文件一起记录到备份文件夹清单
+                moved_files = [
+                    (file_path, recycled_info)
+                    for _, file_path, _, state, recycled_info in self.apply_journal.get_entries(apply_id)
+                    if state == STATE_MOVED and recycled_info
+                ]
+                self._record_batch(folder, backup_dir, moved_files)
+                self.apply_journal.finish(apply_id)
+            return True, (executed_count, failed_files)
         except Exception as e:
             return False, str(e)
 
+    def rollback_apply(self, apply_id, backup_dir, is_cancelled=None, progress=None):
+        """撤销未正常结束的应用，把已移动到备份文件夹的文件移回原位置（可在后台线程中运行）
+        
+        原文件只在备份信息写入日志后才删除，因此已移动的文件按日志中记录的内容哈希恢复；
+        原文件仍在时清理已存入备份文件夹的副本。日志中没有备份信息而原文件不存在的操作不是由本次应用移动的
+        （如直接删除），无法恢复，也不按文件名从备份文件夹中猜测
+        
+        Args:
+            apply_id: 应用ID
+            backup_dir: 该次应用的备份文件夹，None表示直接删除
+            is_cancelled: 返回是否取消的函数
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+            
+        Returns:
+            tuple: (成功标志, (恢复的文件数量, 无法恢复的文件数量, 失败的文件列表[(文件名, 错误信息)]) 或错误信息)
+        """
+        try:
+            entries = [
+                entry for entry in self.apply_journal.get_entries(apply_id)
+                if entry[2] == "delete" and entry[3] in (STATE_PENDING, STATE_MOVED, STATE_REMOVED)
+            ]
+            # 本次应用尚未记录到清单，同一内容的引用数量为清单中的记录加上日志中待恢复的文件
+            references = None
+            if self.recycle_manifest:
+                digests = [
+                    entry[4][1] for entry in entries
+                    if entry[4] and entry[4][1] and entry[3] != STATE_REMOVED
+                ]
+                references = self.recycle_manifest.count_references(digests)
+                if references is not None:
+                    for digest in digests:
+                        references[digest] = references.get(digest, 0) + 1
+            restored_count = 0
+            lost_count = 0
+            failed_files = []
+            total = len(entries)
+            released = []
+            archives = {}
+            for i, (_, file_path, _, state, recycled_info) in enumerate(entries):
+                if is_cancelled and is_cancelled():
+                    break
+                if os.path.exists(file_path):
+                    if recycled_info:
+                        # 已存入备份文件夹但原文件尚未删除，撤销存入，不再与原文件共用硬链接
+                        recycled_path, digest, _ = recycled_info
+                        if references is not None and digest in references:
+                            references[digest] -= 1
+                        if digest and not RecycleArchive.is_pack(recycled_path):
+                            try:
+                                RecycleStore(backup_dir).unstage(file_path, recycled_path, digest)
+                            except OSError as e:
+                                print(f"清理备份文件错误: {e}")
+                        else:
+                            released.append((backup_dir, recycled_path, digest, os.path.basename(file_path)))
+                else:
+                    recycled_path, digest, _ = recycled_info or (None, None, None)
+                    if state == STATE_REMOVED or not recycled_path:
+                        lost_count += 1
+                    else:
+                        try:
+                            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                            self._restore_file(archives, backup_dir, recycled_path, digest, file_path, references)
+                            restored_count += 1
+                            released.append((backup_dir, recycled_path, digest, os.path.basename(file_path)))
+                        except FileNotFoundError:
+                            lost_count += 1
+                        except OSError as e:
+                            failed_files.append((os.path.basename(file_path), str(e)))
+                if progress:
+                    progress(i + 1, total)
+            for archive in archives.values():
+                archive.close()
+            
+            # 中途取消或有文件恢复失败时保留日志和备份文件，下次启动时可以再次恢复
+            if not (is_cancelled and is_cancelled()) and not failed_files:
+                self._release_recycled(released)
+                self.apply_journal.finish(apply_id)
+            return True, (restored_count, lost_count, failed_files)
+        except Exception as e:
+            return False, str(e)
+
+    def finish_operations(self, remaining_ops):
+        """执行结束后更新待操作列表（在主线程中调用）
+        
+        全部执行完成时清空操作日志；中途取消或部分失败时只保留尚未执行的操作，
+        已执行的文件同时从撤销/重做记录中移除
+        
+        Args:
+            remaining_ops: execute_operations返回的未执行的操作列表
+        """
+        if remaining_ops:
+            self.journal.retain(op_path for op_path, _ in remaining_ops)
+        else:
+            self.journal.clear()
+            self.applied = True
+
     def get_operations_count(self):
         """获取待操作记录数量"""
-        return len(self.pending_operations)
+        return len(self.journal)
 
     def get_pending_operations(self):
-        """获取待操作列表"""
-        return self.pending_operations
+        """获取待操作列表 [(文件路径, 操作类型)]"""
+        return self.journal.items()
 
     def clear_operations(self):
         """清空操作记录"""
-        self.pending_operations = []
-        self.undone_operations = []
+        self.journal.clear()
         self.applied = False
         self.db.clear_operations()
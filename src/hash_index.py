@@ -0,0 +1,152 @@
+from itertools import combinations
+
+
+HASH_BITS = 64
+
+# int.bit_count需要Python 3.10及以上
+if hasattr(int, "bit_count"):
+    def popcount(value):
+        """计算整数二进制中1的个数"""
+        return value.bit_count()
+else:
+    def popcount(value):
+        """计算整数二进制中1的个数"""
+        return bin(value).count("1")
+
+
+class HashIndex:
+    """64位图片哈希的多索引哈希表（Multi-Index Hashing），用于汉明距离近邻查询
+
+    把64位哈希切分为若干段，每段建立一个精确匹配的哈希表。
+    根据抽屉原理，两个哈希的汉明距离不超过k时，至少有一段的距离不超过 k // 段数，
+    因此查询时只需在每段中枚举距离不超过 k // 段数 的段值，再对候选逐一校验，
+    无需与全部哈希两两比较
+    """
+
+    def __init__(self, bands=4):
+        """初始化哈希索引
+
+        Args:
+            bands: 分段数量，64需要能被其整除
+        """
+        if HASH_BITS % bands:
+            raise ValueError(f"分段数量必须能整除{HASH_BITS}: {bands}")
+        self.bands = bands
+        self.band_bits = HASH_BITS // bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.tables = [{} for _ in range(bands)]
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def _band_values(self, value):
+        """把哈希拆分为各段的值"""
+        return [(value >> (i * self.band_bits)) & self.band_mask for i in range(self.bands)]
+
+    def add(self, key, value):
+        """添加或更新一个哈希
+
+        Args:
+            key: 图片标识（通常为文件路径）
+            value: 64位无符号哈希
+        """
+        if key in self.values:
+            if self.values[key] == value:
+                return
+            self.remove(key)
+        self.values[key] = value
+        for table, band in zip(self.tables, self._band_values(value)):
+            table.setdefault(band, set()).add(key)
+
+    def update(self, items):
+        """批量添加哈希
+
+        Args:
+            items: 可迭代的 (key, value)
+        """
+        for key, value in items:
+            self.add(key, value)
+
+    def remove(self, key):
+        """移除一个哈希，不存在时忽略
+
+        Args:
+            key: 图片标识
+        """
+        value = self.values.pop(key, None)
+        if value is None:
+            return
+        for table, band in zip(self.tables, self._band_values(value)):
+            bucket = table.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[band]
+
+    def get(self, key):
+        """获取图片的哈希，不存在时返回None"""
+        return self.values.get(key)
+
+    def items(self):
+        """获取全部 (key, value)，用于序列化"""
+        return self.values.items()
+
+    def _probe_values(self, band, radius):
+        """枚举与段值汉明距离不超过radius的所有段值"""
+        yield band
+        for distance in range(1, radius + 1):
+            for bits in combinations(range(self.band_bits), distance):
+                flipped = band
+                for bit in bits:
+                    flipped ^= 1 << bit
+                yield flipped
+
+    def query(self, value, max_distance):
+        """查找汉明距离不超过max_distance的全部哈希
+
+        Args:
+            value: 64位无符号哈希
+            max_distance: 最大汉明距离
+
+        Returns:
+            list: [(key, 距离)]
+        """
+        radius = max_distance // self.bands
+        checked = set()
+        results = []
+        for table, band in zip(self.tables, self._band_values(value)):
+            for probe in self._probe_values(band, radius):
+                bucket = table.get(probe)
+                if not bucket:
+                    continue
+                for key in bucket:
+                    if key in checked:
+                        continue
+                    checked.add(key)
+                    distance = popcount(self.values[key] ^ value)
+                    if distance <= max_distance:
+                        results.append((key, distance))
+        return results
+
+
+def brute_force_query(values, value, max_distance):
+    """逐一比较的汉明距离查询，用于校验和基准测试
+
+    Args:
+        values: {key: 64位哈希}
+        value: 64位无符号哈希
+        max_distance: 最大汉明距离
+
+    Returns:
+        list: [(key, 距离)]
+    """
+    results = []
+    for key, other in values.items():
+        distance = popcount(other ^ value)
+        if distance <= max_distance:
+            results.append((key, distance))
+    return results
@@ -1,21 +1,40 @@
 import os
-from .utils import is_image_file
+from array import array
+from .image_store import ImageStore, ImageRecord, RecordList
+from .scanner import DirectoryScanner
+from .utils import parse_image_name
 
 
+# 展示列表中已移除的位置
+TOMBSTONE = -1
+
 class ImageLoader:
-    """图片加载器，负责扫描文件夹、加载图片和去重处理"""
+    """图片加载器，负责扫描文件夹、加载图片和去重处理
+
+    图片信息按列保存在ImageStore中，图片列表和分组只保存行号，
+    对外通过ImageRecord视图提供 (file_path, size, filename) 形式的记录
+    """
 
-    def __init__(self):
-        """初始化图片加载器"""
-        self.image_files = []
+    def __init__(self, scan_index=None):
+        """初始化图片加载器
+        
+        Args:
+            scan_index: 持久化扫描索引（ScanIndex实例），None表示每次都完整扫描
+        """
+        self.store = ImageStore()
         self.current_dir = ""
-        self.image_groups = {}
+        self.scan_index = scan_index
+        self.scanner = DirectoryScanner(scan_index=scan_index)
+        self._reset_groups("")
 
-    def load_images_from_folder(self, folder_path):
+    def load_images_from_folder(self, folder_path, recursive=False, max_depth=None, exclude=None):
         """从指定文件夹加载图片
         
         Args:
             folder_path: 文件夹路径
+            recursive: 是否递归扫描子文件夹（"-recycle"文件夹自动跳过）
+            max_depth: 递归扫描的最大深度，None表示不限制
+            exclude: 递归扫描时需要跳过的子文件夹名称或通配符列表
             
         Returns:
             tuple: (成功标志, 错误信息或图片数量)
@@ -27,61 +46,106 @@ class ImageLoader:
         
         try:
             # 扫描文件夹中的所有图片文件
-            all_images = []
-            skipped_files = []
-            
-            # 获取文件夹中的所有文件
             try:
-                files = os.listdir(folder_path)
-            except Exception as e:
+                all_images = list(self.scanner.scan(folder_path, recursive, max_depth, exclude))
+            except OSError as e:
                 return False, f"无法读取文件夹内容: {e}"
             
-            for filename in files:
-                file_path = os.path.join(folder_path, filename)
-                
-                # 检查是否为文件
-                if not os.path.isfile(file_path):
-                    continue
-                
-                # 检查文件后缀
-                if not is_image_file(filename):
-                    continue
-                
-                try:
-                    # 获取文件大小
-                    size = os.path.getsize(file_path)
-                    all_images.append((file_path, size, filename))
-                except Exception as e:
-                    skipped_files.append((filename, str(e)))
-                    continue
+            skipped_files = list(self.scanner.skipped_files)
             
             # 图片去重处理并存储分组信息
-            self.image_files = self._deduplicate_images(all_images)
+            image_files = self._deduplicate_images(all_images)
             
-            return True, (len(self.image_files), skipped_files)
+            return True, (len(image_files), skipped_files)
             
         except Exception as e:
             return False, f"加载图片错误: {e}"
 
-    def _deduplicate_images(self, images):
-        """根据图片名称去重，保留较大的文件，并存储分组信息
+    def begin_load(self, folder_path):
+        """开始增量加载新文件夹，清空现有图片列表和分组信息
+        
+        之后由调用方把扫描得到的图片分批传给add_images
         
         Args:
-            images: 图片列表，每个元素为 (filename, file_path, size) 或 (file_path, size, filename)
+            folder_path: 文件夹路径
+        """
+        self._reset_groups(folder_path)
+        # 每次加载使用独立的扫描器，避免被取消的旧任务干扰新任务的统计信息
+        self.scanner = DirectoryScanner(self.scanner.max_workers, self.scan_index)
+
+    def _reset_groups(self, folder_path):
+        """清空图片列表和分组信息"""
+        # 使用新的ImageStore，仍在后台查找中使用的旧记录视图不受影响
+        self.store = ImageStore()
+        # 展示的图片行号，被移除的位置先标记为TOMBSTONE，之后统一压缩
+        self.image_files = array('q')
+        self._tombstones = 0
+        self.current_dir = folder_path
+        # 分组编号 -> 成员行号元组
+        self.image_groups = {}
+        self._next_group = 0
+        # 每行所属的分组编号，-1表示不属于任何分组
+        self._group_col = array('q')
+        # 按文件名分组的查找表 (目录编号, 哈希) -> 分组中第一个文件的行号，分组凑齐_0和_720后删除
+        self._name_groups = {}
+        # 合并分组（如内容相同的图片）的分组编号 -> 分组类型
+        self._merged_kinds = {}
+        # 每行在image_files中的位置，-1表示未展示，用于按路径定位和增量加载时原位替换展示文件
+        self._position_col = array('q')
+
+    def iter_scan_batches(self, folder_path, recursive=False, max_depth=None, exclude=None, batch_size=2000):
+        """扫描文件夹并分批产出图片记录，供后台线程增量加载使用
+        
+        较小的目录会被合并到同一批中，较大的目录会被拆分，每批大约batch_size条记录
+        
+        Args:
+            folder_path: 文件夹路径
+            recursive: 是否递归扫描子文件夹
+            max_depth: 递归扫描的最大深度
+            exclude: 递归扫描时需要跳过的子文件夹名称或通配符列表
+            batch_size: 每批图片数量
+            
+        Yields:
+            list: [(file_path, size, filename, mtime_ns)]
+        """
+        scanner = self.scanner
+        batch = []
+        for _, records in scanner.iter_batches(folder_path, recursive, max_depth, exclude, chunk_size=batch_size):
+            batch.extend(records)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def add_images(self, images):
+        """把一批图片合并到当前图片列表和分组信息中
+        
+        同一分组的_0/_720文件可能在不同批次中出现，后到的文件会与已有分组合并，
+        如果新文件比当前展示的文件更大，则在原位置替换为新文件
+        
+        Args:
+            images: 图片列表，每个元素为 (filename, file_path, size)、(file_path, size, filename)
+                    或 (file_path, size, filename, mtime_ns)
             
         Returns:
-            list: 去重后的图片列表
+            tuple: (新增的图片数量, 展示文件被替换的索引列表, 新增成员的分组列表[(分组编号, 新文件路径)])
         """
-        # 分组字典 {hash: [(_0文件), (_720文件)]}
-        groups = {}
-        # 第二种类型的图片（直接以file_hash命名）
-        direct_images = []
+        self._compact()
+        
+        store = self.store
+        added_count = 0
+        replaced_indices = []
+        regrouped = []
         
-        # 处理所有图片
         for item in images:
-            # 支持两种格式的输入
-            if len(item) == 3:
-                if isinstance(item[0], str) and os.path.exists(item[0]):
+            mtime_ns = 0
+            # 支持多种格式的输入
+            if len(item) == 4:
+                file_path, size, filename, mtime_ns = item
+            elif len(item) == 3:
+                # 根据大小字段的位置区分格式，避免对每个文件再调用一次os.path.exists
+                if isinstance(item[1], int):
                     # (file_path, size, filename)
                     file_path, size, filename = item
                 else:
@@ -90,45 +154,280 @@ class ImageLoader:
             else:
                 continue
             
+            row = self._add_row(file_path, size, mtime_ns)
+            
             # 检查是否为第一种类型的图片（带_0或_720后缀）
-            name_parts = filename.rsplit('.', 1)
-            if len(name_parts) == 2:
-                base_name, ext = name_parts
-                if '_0' in base_name or '_720' in base_name:
-                    # 提取file_hash
-                    file_hash = base_name.rsplit('_', 1)[0]
-                    suffix = base_name.rsplit('_', 1)[1]
-                    
-                    if file_hash not in groups:
-                        groups[file_hash] = {}
-                    
-                    groups[file_hash][suffix] = (file_path, size, filename)
+            parsed = parse_image_name(filename)
+            if not parsed:
+                # 第二种类型的图片，直接添加
+                if self._position_col[row] < 0:
+                    self._append_file(row)
+                    added_count += 1
+                continue
+            
+            group_id = self._group_col[row]
+            if group_id < 0:
+                name_key = (store.dir_col[row], parsed[0])
+                first_row = self._name_groups.get(name_key)
+                # 分组中最早的文件已被移除时重新建立分组
+                if first_row is not None:
+                    group_id = self._group_col[first_row]
+                if group_id < 0:
+                    # 新分组，先展示当前文件
+                    self._new_group((row,))
+                    self._name_groups[name_key] = row
+                    self._append_file(row)
+                    added_count += 1
                     continue
+                
+                # 已有分组（可能已被合并到内容分组中），加入后重新选择展示的文件
+                members = self.image_groups[group_id] + (row,)
+                self.image_groups[group_id] = members
+                self._group_col[row] = group_id
+                if self._has_both_versions(first_row, row):
+                    # 凑齐两个版本后不会再有新成员，删除查找键以节省内存
+                    del self._name_groups[name_key]
+            else:
+                # 重复加载的文件，只更新了大小
+                members = self.image_groups[group_id]
             
-            # 第二种类型的图片，直接添加
-            direct_images.append((file_path, size, filename))
+            regrouped.append((group_id, file_path))
+            index = self._group_position(members)
+            if index is None:
+                continue
+            representative = self._select_representative(group_id, members)
+            shown = self.image_files[index]
+            if shown != representative:
+                self.image_files[index] = representative
+                self._position_col[shown] = -1
+                self._position_col[representative] = index
+                replaced_indices.append(index)
         
-        # 选择保留的文件对
-        result = []
-        for file_hash, variants in groups.items():
-            if len(variants) == 2:
-                # 有两个版本，保留较大的
-                if variants.get('0', (None, 0))[1] > variants.get('720', (None, 0))[1]:
-                    result.append(variants['0'])
+        return added_count, replaced_indices, regrouped
+
+    def _add_row(self, file_path, size, mtime_ns=0):
+        """把文件加入ImageStore并同步分组列和位置列，返回行号"""
+        row = self.store.add(file_path, size, mtime_ns)
+        if row == len(self._group_col):
+            self._group_col.append(-1)
+            self._position_col.append(-1)
+        return row
+
+    def _append_file(self, row):
+        """把行添加到展示列表末尾"""
+        self._position_col[row] = len(self.image_files)
+        self.image_files.append(row)
+
+    def _group_position(self, members):
+        """获取分组当前展示的文件在image_files中的位置，未展示时返回None"""
+        for row in members:
+            index = self._position_col[row]
+            if index >= 0:
+                return index
+        return None
+
+    def _set_files(self, rows):
+        """替换整个展示列表并重建位置列"""
+        for row in self.image_files:
+            if row != TOMBSTONE:
+                self._position_col[row] = -1
+        self.image_files = rows
+        self._tombstones = 0
+        for i, row in enumerate(rows):
+            self._position_col[row] = i
+
+    def _compact(self):
+        """移除展示列表中的TOMBSTONE，多次移除只需一次线性压缩"""
+        if self._tombstones:
+            self._set_files(array('q', (row for row in self.image_files if row != TOMBSTONE)))
+
+    def _new_group(self, members):
+        """创建分组并返回分组编号
+        
+        Args:
+            members: 成员行号元组
+        """
+        group_id = self._next_group
+        self._next_group += 1
+        self.image_groups[group_id] = members
+        for row in members:
+            self._group_col[row] = group_id
+        return group_id
+
+    def _has_both_versions(self, row_a, row_b):
+        """判断两个文件是否分别为_0和_720版本"""
+        suffixes = {parse_image_name(self.store.names[row])[1] for row in (row_a, row_b)}
+        return suffixes == {'0', '720'}
+
+    def _select_representative(self, group_id, members):
+        """从分组中选择展示（保留）的文件
+        
+        有两个版本时保留较大的，大小相同时保留_720版本；合并的分组保留最大的文件
+        
+        Args:
+            group_id: 分组编号
+            members: 成员行号元组
+            
+        Returns:
+            int: 被选中的行号
+        """
+        if len(members) == 1:
+            return members[0]
+        sizes = self.store.sizes
+        if group_id not in self._merged_kinds:
+            suffixes = {}
+            for row in members:
+                suffixes[parse_image_name(self.store.names[row])[1]] = row
+            if '0' in suffixes and '720' in suffixes:
+                if sizes[suffixes['0']] > sizes[suffixes['720']]:
+                    return suffixes['0']
+                return suffixes['720']
+        return max(members, key=sizes.__getitem__)
+
+    def get_all_images(self):
+        """获取所有已加载的图片，包括分组中未展示的文件
+        
+        Returns:
+            RecordList: 元素为 (file_path, size, filename) 形式的ImageRecord
+        """
+        rows = [row for row in self.image_files if row != TOMBSTONE and self._group_col[row] < 0]
+        for members in self.image_groups.values():
+            rows.extend(members)
+        return RecordList(self.store, rows)
+
+    def get_columns(self):
+        """获取按行号排列的各列的快照，供清理规则在后台线程中一次性计算
+
+        Returns:
+            dict: store（用于生成路径）、names（文件名）、sizes和mtimes（大小和修改时间）、
+                  groups（所属分组编号，-1表示不属于任何分组）、positions（展示位置，-1表示未展示）、
+                  group_count（分组编号上限）、merged_kinds（合并分组的类型）
+        """
+        self._compact()
+        store = self.store
+        return {
+            'store': store,
+            'names': list(store.names),
+            'sizes': array('q', store.sizes),
+            'mtimes': array('q', store.mtimes),
+            'groups': array('q', self._group_col),
+            'positions': array('q', self._position_col),
+            'group_count': self._next_group,
+            'merged_kinds': dict(self._merged_kinds)
+        }
+
+    def _row_of(self, record):
+        """获取记录对应的行号，不在当前ImageStore中的文件会被添加"""
+        if isinstance(record, ImageRecord) and record.store is self.store:
+            return record.row
+        row = self.store.find(record[0])
+        if row is None:
+            row = self._add_row(record[0], record[1])
+        return row
+
+    def merge_groups(self, groups, kind):
+        """把额外发现的重复分组（如内容相同的图片）合并到image_groups中
+        
+        与已有分组有交集的会合并为一个分组，分组中只展示最大的文件，
+        之后keep_image/delete_image会像处理_0/_720分组一样处理这些文件
+        
+        Args:
+            groups: {分组标识: [(file_path, size, filename)]}
+            kind: 分组类型，如"content"，合并分组中保留最大的文件
+            
+        Returns:
+            int: 因合并而不再单独展示的图片数量
+        """
+        self._compact()
+        merged_ids = set()
+        
+        for records in groups.values():
+            # 收集与该组有交集的已有分组中的全部文件，已有分组的文件排在前面，大小相同时优先展示
+            members = []
+            seen = set()
+            old_ids = []
+            loose_rows = []
+            for record in records:
+                row = self._row_of(record)
+                old_id = self._group_col[row]
+                if old_id >= 0:
+                    if old_id not in old_ids:
+                        old_ids.append(old_id)
+                        for old_row in self.image_groups[old_id]:
+                            if old_row not in seen:
+                                seen.add(old_row)
+                                members.append(old_row)
                 else:
-                    result.append(variants['720'])
-            elif len(variants) == 1:
-                # 只有一个版本，直接保留
-                suffix = next(iter(variants.keys()))
-                result.append(variants[suffix])
+                    loose_rows.append(row)
+            for row in loose_rows:
+                if row not in seen:
+                    seen.add(row)
+                    members.append(row)
+            
+            if len(members) < 2:
+                continue
+            
+            for old_id in old_ids:
+                del self.image_groups[old_id]
+                self._merged_kinds.pop(old_id, None)
+                merged_ids.discard(old_id)
+            new_id = self._new_group(tuple(members))
+            self._merged_kinds[new_id] = kind
+            merged_ids.add(new_id)
         
-        # 添加第二种类型的图片
-        result.extend(direct_images)
+        # 每个合并后的分组中，原先展示的文件里位置最靠前的一个替换为新的展示文件，其余的隐藏
+        positions = self._position_col
+        removed_rows = set()
+        replacements = {}
+        for group_id in merged_ids:
+            members = self.image_groups[group_id]
+            shown = sorted(positions[row] for row in members if positions[row] >= 0)
+            if not shown:
+                continue
+            replacements[shown[0]] = self._select_representative(group_id, members)
+            for index in shown[1:]:
+                removed_rows.add(self.image_files[index])
         
-        # 存储分组信息供后续查询使用
-        self.image_groups = groups
+        if replacements or removed_rows:
+            new_files = array('q')
+            for i, row in enumerate(self.image_files):
+                if i in replacements:
+                    new_files.append(replacements[i])
+                elif row not in removed_rows:
+                    new_files.append(row)
+            self._set_files(new_files)
         
-        return result
+        return len(removed_rows)
+
+    def _deduplicate_images(self, images):
+        """根据图片名称去重，保留较大的文件，并存储分组信息
+        
+        Args:
+            images: 图片列表，每个元素为 (filename, file_path, size) 或 (file_path, size, filename)
+            
+        Returns:
+            RecordList: 去重后的图片列表
+        """
+        self._reset_groups(self.current_dir)
+        self.add_images(images)
+        return self.get_image_files()
+
+    def _group_key(self, file_path, file_hash):
+        """生成分组键
+        
+        递归扫描时不同子文件夹中可能出现相同的file_hash，因此分组键包含所在目录的编号
+        
+        Args:
+            file_path: 图片文件路径
+            file_hash: 从文件名解析出的哈希
+            
+        Returns:
+            tuple: (目录编号, file_hash)，作为_name_groups的键；目录未加载过时返回None
+        """
+        dir_id = self.store.dir_id(os.path.dirname(file_path))
+        if dir_id is None:
+            return None
+        return dir_id, file_hash
 
     def find_related_images(self, file_path):
         """根据文件路径找到所有相关的缓存文件，利用存储的分组信息快速查询
@@ -143,29 +442,26 @@ class ImageLoader:
             dir_path = os.path.dirname(file_path)
             filename = os.path.basename(file_path)
             
+            # 优先使用文件所属的分组（包括按内容合并的分组）
+            row = self.store.find(file_path)
+            if row is not None and self._group_col[row] >= 0:
+                return [self.store.path(member) for member in self.image_groups[self._group_col[row]]]
+            
             # 检查是否为第一种类型的图片（带_0或_720后缀）
-            name_parts = filename.rsplit('.', 1)
-            if len(name_parts) == 2:
-                base_name, ext = name_parts
-                if '_0' in base_name or '_720' in base_name:
-                    # 提取file_hash
-                    file_hash = base_name.rsplit('_', 1)[0]
-                    
-                    # 优先使用存储的分组信息
-                    if file_hash in self.image_groups:
-                        variants = self.image_groups[file_hash]
-                        related_files = []
-                        for suffix, (fp, size, fname) in variants.items():
-                            related_files.append(fp)
-                        return related_files
-                    
-                    # 如果分组信息中没有，则遍历目录查找
-                    for file in os.listdir(dir_path):
-                        if '.' in file:
-                            file_base, file_ext = file.rsplit('.', 1)
-                            if '_0' in file_base or '_720' in file_base:
-                                if file_base.rsplit('_', 1)[0] == file_hash:
-                                    return [os.path.join(dir_path, file)]
+            parsed = parse_image_name(filename)
+            if parsed:
+                file_hash = parsed[0]
+                
+                # 优先使用存储的分组信息
+                first_row = self._name_groups.get(self._group_key(file_path, file_hash))
+                if first_row is not None:
+                    return [self.store.path(member) for member in self.image_groups[self._group_col[first_row]]]
+                
+                # 如果分组信息中没有，则遍历目录查找
+                for file in os.listdir(dir_path):
+                    file_parsed = parse_image_name(file)
+                    if file_parsed and file_parsed[0] == file_hash:
+                        return [os.path.join(dir_path, file)]
             
             # 如果不匹配模式，只返回自身
             return [file_path]
@@ -173,13 +469,64 @@ class ImageLoader:
             print(f"查找相关文件错误: {e}")
             return [file_path]
 
+    def find_related_groups(self, file_paths):
+        """批量查找每个文件的相关文件，同一分组的成员路径只生成一次
+
+        Args:
+            file_paths: 文件路径列表
+
+        Returns:
+            list: 与file_paths一一对应的相关文件路径列表
+        """
+        group_paths = {}
+        results = []
+        for file_path in file_paths:
+            row = self.store.find(file_path)
+            if row is None:
+                # 未加载的文件按原方式查找
+                results.append(self.find_related_images(file_path))
+                continue
+            group_id = self._group_col[row]
+            if group_id < 0:
+                results.append([file_path])
+                continue
+            paths = group_paths.get(group_id)
+            if paths is None:
+                paths = group_paths[group_id] = [self.store.path(member) for member in self.image_groups[group_id]]
+            results.append(paths)
+        return results
+
     def get_image_files(self):
-        """获取当前加载的图片文件列表"""
-        return self.image_files
+        """获取当前加载的图片文件列表
+        
+        Returns:
+            RecordList: 元素为 (file_path, size, filename) 形式的ImageRecord
+        """
+        self._compact()
+        return RecordList(self.store, self.image_files)
 
     def get_image_count(self):
         """获取图片数量"""
-        return len(self.image_files)
+        return len(self.image_files) - self._tombstones
+
+    def index_of(self, file_path):
+        """获取图片在展示列表中的索引
+        
+        Args:
+            file_path: 图片文件路径
+            
+        Returns:
+            int: 图片索引，不在展示列表中时返回None
+        """
+        self._compact()
+        row = self.store.find(file_path)
+        if row is None or self._position_col[row] < 0:
+            return None
+        return self._position_col[row]
+
+    def get_scan_stats(self):
+        """获取最近一次扫描的统计信息（文件数、耗时、吞吐量）"""
+        return self.scanner.get_stats()
 
     def get_current_dir(self):
         """获取当前目录"""
@@ -192,10 +539,11 @@ class ImageLoader:
             index: 图片索引
             
         Returns:
-            tuple: (file_path, size, filename) 或 None
+            ImageRecord: (file_path, size, filename) 形式的记录，或 None
         """
+        self._compact()
         if 0 <= index < len(self.image_files):
-            return self.image_files[index]
+            return self.store.record(self.image_files[index])
         return None
 
     def remove_image(self, index):
@@ -207,13 +555,54 @@ class ImageLoader:
         Returns:
             bool: 是否成功移除
         """
+        self._compact()
         if 0 <= index < len(self.image_files):
-            self.image_files.pop(index)
+            self._remove_row(self.image_files[index])
             return True
         return False
 
+    def remove_images(self, file_paths):
+        """批量移除图片（如已被删除的文件），同时将其从所属分组中移除
+        
+        被移除的位置先标记为TOMBSTONE，下次访问列表时统一压缩，总耗时与列表长度成线性关系
+        
+        Args:
+            file_paths: 文件路径列表
+            
+        Returns:
+            int: 从展示列表中移除的图片数量
+        """
+        removed = 0
+        for file_path in file_paths:
+            row = self.store.find(file_path)
+            if row is not None and self._remove_row(row):
+                removed += 1
+        return removed
+
+    def _remove_row(self, row):
+        """移除一行：标记展示位置为TOMBSTONE并从分组中移除
+        
+        Returns:
+            bool: 该行是否在展示列表中
+        """
+        group_id = self._group_col[row]
+        if group_id >= 0:
+            self._group_col[row] = -1
+            members = tuple(member for member in self.image_groups[group_id] if member != row)
+            if members:
+                self.image_groups[group_id] = members
+            else:
+                del self.image_groups[group_id]
+                self._merged_kinds.pop(group_id, None)
+        
+        index = self._position_col[row]
+        if index < 0:
+            return False
+        self.image_files[index] = TOMBSTONE
+        self._position_col[row] = -1
+        self._tombstones += 1
+        return True
+
     def clear(self):
         """清空图片列表"""
-        self.image_files = []
-        self.current_dir = ""
-        self.image_groups = {}
+        self._reset_groups("")
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from PIL import Image
+
+
+# Image.reduce不支持的模式先转换为以下模式，未列出的转换为RGBA
+REDUCE_CONVERT_MODES = {'1': 'L', 'I;16': 'I'}
+# 每个通道的字节数，未列出的为1
+BAND_BYTES = {'I': 4, 'F': 4, 'I;16': 2}
+
+
+def image_nbytes(image):
+    """估算图片解码后占用的内存（字节）"""
+    return image.width * image.height * len(image.getbands()) * BAND_BYTES.get(image.mode, 1)
+
+
+def reduction_factor(size, scale):
+    """计算缩放到scale时可以使用的最大缩小倍数（2的幂），缩小后的图片不小于目标尺寸
+
+    Args:
+        size: 原图尺寸 (宽, 高)
+        scale: 相对原图的缩放比例
+
+    Returns:
+        int: 缩小倍数
+    """
+    factor = 1
+    while scale * factor * 2 <= 1 and min(size) >= factor * 2:
+        factor *= 2
+    return factor
+
+
+def decode_reduced(file_path, factor):
+    """按缩小倍数解码图片
+
+    JPEG通过Image.draft在解码时直接缩小到1/2、1/4或1/8，解码耗时和内存随之减少；
+    其他格式（以及超过1/8的部分）解码后用Image.reduce缩小，只减少保留的内存
+
+    Args:
+        file_path: 图片路径
+        factor: 缩小倍数（2的幂）
+
+    Returns:
+        tuple: (解码后的图片, 缩小倍数, 原图尺寸)
+    """
+    image = Image.open(file_path)
+    size = image.size
+    if factor > 1 and image.format == 'JPEG':
+        image.draft(image.mode, (-(-size[0] // factor), -(-size[1] // factor)))
+    image.load()
+    # 根据解码后的尺寸确定draft实际缩小的倍数
+    decoded = 1
+    while -(-size[0] // decoded) > image.width:
+        decoded *= 2
+    if decoded < factor:
+        image = ImagePyramid._reduce(image, factor // decoded)
+    return image, factor, size
+
+
+class ImagePyramid:
+    """单张图片的缩小层级（图像金字塔）
+
+    第0层为相对原图缩小到1/base_factor的图片（直接设置的图片即为原图），第k层再缩小到1/2^k，
+    在第一次需要时由上一层通过Image.reduce(2)生成。
+    缩放比例小于1时从不小于目标尺寸的最小层级重新采样，每次滚轮缩放不必再从原图重新采样；
+    从文件打开时只按适应画布需要的尺寸解码，放大到超过第0层的尺寸时再从文件重新解码
+    """
+
+    def __init__(self, image, size=None, base_factor=1, source=None):
+        """初始化图像金字塔
+
+        Args:
+            image: PIL Image对象，作为第0层
+            size: 原图尺寸，None表示image即为原图
+            base_factor: 第0层相对原图的缩小倍数
+            source: 图片文件路径，需要更大的层级时从中重新解码，None表示不重新解码
+        """
+        self.levels = [image]
+        self.size = size or image.size
+        self.base_factor = base_factor
+        self.source = source
+        # 已生成的层级占用的内存
+        self.nbytes = image_nbytes(image)
+        # 适应画布的视图 ((画布宽, 画布高), (位图, x坐标, y坐标))
+        self._fit_view = None
+
+    @classmethod
+    def open(cls, file_path, canvas_size=None):
+        """打开图片文件，只按适应画布需要的最小尺寸解码
+
+        Args:
+            file_path: 图片路径
+            canvas_size: (画布宽, 画布高)，None表示按原图尺寸解码
+
+        Returns:
+            ImagePyramid: 图像金字塔
+        """
+        factor = 1
+        if canvas_size is not None:
+            # 只读取文件头获取原图尺寸，计算适应画布的缩放比例
+            with Image.open(file_path) as image:
+                size = image.size
+            factor = reduction_factor(size, min(canvas_size[0] / size[0], canvas_size[1] / size[1]))
+        image, base_factor, size = decode_reduced(file_path, factor)
+        return cls(image, size, base_factor, file_path)
+
+    def level_for(self, scale):
+        """获取缩放到scale时用于重新采样的层级
+
+        Args:
+            scale: 相对原图的缩放比例
+
+        Returns:
+            tuple: (层级图片, 该层级相对原图的缩小倍数)
+        """
+        # 选择缩小后仍不小于目标尺寸的最小层级，第0层不够大时重新解码
+        factor = reduction_factor(self.size, scale)
+        if factor < self.base_factor and self.source is not None:
+            self._redecode(factor)
+        index = 0
+        while self.base_factor << (index + 1) <= factor:
+            index += 1
+        while len(self.levels) <= index:
+            self.levels.append(self._reduce(self.levels[-1]))
+            self.nbytes += image_nbytes(self.levels[-1])
+        return self.levels[index], self.base_factor << index
+
+    def get_fit_view(self, canvas_size):
+        """获取已生成的适应画布的视图，画布大小不同或尚未生成时返回None"""
+        if self._fit_view is not None and self._fit_view[0] == canvas_size:
+            return self._fit_view[1]
+        return None
+
+    def set_fit_view(self, canvas_size, rendered):
+        """保存适应画布的视图，替换之前按其他画布大小生成的视图
+
+        Args:
+            canvas_size: (画布宽, 画布高)
+            rendered: (位图, x坐标, y坐标)
+        """
+        if self._fit_view is not None:
+            self.nbytes -= image_nbytes(self._fit_view[1][0])
+        self._fit_view = (canvas_size, rendered)
+        self.nbytes += image_nbytes(rendered[0])
+
+    def _redecode(self, factor):
+        """按更小的缩小倍数重新解码第0层，之前生成的层级丢弃后按需重新生成"""
+        try:
+            image, self.base_factor, _ = decode_reduced(self.source, factor)
+        except Exception as e:
+            print(f"重新解码图片错误: {e}")
+            # 继续使用已解码的层级，不再重试
+            self.source = None
+            return
+        self.levels = [image]
+        self.nbytes = image_nbytes(image)
+        if self._fit_view is not None:
+            self.nbytes += image_nbytes(self._fit_view[1][0])
+
+    @staticmethod
+    def _reduce(image, factor=2):
+        """把图片缩小到1/factor，不支持的模式（如调色板图片）先转换"""
+        try:
+            return image.reduce(factor)
+        except ValueError:
+            return image.convert(REDUCE_CONVERT_MODES.get(image.mode, 'RGBA')).reduce(factor)
+
+
+class PyramidCache:
+    """按键（如文件路径）缓存图像金字塔，总内存超过上限时从最久未使用的开始移除"""
+
+    def __init__(self, max_bytes):
+        """初始化缓存
+
+        Args:
+            max_bytes: 全部金字塔占用内存的上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self._pyramids = OrderedDict()
+
+    def __len__(self):
+        return len(self._pyramids)
+
+    def __contains__(self, key):
+        return key in self._pyramids
+
+    def get(self, key):
+        """获取金字塔并标记为最近使用，不存在时返回None"""
+        pyramid = self._pyramids.get(key)
+        if pyramid is not None:
+            self._pyramids.move_to_end(key)
+        return pyramid
+
+    def put(self, key, pyramid):
+        """加入金字塔并标记为最近使用"""
+        self._pyramids[key] = pyramid
+        self._pyramids.move_to_end(key)
+
+    def discard(self, key):
+        """移除金字塔（如文件已被删除）"""
+        self._pyramids.pop(key, None)
+
+    def clear(self):
+        """移除全部金字塔"""
+        self._pyramids.clear()
+
+    def nbytes(self):
+        """全部金字塔占用的内存"""
+        return sum(pyramid.nbytes for pyramid in self._pyramids.values())
+
+    def trim(self, keep=()):
+        """从最久未使用的开始移除金字塔，直到总内存不超过上限
+
+        Args:
+            keep: 不移除的键（如当前显示的图片）
+        """
+        total = self.nbytes()
+        for key in list(self._pyramids):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            total -= self._pyramids.pop(key).nbytes
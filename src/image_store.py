@@ -0,0 +1,175 @@
+import os
+from array import array
+
+
+class ImageRecord:
+    """图片记录的轻量视图，行为与 (file_path, size, filename) 元组一致
+
+    只保存所属的ImageStore和行号，路径等字段在访问时才从列中读取
+    """
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def file_path(self):
+        return self.store.path(self.row)
+
+    @property
+    def size(self):
+        return self.store.sizes[self.row]
+
+    @property
+    def filename(self):
+        return self.store.names[self.row]
+
+    @property
+    def mtime_ns(self):
+        return self.store.mtimes[self.row]
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        yield self.store.path(self.row)
+        yield self.store.sizes[self.row]
+        yield self.store.names[self.row]
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.store.path(self.row)
+        if index == 1:
+            return self.store.sizes[self.row]
+        if index == 2:
+            return self.store.names[self.row]
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, ImageRecord):
+            return self.store is other.store and self.row == other.row
+        if isinstance(other, tuple):
+            return tuple(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __reduce__(self):
+        # 传给工作进程时序列化为普通元组，不连带整个ImageStore
+        return tuple, (tuple(self),)
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+class RecordList:
+    """按行号列表访问ImageStore的只读序列，元素为ImageRecord"""
+
+    __slots__ = ('store', 'rows')
+
+    def __init__(self, store, rows):
+        self.store = store
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ImageRecord(self.store, row) for row in self.rows[index]]
+        return ImageRecord(self.store, self.rows[index])
+
+    def __iter__(self):
+        store = self.store
+        for row in self.rows:
+            yield ImageRecord(store, row)
+
+
+class ImageStore:
+    """按列存储的图片信息表
+
+    路径拆分为目录编号和文件名，目录路径只保存一份；大小和修改时间保存在array('q')中，
+    避免为每个文件创建元组、完整路径字符串和整数对象。每个文件对应一个行号，
+    行号在clear()之前保持不变
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空全部记录"""
+        self.dirs = []
+        self._dir_ids = {}
+        # 每个目录中 文件名 -> 行号，用于按路径查找
+        self._dir_rows = []
+        self.dir_col = array('i')
+        self.names = []
+        self.sizes = array('q')
+        self.mtimes = array('q')
+
+    def __len__(self):
+        return len(self.names)
+
+    def dir_id(self, dir_path, create=False):
+        """获取目录编号
+
+        Args:
+            dir_path: 目录路径
+            create: 不存在时是否创建
+
+        Returns:
+            int: 目录编号，不存在且不创建时返回None
+        """
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None and create:
+            dir_id = len(self.dirs)
+            self.dirs.append(dir_path)
+            self._dir_ids[dir_path] = dir_id
+            self._dir_rows.append({})
+        return dir_id
+
+    def add(self, file_path, size, mtime_ns=0):
+        """添加一个文件，已存在时更新大小和修改时间
+
+        Args:
+            file_path: 文件路径
+            size: 文件大小
+            mtime_ns: 修改时间（纳秒），未知时为0
+
+        Returns:
+            int: 行号
+        """
+        dir_path, filename = os.path.split(file_path)
+        dir_id = self.dir_id(dir_path, create=True)
+        rows = self._dir_rows[dir_id]
+        row = rows.get(filename)
+        if row is not None:
+            self.sizes[row] = size
+            self.mtimes[row] = mtime_ns
+            return row
+        row = len(self.names)
+        rows[filename] = row
+        self.dir_col.append(dir_id)
+        self.names.append(filename)
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        return row
+
+    def find(self, file_path):
+        """按路径查找行号，不存在时返回None"""
+        dir_path, name = os.path.split(file_path)
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            return None
+        return self._dir_rows[dir_id].get(name)
+
+    def path(self, row):
+        """获取行对应的完整路径"""
+        return os.path.join(self.dirs[self.dir_col[row]], self.names[row])
+
+    def record(self, row):
+        """获取行对应的记录视图"""
+        return ImageRecord(self, row)
@@ -1,19 +1,114 @@
 import tkinter as tk
 from PIL import Image, ImageTk
+from .image_pyramid import ImagePyramid, PyramidCache
+
+
+# 图像金字塔缓存的默认内存上限
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# 交互过程中两次重绘的最小间隔（毫秒），期间的多个事件合并为一次重绘
+FRAME_INTERVAL_MS = 16
+# 停止交互多久后用LANCZOS重新绘制（毫秒）
+REFINE_DELAY_MS = 150
+# 画布大小变化后等待多久再重新绘制（毫秒）
+RESIZE_DELAY_MS = 100
+# 交互过程中快速预览使用的重采样方式
+PREVIEW_RESAMPLE = Image.BILINEAR
+
+
+def fit_scale(image_size, canvas_width, canvas_height):
+    """计算图片适应画布的缩放比例
+    
+    Args:
+        image_size: 图片尺寸 (宽, 高)
+        canvas_width: 画布宽度
+        canvas_height: 画布高度
+        
+    Returns:
+        float: 缩放比例
+    """
+    img_width, img_height = image_size
+    return min(canvas_width / img_width, canvas_height / img_height)
+
+
+def render_region(pyramid, scale, offset_x, offset_y, canvas_width, canvas_height, resample=Image.LANCZOS):
+    """生成缩放后的图片在画布上可见部分的位图
+    
+    先根据偏移量和缩放比例计算出画布可见区域对应的原图矩形，只对这部分像素重新采样，
+    放大时的耗时和内存只与画布大小有关，与原图大小无关；缩小时从图像金字塔中最接近的较大层级重新采样
+    
+    Args:
+        pyramid: 图片的图像金字塔（ImagePyramid）
+        scale: 相对原图的缩放比例
+        offset_x: 水平偏移量，缩放比例为1时不使用
+        offset_y: 垂直偏移量，缩放比例为1时不使用
+        canvas_width: 画布宽度
+        canvas_height: 画布高度
+        resample: 重采样方式
+        
+    Returns:
+        tuple: (可见部分的PIL Image, 画布上的x坐标, 画布上的y坐标)，图片完全不可见时返回None
+    """
+    img_width, img_height = pyramid.size
+    
+    # 计算缩放后的图片尺寸
+    scaled_width = int(img_width * scale)
+    scaled_height = int(img_height * scale)
+    if scaled_width <= 0 or scaled_height <= 0:
+        return None
+    
+    # 计算缩放后的图片在画布上的位置
+    if scale == 1.0:
+        # 原始大小，居中显示
+        x = (canvas_width - scaled_width) // 2
+        y = (canvas_height - scaled_height) // 2
+    else:
+        # 缩放状态，使用偏移量
+        x = (canvas_width - scaled_width) // 2 + offset_x
+        y = (canvas_height - scaled_height) // 2 + offset_y
+    
+    # 缩放后的图片与画布相交的区域（画布坐标）
+    left = max(x, 0)
+    top = max(y, 0)
+    right = min(x + scaled_width, canvas_width)
+    bottom = min(y + scaled_height, canvas_height)
+    if right <= left or bottom <= top:
+        return None
+    
+    # 对应的层级图片中的矩形，resize的box参数支持小数坐标，边缘像素的采样与缩放整张图片后裁剪一致
+    level, _ = pyramid.level_for(scale)
+    ratio_x = level.width / scaled_width
+    ratio_y = level.height / scaled_height
+    box = (
+        (left - x) * ratio_x,
+        (top - y) * ratio_y,
+        (right - x) * ratio_x,
+        (bottom - y) * ratio_y
+    )
+    visible = level.resize((right - left, bottom - top), resample, box=box)
+    return visible, left, top
 
 
 class ImageViewer:
-    """图片查看器，负责图片的显示、缩放和拖动交互"""
+    """图片查看器，负责图片的显示、缩放和拖动交互
+
+    滚轮缩放时不立即重绘，而是在下一帧把期间的全部事件合并为一次快速预览（BILINEAR），
+    停止交互一段时间后再用LANCZOS重新绘制；拖动时只用canvas.move移动已绘制的图片，停止后再重新绘制可见部分
+    """
 
-    def __init__(self, canvas):
+    def __init__(self, canvas, cache_bytes=DEFAULT_CACHE_BYTES):
         """初始化图片查看器
         
         Args:
             canvas: tkinter Canvas对象
+            cache_bytes: 图像金字塔缓存的内存上限（字节）
         """
         self.canvas = canvas
         self.original_image = None
         self.current_image = None
+        # 当前图片的图像金字塔，以及按文件路径缓存的金字塔
+        self.pyramid = None
+        self.image_key = None
+        self.pyramids = PyramidCache(cache_bytes)
         
         # 图片缩放和平移相关变量
         self.scale = 1.0
@@ -24,22 +119,96 @@ class ImageViewer:
         self.dragging = False
         self.last_x = 0
         self.last_y = 0
+        # 当前是否为适应画布的缩放比例，画布大小变化时据此重新适应画布
+        self.fitted = False
+        
+        # 画布上的图片项和等待执行的重绘任务（after返回的ID）
+        self._image_item = None
+        self._frame_job = None
+        self._refine_job = None
+        self._resize_job = None
+        self._canvas_size = None
 
-    def set_image(self, image):
+    def set_image(self, image, key=None):
         """设置要显示的图片
         
         Args:
             image: PIL Image对象
+            key: 缓存图像金字塔使用的键（如文件路径），已缓存时复用其中已解码的层级，None表示不缓存
+        """
+        pyramid = self.pyramids.get(key) if key is not None else None
+        if pyramid is None or pyramid.size != image.size:
+            pyramid = ImagePyramid(image)
+            if key is not None:
+                self.pyramids.put(key, pyramid)
+        self._use_pyramid(key, pyramid)
+
+    def open_image(self, file_path):
+        """打开图片文件并设为要显示的图片，已缓存时直接使用
+        
+        只按适应当前画布需要的尺寸解码（JPEG在解码时直接缩小），放大到超过该尺寸时再重新解码
+        
+        Args:
+            file_path: 图片路径，同时作为缓存的键
         """
-        self.original_image = image
+        if self.set_cached_image(file_path):
+            return
+        canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        pyramid = ImagePyramid.open(file_path, canvas_size)
+        self.pyramids.put(file_path, pyramid)
+        self._use_pyramid(file_path, pyramid)
+
+    def set_cached_image(self, key):
+        """显示已缓存（如已由后台预取）的图片，不需要重新打开文件
+        
+        Args:
+            key: 缓存的键（如文件路径）
+            
+        Returns:
+            bool: 是否已缓存
+        """
+        pyramid = self.pyramids.get(key)
+        if pyramid is None:
+            return False
+        self._use_pyramid(key, pyramid)
+        return True
+
+    def _use_pyramid(self, key, pyramid):
+        """把图像金字塔设为当前图片并重置视图"""
+        self.pyramid = pyramid
+        self.image_key = key
+        self.original_image = pyramid.levels[0]
         self.reset_view()
 
+    def cache_image(self, key, pyramid):
+        """把后台预取的图像金字塔加入缓存，超过内存上限的部分在下次绘制时移除"""
+        self.pyramids.put(key, pyramid)
+
+    def evict(self, keys):
+        """从缓存中移除图片（如文件已被删除），当前显示的图片不受影响"""
+        for key in keys:
+            self.pyramids.discard(key)
+
+    def evict_all(self):
+        """清空缓存（如切换了文件夹），当前显示的图片不受影响"""
+        self.pyramids.clear()
+
     def reset_view(self):
         """重置视图状态"""
         self.scale = 1.0
         self.offset_x = 0
         self.offset_y = 0
 
+    def fit_to_canvas(self):
+        """缩放图片以适应画布并绘制"""
+        if not self.original_image:
+            return
+        self.scale = self.calculate_initial_scale(self.canvas.winfo_width(), self.canvas.winfo_height())
+        self.offset_x = 0
+        self.offset_y = 0
+        self.fitted = True
+        self.draw_image()
+
     def calculate_initial_scale(self, canvas_width, canvas_height):
         """计算初始缩放比例以适应画布
         
@@ -53,11 +222,42 @@ class ImageViewer:
         if not self.original_image:
             return 1.0
         
-        img_width, img_height = self.original_image.size
-        return min(canvas_width / img_width, canvas_height / img_height)
+        return fit_scale(self.pyramid.size, canvas_width, canvas_height)
 
-    def draw_image(self):
-        """根据当前缩放比例和偏移量绘制图片"""
+    def render_view(self, canvas_width, canvas_height, resample=Image.LANCZOS):
+        """按当前缩放比例和偏移量生成画布上可见部分的图片
+        
+        适应画布的视图生成后保存在图像金字塔中，再次显示（或已由后台预取生成）时直接使用
+        
+        Args:
+            canvas_width: 画布宽度
+            canvas_height: 画布高度
+            resample: 重采样方式，交互过程中的快速预览使用BILINEAR
+            
+        Returns:
+            tuple: (可见部分的PIL Image, 画布上的x坐标, 画布上的y坐标)，图片完全不可见时返回None
+        """
+        fit_view = self.fitted and resample == Image.LANCZOS
+        canvas_size = (canvas_width, canvas_height)
+        if fit_view:
+            rendered = self.pyramid.get_fit_view(canvas_size)
+            if rendered is not None:
+                return rendered
+        rendered = render_region(
+            self.pyramid, self.scale, self.offset_x, self.offset_y, canvas_width, canvas_height, resample
+        )
+        if fit_view and rendered is not None:
+            self.pyramid.set_fit_view(canvas_size, rendered)
+        return rendered
+
+    def draw_image(self, resample=Image.LANCZOS):
+        """根据当前缩放比例和偏移量立即绘制图片，只缩放画布上可见的部分
+        
+        Args:
+            resample: 重采样方式，使用LANCZOS时取消等待中的预览和重绘
+        """
+        if resample == Image.LANCZOS:
+            self._cancel_jobs()
         if not self.original_image:
             return
         
@@ -65,32 +265,70 @@ class ImageViewer:
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         
-        # 获取原始图片尺寸
-        img_width, img_height = self.original_image.size
-        
-        # 计算缩放后的图片尺寸
-        scaled_width = int(img_width * self.scale)
-        scaled_height = int(img_height * self.scale)
-        
-        # 调整图片大小
-        resized_image = self.original_image.resize((scaled_width, scaled_height), Image.LANCZOS)
-        photo = ImageTk.PhotoImage(resized_image)
-        
-        # 计算图片在画布上的位置
-        if self.scale == 1.0:
-            # 原始大小，居中显示
-            x = (canvas_width - scaled_width) // 2
-            y = (canvas_height - scaled_height) // 2
-        else:
-            # 缩放状态，使用偏移量
-            x = (canvas_width - scaled_width) // 2 + self.offset_x
-            y = (canvas_height - scaled_height) // 2 + self.offset_y
+        rendered = self.render_view(canvas_width, canvas_height, resample)
+        # 新生成的层级可能使缓存超过内存上限，当前图片的金字塔保留
+        self.pyramids.trim(keep=(self.image_key,))
         
         # 清空画布并显示图片
         self.canvas.delete("all")
-        self.canvas.create_image(x, y, anchor=tk.NW, image=photo)
+        if rendered is None:
+            self._image_item = None
+            self.canvas.image = None
+            return
+        visible, x, y = rendered
+        photo = ImageTk.PhotoImage(visible)
+        self._image_item = self.canvas.create_image(x, y, anchor=tk.NW, image=photo)
         self.canvas.image = photo
 
+    def schedule_draw(self):
+        """在下一帧绘制快速预览，之前等待中的重绘合并为这一次"""
+        if self._frame_job is None:
+            self._frame_job = self.canvas.after(FRAME_INTERVAL_MS, self._on_frame)
+
+    def _on_frame(self):
+        """绘制快速预览，并在停止交互一段时间后用LANCZOS重新绘制"""
+        self._frame_job = None
+        self.draw_image(PREVIEW_RESAMPLE)
+        self._schedule_refine()
+
+    def _schedule_refine(self):
+        """重新开始等待，停止交互REFINE_DELAY_MS毫秒后用LANCZOS重新绘制"""
+        if self._refine_job is not None:
+            self.canvas.after_cancel(self._refine_job)
+        self._refine_job = self.canvas.after(REFINE_DELAY_MS, self.draw_image)
+
+    def _cancel_jobs(self):
+        """取消等待中的预览和重绘"""
+        for name in ('_frame_job', '_refine_job', '_resize_job'):
+            job = getattr(self, name)
+            if job is not None:
+                self.canvas.after_cancel(job)
+                setattr(self, name, None)
+
+    def on_configure(self, event):
+        """处理画布大小变化事件，连续变化停止后再重新绘制
+        
+        Args:
+            event: 画布大小变化事件
+        """
+        size = (event.width, event.height)
+        if size == self._canvas_size:
+            return
+        self._canvas_size = size
+        if not self.original_image:
+            return
+        if self._resize_job is not None:
+            self.canvas.after_cancel(self._resize_job)
+        self._resize_job = self.canvas.after(RESIZE_DELAY_MS, self._on_resized)
+
+    def _on_resized(self):
+        """画布大小变化停止后重新绘制，之前适应画布的图片重新适应新的画布大小"""
+        self._resize_job = None
+        if self.fitted:
+            self.fit_to_canvas()
+        else:
+            self.draw_image()
+
     def on_mouse_wheel(self, event):
         """处理鼠标滚轮事件，实现图片缩放
         
@@ -111,9 +349,10 @@ class ImageViewer:
         
         # 限制缩放比例在最小和最大范围内
         self.scale = max(self.min_scale, min(self.max_scale, self.scale))
+        self.fitted = False
         
-        # 重新绘制图片
-        self.draw_image()
+        # 在下一帧重新绘制图片，快速滚动时多个事件只重绘一次
+        self.schedule_draw()
 
     def on_mouse_down(self, event):
         """处理鼠标按下事件，开始拖动图片
@@ -145,9 +384,15 @@ class ImageViewer:
         # 更新上次鼠标位置
         self.last_x = event.x
         self.last_y = event.y
+        self.fitted = False
         
-        # 重新绘制图片
-        self.draw_image()
+        if self._image_item is None:
+            # 图片已完全移出画布，没有可移动的图片项
+            self.schedule_draw()
+            return
+        # 只移动已绘制的图片，停止拖动后再重新绘制新露出的部分
+        self.canvas.move(self._image_item, dx, dy)
+        self._schedule_refine()
 
     def on_mouse_up(self, event):
         """处理鼠标释放事件，结束拖动图片
@@ -159,7 +404,12 @@ class ImageViewer:
 
     def clear(self):
         """清空画布"""
+        self._cancel_jobs()
         self.canvas.delete("all")
+        self._image_item = None
+        self.fitted = False
         self.original_image = None
         self.current_image = None
+        self.pyramid = None
+        self.image_key = None
         self.reset_view()
@@ -0,0 +1,152 @@
+class OperationGroup:
+    """一次用户操作（保留或删除一组相关文件）暂存的全部操作"""
+
+    __slots__ = ('file_path', 'action', 'ops', 'overwritten')
+
+    def __init__(self, file_path, action, ops):
+        """初始化操作组
+
+        Args:
+            file_path: 用户操作的图片路径
+            action: 用户操作类型，"keep" 或 "delete"
+            ops: 暂存的操作列表 [(文件路径, 操作类型)]
+        """
+        self.file_path = file_path
+        self.action = action
+        self.ops = ops
+        # 暂存时被覆盖的旧操作 [(文件路径, 旧操作类型, 旧操作所属的操作组)]
+        self.overwritten = []
+
+
+class OperationJournal:
+    """暂存操作日志
+
+    以文件路径为键保存每个文件当前的暂存操作（按暂存顺序），并以操作组为单位维护撤销栈和重做栈。
+    暂存、覆盖检测、撤销和重做的耗时只与操作组内的文件数量有关，与已暂存的操作总数无关
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空全部暂存操作和撤销/重做记录"""
+        # 文件路径 -> 操作类型
+        self.ops = {}
+        # 文件路径 -> 暂存该操作的操作组
+        self.owners = {}
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __contains__(self, file_path):
+        return file_path in self.ops
+
+    def get(self, file_path):
+        """获取文件当前的暂存操作，没有时返回None"""
+        return self.ops.get(file_path)
+
+    def items(self):
+        """按暂存顺序获取全部操作 [(文件路径, 操作类型)]"""
+        return list(self.ops.items())
+
+    def count(self, action):
+        """统计某种操作的数量"""
+        return sum(1 for op_action in self.ops.values() if op_action == action)
+
+    def stage(self, file_path, action, ops):
+        """暂存一组操作，同一文件的旧操作会被覆盖，并清空重做栈
+
+        Args:
+            file_path: 用户操作的图片路径
+            action: 用户操作类型
+            ops: 暂存的操作列表 [(文件路径, 操作类型)]
+
+        Returns:
+            list: 被覆盖的旧操作 [(文件路径, 旧操作类型)]
+        """
+        group = OperationGroup(file_path, action, list(ops))
+        self._apply(group)
+        self.undo_stack.append(group)
+        self.redo_stack = []
+        return [(op_path, old_action) for op_path, old_action, _ in group.overwritten]
+
+    def _apply(self, group):
+        """把操作组写入日志，记录被覆盖的旧操作"""
+        group.overwritten = []
+        for op_path, op_action in group.ops:
+            old_action = self.ops.pop(op_path, None)
+            if old_action is not None:
+                group.overwritten.append((op_path, old_action, self.owners.get(op_path)))
+            self.ops[op_path] = op_action
+            self.owners[op_path] = group
+
+    def extend_group(self, file_path, ops):
+        """把操作追加到暂存file_path操作的操作组中，撤销该组时一并撤销
+
+        Args:
+            file_path: 操作组中已暂存的任一文件路径
+            ops: 追加的操作列表 [(文件路径, 操作类型)]，文件不能已有暂存操作
+        """
+        group = self.owners[file_path]
+        for op_path, op_action in ops:
+            group.ops.append((op_path, op_action))
+            self.ops[op_path] = op_action
+            self.owners[op_path] = group
+
+    def undo(self):
+        """撤销最近的操作组，恢复被它覆盖的旧操作
+
+        Returns:
+            OperationGroup: 被撤销的操作组，没有可撤销的操作时返回None
+        """
+        if not self.undo_stack:
+            return None
+        group = self.undo_stack.pop()
+        for op_path, _ in group.ops:
+            if self.owners.get(op_path) is group:
+                del self.ops[op_path]
+                del self.owners[op_path]
+        for op_path, old_action, old_owner in group.overwritten:
+            self.ops[op_path] = old_action
+            if old_owner is not None:
+                self.owners[op_path] = old_owner
+        self.redo_stack.append(group)
+        return group
+
+    def redo(self):
+        """重做最近撤销的操作组
+
+        Returns:
+            OperationGroup: 被重做的操作组，没有可重做的操作时返回None
+        """
+        if not self.redo_stack:
+            return None
+        group = self.redo_stack.pop()
+        self._apply(group)
+        self.undo_stack.append(group)
+        return group
+
+    def retain(self, file_paths):
+        """只保留指定文件的暂存操作（如中途取消应用后尚未执行的操作），并从撤销/重做记录中移除其余文件
+
+        Args:
+            file_paths: 需要保留的文件路径集合
+        """
+        keep = set(file_paths)
+        self.ops = {path: action for path, action in self.ops.items() if path in keep}
+        self.owners = {path: group for path, group in self.owners.items() if path in keep}
+        self.undo_stack = self._prune_groups(self.undo_stack, keep)
+        self.redo_stack = self._prune_groups(self.redo_stack, keep)
+
+    @staticmethod
+    def _prune_groups(groups, keep):
+        """从操作组中移除不在keep中的文件，丢弃变为空的操作组"""
+        pruned = []
+        for group in groups:
+            group.ops = [op for op in group.ops if op[0] in keep]
+            group.overwritten = [entry for entry in group.overwritten if entry[0] in keep]
+            if group.ops:
+                pruned.append(group)
+        return pruned
@@ -0,0 +1,353 @@
+from functools import partial
+from PIL import Image
+from .hash_index import HashIndex, popcount
+from .pipeline import ProcessPipeline
+
+# numpy为可选依赖，只有查找相似图片时才需要
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 哈希边长，8x8共64位
+HASH_SIZE = 8
+# pHash进行DCT变换前的缩略图边长
+PHASH_IMAGE_SIZE = 32
+HASH_METHODS = ("dhash", "phash")
+
+
+def require_numpy():
+    """检查numpy是否可用
+
+    Raises:
+        ImportError: 未安装numpy时抛出，附带安装提示
+    """
+    if np is None:
+        raise ImportError("查找相似图片需要numpy，请使用以下命令安装：pip install numpy")
+
+
+def hash_input_size(method):
+    """获取哈希方法需要的灰度缩略图尺寸
+
+    Args:
+        method: "dhash" 或 "phash"
+
+    Returns:
+        tuple: (宽, 高)
+    """
+    if method == "dhash":
+        # 每行9个像素产生8个相邻差值
+        return HASH_SIZE + 1, HASH_SIZE
+    return PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE
+
+
+def load_gray_thumbnail(file_path, size):
+    """以缩小的尺寸解码图片并转换为灰度缩略图
+
+    JPEG图片通过draft()直接在DCT阶段按1/2、1/4、1/8缩小解码，
+    避免先解码出完整分辨率的位图
+
+    Args:
+        file_path: 图片路径
+        size: 缩略图尺寸 (宽, 高)
+
+    Returns:
+        bytes: 灰度像素数据，长度为 宽*高
+    """
+    with Image.open(file_path) as img:
+        img.draft('L', size)
+        thumb = img.convert('L').resize(size, Image.LANCZOS)
+        return thumb.tobytes()
+
+
+def dct_matrix(n):
+    """生成n阶DCT-II正交变换矩阵"""
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0, :] = np.sqrt(1.0 / n)
+    return matrix
+
+
+def pack_bits(bits):
+    """把每行64个布尔值打包成一个无符号64位整数
+
+    Args:
+        bits: 形状为 (N, 64) 的布尔数组
+
+    Returns:
+        numpy.ndarray: 形状为 (N,) 的uint64数组
+    """
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return packed.view('>u8').reshape(-1).astype(np.uint64)
+
+
+def dhash_batch(pixels):
+    """批量计算差异哈希（dHash）
+
+    Args:
+        pixels: 形状为 (N, 8, 9) 的灰度数组
+
+    Returns:
+        numpy.ndarray: 形状为 (N,) 的uint64哈希数组
+    """
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return pack_bits(bits.reshape(len(pixels), -1))
+
+
+def phash_batch(pixels):
+    """批量计算感知哈希（pHash）
+
+    对整批缩略图同时做二维DCT，取左上角8x8低频系数与其中位数比较
+
+    Args:
+        pixels: 形状为 (N, 32, 32) 的灰度数组
+
+    Returns:
+        numpy.ndarray: 形状为 (N,) 的uint64哈希数组
+    """
+    matrix = dct_matrix(PHASH_IMAGE_SIZE)
+    coeffs = matrix @ pixels @ matrix.T
+    low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # 直流分量不参与中位数计算
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return pack_bits(low > median)
+
+
+def hash_pixels(method, raw_pixels):
+    """把一批灰度缩略图数据转换为哈希
+
+    Args:
+        method: "dhash" 或 "phash"
+        raw_pixels: load_gray_thumbnail返回的字节串列表
+
+    Returns:
+        numpy.ndarray: 形状为 (N,) 的uint64哈希数组
+    """
+    width, height = hash_input_size(method)
+    pixels = np.frombuffer(b''.join(raw_pixels), dtype=np.uint8)
+    pixels = pixels.reshape(len(raw_pixels), height, width).astype(np.float32)
+    if method == "dhash":
+        return dhash_batch(pixels)
+    return phash_batch(pixels)
+
+
+def hash_chunk(method, records):
+    """解码一块图片并计算哈希，在工作进程中执行
+
+    Args:
+        method: "dhash" 或 "phash"
+        records: 图片列表 [(file_path, size, filename)]
+
+    Returns:
+        list: 与records等长的 [(64位哈希, 错误信息)]
+    """
+    size = hash_input_size(method)
+    results = [None] * len(records)
+    raw_pixels = []
+    positions = []
+    for i, (file_path, _, _) in enumerate(records):
+        try:
+            raw_pixels.append(load_gray_thumbnail(file_path, size))
+            positions.append(i)
+        except Exception as e:
+            results[i] = (None, str(e))
+    if raw_pixels:
+        for i, value in zip(positions, hash_pixels(method, raw_pixels)):
+            results[i] = (int(value), None)
+    return results
+
+
+class PerceptualHasher:
+    """感知哈希计算器，批量解码图片并用numpy向量化计算dHash/pHash
+
+    解码是CPU密集型任务，图片较多时分块交给进程池并行处理
+    """
+
+    def __init__(self, method="dhash", batch_size=64, max_workers=None):
+        """初始化感知哈希计算器
+
+        Args:
+            method: 哈希方法，"dhash" 或 "phash"
+            batch_size: 每块解码并向量化计算的图片数量
+            max_workers: 进程数量，None表示使用CPU核心数，小于等于1时不使用进程池
+        """
+        require_numpy()
+        if method not in HASH_METHODS:
+            raise ValueError(f"不支持的哈希方法: {method}")
+        self.method = method
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.skipped_files = []
+        self.worker_stats = []
+        self.cancelled = False
+
+    def hash_images(self, images, is_cancelled=None, progress=None):
+        """计算图片的感知哈希
+
+        Args:
+            images: 图片列表 [(file_path, size, filename)]
+            is_cancelled: 返回是否取消的函数，None表示不可取消
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+
+        Returns:
+            dict: {file_path: 64位哈希}，被取消时返回已完成的部分
+        """
+        workers = self.max_workers
+        # 图片太少时启动进程的开销超过并行带来的收益
+        if len(images) < self.batch_size * 2:
+            workers = 1
+        pipeline = ProcessPipeline(
+            partial(hash_chunk, self.method), max_workers=workers, chunk_size=self.batch_size
+        )
+        hashes = {}
+        for (file_path, _, _), value in pipeline.run(images, is_cancelled, progress):
+            hashes[file_path] = value
+
+        self.skipped_files = [(record[2], error) for record, error in pipeline.errors]
+        self.worker_stats = pipeline.get_worker_stats()
+        self.cancelled = pipeline.cancelled
+        return hashes
+
+
+class NearDuplicateFinder:
+    """相似图片查找器，维护感知哈希索引并增量计算新文件的哈希
+
+    已计算的哈希保存在扫描索引中，文件大小和修改时间都未变化时直接复用，
+    再次查找时只需要解码新增或变化的图片
+    """
+
+    def __init__(self, method="dhash", scan_index=None, folder_path=None, batch_size=64, max_workers=None):
+        """初始化相似图片查找器
+
+        Args:
+            method: 哈希方法，"dhash" 或 "phash"
+            scan_index: 持久化扫描索引（ScanIndex实例），None表示不保存哈希
+            folder_path: 当前文件夹路径，作为扫描索引中的键
+            batch_size: 每块解码并向量化计算的图片数量
+            max_workers: 解码图片的进程数量，None表示使用CPU核心数
+        """
+        self.hasher = PerceptualHasher(method, batch_size, max_workers)
+        self.method = method
+        self.scan_index = scan_index
+        self.folder_path = folder_path
+        self.index = HashIndex()
+        # 计算哈希时的 (文件大小, 修改时间)，用于判断缓存的哈希是否仍然有效
+        self.stamps = {}
+        # 扫描索引中保存的哈希 {file_path: (size, mtime_ns, 哈希)}，第一次更新时读取
+        self.cached = None
+        self.skipped_files = []
+
+    def update(self, images, is_cancelled=None, progress=None):
+        """把图片加入哈希索引，只计算索引中没有或大小、修改时间已变化的图片
+
+        Args:
+            images: 图片列表，元素为ImageRecord（通过mtime_ns获取修改时间）
+            is_cancelled: 返回是否取消的函数
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+
+        Returns:
+            int: 新计算哈希的图片数量
+        """
+        if self.cached is None:
+            self.cached = self.scan_index.load_hashes(self.folder_path, self.method) if self.scan_index else {}
+        cached = self.cached
+        pending = []
+        stamps = {}
+        for record in images:
+            file_path, size, _ = record
+            stamp = stamps[file_path] = (size, record.mtime_ns)
+            if self.stamps.get(file_path) == stamp:
+                continue
+            cached_entry = cached.get(file_path)
+            if cached_entry and cached_entry[:2] == stamp:
+                self.index.add(file_path, cached_entry[2])
+                self.stamps[file_path] = stamp
+            else:
+                pending.append(record)
+
+        hashes = self.hasher.hash_images(pending, is_cancelled, progress)
+        self.skipped_files = self.hasher.skipped_files
+        new_entries = {}
+        for file_path, _, _ in pending:
+            if file_path in hashes:
+                self.index.add(file_path, hashes[file_path])
+                self.stamps[file_path] = stamps[file_path]
+                new_entries[file_path] = (*stamps[file_path], hashes[file_path])
+
+        if self.scan_index and new_entries:
+            self.scan_index.save_hashes(self.folder_path, self.method, new_entries)
+        return len(new_entries)
+
+    def remove(self, file_paths):
+        """从索引中移除已删除的图片
+
+        Args:
+            file_paths: 文件路径列表
+        """
+        for file_path in file_paths:
+            self.index.remove(file_path)
+            self.stamps.pop(file_path, None)
+        if self.scan_index:
+            self.scan_index.delete_hashes(self.folder_path, self.method, file_paths)
+
+    def find_groups(self, images, max_distance):
+        """查找相似图片分组
+
+        Args:
+            images: 参与分组的图片列表 [(file_path, size, filename)]
+            max_distance: 最大汉明距离
+
+        Returns:
+            dict: {分组编号: [(file_path, size, filename)]}，每组至少包含两个文件
+        """
+        records = {record[0]: record for record in images}
+        hashes = {path: self.index.get(path) for path in records if path in self.index}
+        clusters = cluster_hashes(hashes, max_distance, self.index)
+        return {i: [records[path] for path in members] for i, members in enumerate(clusters)}
+
+
+def cluster_hashes(hashes, max_distance, index=None):
+    """把汉明距离不超过max_distance的图片聚成一组（全连接）
+
+    不使用传递闭包：A~B~C……这样逐步变化的一串图片不会连成一组，
+    组内任意两张图片的距离都不超过max_distance。
+    近邻最多的图片优先作为组的中心，近邻按与中心的距离从近到远加入，
+    与组内已有的每张图片距离都不超过max_distance时才加入
+
+    Args:
+        hashes: {file_path: 64位哈希}
+        max_distance: 最大汉明距离
+        index: 已包含这些哈希的HashIndex，None时临时创建
+
+    Returns:
+        list: 分组列表，每组为至少包含两个文件路径的列表
+    """
+    if index is None:
+        index = HashIndex()
+        index.update(hashes.items())
+
+    neighbors = {}
+    for path, value in hashes.items():
+        neighbors[path] = sorted(
+            (distance, other) for other, distance in index.query(value, max_distance)
+            if other != path and other in hashes
+        )
+
+    assigned = set()
+    clusters = []
+    for path in sorted(hashes, key=lambda path: (-len(neighbors[path]), path)):
+        if path in assigned:
+            continue
+        members = [path]
+        for _, other in neighbors[path]:
+            if other in assigned:
+                continue
+            value = hashes[other]
+            if all(popcount(hashes[member] ^ value) <= max_distance for member in members[1:]):
+                members.append(other)
+        if len(members) > 1:
+            assigned.update(members)
+            clusters.append(members)
+    return clusters
@@ -0,0 +1,174 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+# 工作进程异常退出后重新创建进程池的最大次数，超过后剩余的数据块全部记为失败
+MAX_POOL_RESTARTS = 3
+
+
+def run_chunk(chunk_func, chunk):
+    """在工作进程中处理一个数据块，并附带进程号和耗时用于统计吞吐量
+
+    Args:
+        chunk_func: 数据块处理函数，返回与输入等长的 [(结果, 错误信息)] 列表
+        chunk: 数据块
+
+    Returns:
+        tuple: (进程号, 耗时（秒）, 处理结果列表)
+    """
+    start = time.perf_counter()
+    results = chunk_func(chunk)
+    return os.getpid(), time.perf_counter() - start, results
+
+
+class ProcessPipeline:
+    """进程池流水线，把CPU密集的图片解码/哈希任务分块提交到多个进程
+
+    同时在途的数据块数量有上限，处理完一块再提交下一块，因此内存占用不随输入规模增长。
+    单个文件出错只记录到errors中，不会中断整个流水线；工作进程异常退出时，
+    在途的数据块记为失败，重新创建进程池继续处理剩余的数据块
+    """
+
+    def __init__(self, chunk_func, max_workers=None, chunk_size=64, max_in_flight=None):
+        """初始化进程池流水线
+
+        Args:
+            chunk_func: 数据块处理函数，必须是可被pickle的模块级函数（或其functools.partial），
+                        接收数据块列表，返回与输入等长的 [(结果, 错误信息)] 列表
+            max_workers: 进程数量，None表示使用CPU核心数，小于等于1时在当前进程中处理
+            chunk_size: 每个数据块的元素数量
+            max_in_flight: 同时提交的最大数据块数量，None表示进程数量的2倍
+        """
+        self.chunk_func = chunk_func
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        self.errors = []
+        self.worker_stats = {}
+        self.cancelled = False
+
+    def _record_stats(self, pid, elapsed, count):
+        """累计工作进程的处理数量和耗时"""
+        stats = self.worker_stats.setdefault(pid, {"items": 0, "busy": 0.0})
+        stats["items"] += count
+        stats["busy"] += elapsed
+
+    def _collect(self, chunk, outcome):
+        """拆分一个数据块的处理结果，成功的产出，失败的记录到errors"""
+        pid, elapsed, results = outcome
+        self._record_stats(pid, elapsed, len(chunk))
+        for item, (result, error) in zip(chunk, results):
+            if error is not None:
+                self.errors.append((item, error))
+            else:
+                yield item, result
+
+    def run(self, items, is_cancelled=None, progress=None):
+        """处理全部元素，按完成顺序产出结果
+
+        Args:
+            items: 元素列表
+            is_cancelled: 返回是否取消的函数，取消后不再提交新的数据块
+            progress: 进度回调函数 progress(已处理数量, 总数量)
+
+        Yields:
+            tuple: (元素, 结果)
+        """
+        self.errors = []
+        self.worker_stats = {}
+        self.cancelled = False
+        total = len(items)
+        chunks = (items[i:i + self.chunk_size] for i in range(0, total, self.chunk_size))
+        done_count = 0
+
+        if self.max_workers <= 1:
+            for chunk in chunks:
+                if is_cancelled and is_cancelled():
+                    self.cancelled = True
+                    return
+                yield from self._collect(chunk, run_chunk(self.chunk_func, chunk))
+                done_count += len(chunk)
+                if progress:
+                    progress(done_count, total)
+            return
+
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        restarts = 0
+        pending = {}
+        try:
+            for chunk in chunks:
+                # 在途数据块达到上限时，等待至少一块完成再继续提交
+                while len(pending) >= self.max_in_flight:
+                    done_count = yield from self._drain(pending, done_count, total, progress)
+                if is_cancelled and is_cancelled():
+                    self.cancelled = True
+                    return
+                try:
+                    future = executor.submit(run_chunk, self.chunk_func, chunk)
+                except BrokenProcessPool:
+                    # 工作进程异常退出后进程池不再接受任务，其中在途的数据块由_drain记为失败
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    restarts += 1
+                    if restarts > MAX_POOL_RESTARTS:
+                        done_count = self._skip_chunks([chunk, *chunks], done_count, total, progress)
+                        break
+                    executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    future = executor.submit(run_chunk, self.chunk_func, chunk)
+                pending[future] = chunk
+
+            while pending:
+                if is_cancelled and is_cancelled():
+                    self.cancelled = True
+                    return
+                done_count = yield from self._drain(pending, done_count, total, progress)
+        finally:
+            executor.shutdown(wait=not self.cancelled, cancel_futures=True)
+
+    def _drain(self, pending, done_count, total, progress):
+        """等待至少一个数据块完成并产出其结果
+
+        Returns:
+            int: 更新后的已处理数量
+        """
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = pending.pop(future)
+            try:
+                outcome = future.result()
+            except BrokenProcessPool as e:
+                # 工作进程异常退出，该块中的文件全部记为失败
+                self.errors.extend((item, f"工作进程异常退出: {e}") for item in chunk)
+            except Exception as e:
+                self.errors.extend((item, str(e)) for item in chunk)
+            else:
+                yield from self._collect(chunk, outcome)
+            done_count += len(chunk)
+            if progress:
+                progress(done_count, total)
+        return done_count
+
+    def _skip_chunks(self, chunks, done_count, total, progress):
+        """进程池多次损坏后，把剩余的数据块全部记为失败
+
+        Returns:
+            int: 更新后的已处理数量
+        """
+        for chunk in chunks:
+            self.errors.extend((item, "工作进程多次异常退出，未处理") for item in chunk)
+            done_count += len(chunk)
+        if progress:
+            progress(done_count, total)
+        return done_count
+
+    def get_worker_stats(self):
+        """获取每个工作进程的吞吐量
+
+        Returns:
+            list: [(进程号, 处理数量, 每秒处理数量)]
+        """
+        return [
+            (pid, stats["items"], stats["items"] / stats["busy"] if stats["busy"] > 0 else 0.0)
+            for pid, stats in sorted(self.worker_stats.items())
+        ]
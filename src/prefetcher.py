@@ -0,0 +1,118 @@
+import threading
+from .image_pyramid import ImagePyramid
+from .image_viewer import fit_scale, render_region
+
+
+def decode_for_fit(file_path, canvas_size):
+    """按适应画布需要的尺寸解码图片，并生成适应画布的视图
+
+    Args:
+        file_path: 图片路径
+        canvas_size: (画布宽, 画布高)
+
+    Returns:
+        ImagePyramid: 已生成适应画布视图的图像金字塔
+    """
+    pyramid = ImagePyramid.open(file_path, canvas_size)
+    canvas_width, canvas_height = canvas_size
+    scale = fit_scale(pyramid.size, canvas_width, canvas_height)
+    rendered = render_region(pyramid, scale, 0, 0, canvas_width, canvas_height)
+    if rendered is not None:
+        pyramid.set_fit_view(canvas_size, rendered)
+    return pyramid
+
+
+class ImagePrefetcher:
+    """在后台线程中预先解码当前图片前后的图片
+
+    每次切换图片时用新的预取列表替换尚未开始的预取，解码完成的图片保存在已完成列表中，
+    由主线程在显示图片时通过collect()取出放入图片查看器的缓存。
+    要显示的图片正在解码时等待其完成，不重复解码
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # 等待预取的图片路径，按优先顺序排列
+        self._queue = []
+        self._canvas_size = None
+        # 正在解码的图片路径
+        self._decoding = None
+        # 解码过程中被丢弃的图片路径，解码完成后不保存结果
+        self._dropped = set()
+        # 已完成的预取 {图片路径: ImagePyramid}
+        self._ready = {}
+        # clear()时递增，丢弃之前开始解码的结果
+        self._epoch = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, file_paths, canvas_size):
+        """替换预取列表（在主线程中调用）
+
+        Args:
+            file_paths: 需要预取的图片路径，按优先顺序排列
+            canvas_size: (画布宽, 画布高)
+        """
+        with self._changed:
+            self._queue = [path for path in file_paths if path not in self._ready and path != self._decoding]
+            self._canvas_size = canvas_size
+            self._changed.notify_all()
+
+    def collect(self, wait_for=None):
+        """取出全部已完成的预取
+
+        Args:
+            wait_for: 该图片正在解码时等待其完成
+
+        Returns:
+            dict: {图片路径: ImagePyramid}
+        """
+        with self._changed:
+            if wait_for is not None:
+                if wait_for in self._queue:
+                    self._queue.remove(wait_for)
+                self._changed.wait_for(lambda: self._decoding != wait_for)
+            ready = self._ready
+            self._ready = {}
+            return ready
+
+    def discard(self, file_paths):
+        """丢弃指定图片的预取（如文件已被删除）"""
+        with self._changed:
+            for path in file_paths:
+                self._ready.pop(path, None)
+            removed = set(file_paths)
+            self._queue = [path for path in self._queue if path not in removed]
+            if self._decoding in removed:
+                self._dropped.add(self._decoding)
+
+    def clear(self):
+        """丢弃全部预取（如切换了文件夹）"""
+        with self._changed:
+            self._queue = []
+            self._ready = {}
+            self._epoch += 1
+
+    def _run(self):
+        """工作线程：按顺序解码预取列表中的图片"""
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._queue)
+                file_path = self._queue.pop(0)
+                canvas_size = self._canvas_size
+                epoch = self._epoch
+                self._decoding = file_path
+            pyramid = None
+            try:
+                pyramid = decode_for_fit(file_path, canvas_size)
+            except Exception:
+                # 无法解码的图片在显示时再报告错误
+                pass
+            with self._changed:
+                self._decoding = None
+                dropped = file_path in self._dropped
+                self._dropped.discard(file_path)
+                if pyramid is not None and epoch == self._epoch and not dropped:
+                    self._ready[file_path] = pyramid
+                self._changed.notify_all()
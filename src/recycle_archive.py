@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+
+
+# 压缩包所在的子文件夹名
+PACKS_DIR_NAME = ".packs"
+# 单个压缩包的默认大小上限
+DEFAULT_PACK_SIZE = 256 * 1024 * 1024
+# 压缩包内记录原路径的索引文件名
+INDEX_MEMBER = "index.json"
+
+
+class RecycleArchive:
+    """滚动写入的备份压缩包
+
+    删除的文件依次写入备份文件夹下".packs"子文件夹中的zip压缩包，压缩包达到大小上限后关闭并同步到磁盘，
+    再开始写入下一个。图片本身已经压缩，因此只存储不压缩。压缩包内的文件以内容哈希命名，
+    同一个压缩包中内容相同的文件只写入一次。关闭压缩包前写入索引文件index.json，
+    记录每个原文件相对备份文件夹所在文件夹的路径，不依赖备份文件夹清单也能单独恢复一个压缩包
+    """
+
+    def __init__(self, backup_dir, max_pack_size=DEFAULT_PACK_SIZE):
+        """初始化备份压缩包
+
+        Args:
+            backup_dir: 备份文件夹路径
+            max_pack_size: 单个压缩包的大小上限（字节）
+        """
+        self.backup_dir = backup_dir
+        self.packs_dir = os.path.join(backup_dir, PACKS_DIR_NAME)
+        # 索引中的原路径相对于备份文件夹所在的文件夹（即图片文件夹的上级）
+        self.base_dir = os.path.dirname(os.path.abspath(backup_dir))
+        self.max_pack_size = max_pack_size
+        self._zip = None
+        self._pack_path = None
+        self._pack_size = 0
+        self._pack_members = set()
+        # 当前压缩包的索引 [[原文件的相对路径, 包内文件名]]
+        self._pack_index = []
+        # 恢复时打开的压缩包 {压缩包路径: ZipFile}
+        self._readers = {}
+
+    @staticmethod
+    def is_pack(path):
+        """判断备份路径是否为压缩包"""
+        return os.path.basename(os.path.dirname(path)) == PACKS_DIR_NAME
+
+    @staticmethod
+    def member_name(digest, filename):
+        """文件在压缩包中的名称，保留原文件的扩展名"""
+        return digest + os.path.splitext(filename)[1].lower()
+
+    def _open_pack(self):
+        """创建新的压缩包"""
+        os.makedirs(self.packs_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        index = 0
+        while True:
+            path = os.path.join(self.packs_dir, f"pack-{stamp}-{index:04d}.zip")
+            try:
+                self._zip = zipfile.ZipFile(path, 'x', compression=zipfile.ZIP_STORED, allowZip64=True)
+                break
+            except FileExistsError:
+                index += 1
+        self._pack_path = path
+        self._pack_size = 0
+        self._pack_members = set()
+        self._pack_index = []
+
+    def add(self, file_path):
+        """把文件写入当前压缩包（原文件保留，需要在seal之后再删除）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            tuple: (压缩包路径, 内容哈希, 文件大小)
+        """
+        with open(file_path, 'rb') as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+        # 与RecycleStore使用相同的内容哈希
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        member = self.member_name(digest, file_path)
+
+        if self._zip is None:
+            self._open_pack()
+        if member not in self._pack_members:
+            # zip格式的时间不能早于1980年
+            info = zipfile.ZipInfo(member, date_time=time.localtime(max(mtime, 315532800))[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                self._zip.writestr(info, data)
+            except OSError:
+                # 写入失败的压缩包可能已损坏，丢弃整个压缩包，其中文件的原文件保留不动
+                self.abort(discard=True)
+                raise
+            self._pack_members.add(member)
+            self._pack_size += len(data)
+        relative_path = os.path.relpath(os.path.abspath(file_path), self.base_dir)
+        self._pack_index.append([relative_path.replace(os.sep, '/'), member])
+        return self._pack_path, digest, len(data)
+
+    def is_open(self):
+        """是否有正在写入的压缩包"""
+        return self._zip is not None
+
+    def is_full(self):
+        """当前压缩包是否已达到大小上限"""
+        return self._zip is not None and self._pack_size >= self.max_pack_size
+
+    def seal(self):
+        """关闭当前压缩包并同步到磁盘，之后才能删除其中文件的原文件
+
+        Returns:
+            str: 压缩包路径，没有打开的压缩包时返回None
+        """
+        if self._zip is None:
+            return None
+        try:
+            self._zip.writestr(INDEX_MEMBER, json.dumps(self._pack_index, ensure_ascii=False))
+            self._zip.close()
+            with open(self._pack_path, 'rb') as f:
+                os.fsync(f.fileno())
+        except OSError:
+            # 未完整写入的压缩包丢弃，其中文件的原文件保留不动
+            self.abort(discard=True)
+            raise
+        self._fsync_dir(self.packs_dir)
+        pack_path = self._pack_path
+        self._zip = None
+        self._pack_path = None
+        return pack_path
+
+    @staticmethod
+    def _fsync_dir(dir_path):
+        """同步文件夹，确保新建的压缩包文件名已写入磁盘（Windows不支持打开文件夹，跳过）"""
+        try:
+            fd = os.open(dir_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def abort(self, discard=False):
+        """出错时关闭当前压缩包，其中文件的原文件保留不动
+
+        Args:
+            discard: 是否删除当前压缩包
+        """
+        if self._zip is not None:
+            try:
+                self._zip.close()
+            except (OSError, ValueError):
+                pass
+            if discard:
+                try:
+                    os.remove(self._pack_path)
+                except OSError:
+                    pass
+            self._zip = None
+            self._pack_path = None
+
+    def extract(self, pack_path, digest, original_path):
+        """从压缩包中把文件恢复到原位置
+
+        Args:
+            pack_path: 压缩包路径
+            digest: 内容哈希
+            original_path: 原文件路径
+        """
+        reader = self._readers.get(pack_path)
+        if reader is None:
+            reader = self._readers[pack_path] = zipfile.ZipFile(pack_path)
+        self._extract_member(reader, self.member_name(digest, original_path), original_path)
+
+    @staticmethod
+    def _extract_member(reader, member, original_path):
+        """把压缩包中的文件写到原位置，原位置已有文件时不覆盖（抛出FileExistsError）"""
+        try:
+            info = reader.getinfo(member)
+        except KeyError:
+            raise FileNotFoundError(f"压缩包中没有 {member}")
+        # 使用'x'模式，原位置已有文件时不覆盖
+        with reader.open(info) as src, open(original_path, 'xb') as dst:
+            try:
+                shutil.copyfileobj(src, dst)
+            except BaseException:
+                # 不留下不完整的文件
+                dst.close()
+                os.remove(original_path)
+                raise
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(original_path, (mtime, mtime))
+
+    @staticmethod
+    def read_index(pack_path):
+        """读取压缩包的索引
+
+        Args:
+            pack_path: 压缩包路径
+
+        Returns:
+            list: [(原文件路径, 包内文件名)]，原文件路径由相对路径和备份文件夹所在的文件夹拼接而成
+        """
+        # 压缩包位于 <备份文件夹>/.packs/ 下
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(pack_path))))
+        with zipfile.ZipFile(pack_path) as reader:
+            entries = json.loads(reader.read(INDEX_MEMBER).decode('utf-8'))
+        return [
+            (os.path.normpath(os.path.join(base_dir, *relative_path.split('/'))), member)
+            for relative_path, member in entries
+        ]
+
+    @classmethod
+    def restore_pack(cls, pack_path):
+        """按压缩包自身的索引恢复其中的全部文件，不需要备份文件夹清单
+
+        Args:
+            pack_path: 压缩包路径
+
+        Returns:
+            tuple: (恢复的文件路径列表, 未恢复的文件列表[(文件路径, 原因)])
+        """
+        restored = []
+        skipped = []
+        entries = cls.read_index(pack_path)
+        with zipfile.ZipFile(pack_path) as reader:
+            for original_path, member in entries:
+                try:
+                    os.makedirs(os.path.dirname(original_path), exist_ok=True)
+                    cls._extract_member(reader, member, original_path)
+                    restored.append(original_path)
+                except FileExistsError:
+                    skipped.append((original_path, "原位置已有同名文件"))
+                except OSError as e:
+                    skipped.append((original_path, str(e)))
+        return restored, skipped
+
+    def close(self):
+        """关闭恢复时打开的压缩包"""
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+
+    @staticmethod
+    def release(pack_path):
+        """删除不再被清单引用的压缩包"""
+        if os.path.exists(pack_path):
+            os.remove(pack_path)
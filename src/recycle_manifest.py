@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+
+
+class RecycleManifest:
+    """备份文件夹清单，记录每次应用移动到备份文件夹的文件
+
+    每次应用为一个批次，清单中保存每个文件的原路径、在备份文件夹中的路径、大小和移动时间，
+    恢复时按批次或原路径前缀、时间范围通过索引一次查出需要移回的文件
+    """
+
+    def __init__(self, db_path):
+        """初始化备份文件夹清单
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self.conn = None
+        # 应用和恢复在后台线程中进行，连接允许跨线程使用并由锁保护
+        self.lock = threading.Lock()
+        self.init_database()
+
+    def init_database(self):
+        """初始化数据库，创建清单表"""
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS batches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    folder TEXT,
+                    backup_dir TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id INTEGER,
+                    original_path TEXT,
+                    recycled_path TEXT,
+                    content_hash TEXT,
+                    size INTEGER,
+                    recycled_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS idx_items_batch ON items (batch_id);
+                CREATE INDEX IF NOT EXISTS idx_items_original ON items (original_path);
+                CREATE INDEX IF NOT EXISTS idx_items_recycled_at ON items (recycled_at);
+                CREATE INDEX IF NOT EXISTS idx_items_recycled_path ON items (recycled_path);
+                CREATE INDEX IF NOT EXISTS idx_items_content_hash ON items (content_hash);
+            ''')
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"备份清单初始化错误: {e}")
+            self.conn = None
+
+    def add_batch(self, folder, backup_dir, items):
+        """在一个事务中记录一次应用移动的全部文件
+
+        Args:
+            folder: 应用时的文件夹路径
+            backup_dir: 备份文件夹路径
+            items: [(原路径, 备份文件夹中的路径, 内容哈希, 大小)]
+
+        Returns:
+            int: 批次ID，没有文件或清单不可用时返回None
+        """
+        if self.conn is None or not items:
+            return None
+        try:
+            with self.lock, self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO batches (folder, backup_dir) VALUES (?, ?)", (folder, backup_dir)
+                )
+                batch_id = cursor.lastrowid
+                self.conn.executemany(
+                    "INSERT INTO items (batch_id, original_path, recycled_path, content_hash, size) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(batch_id, original, recycled, digest, size) for original, recycled, digest, size in items]
+                )
+            return batch_id
+        except sqlite3.Error as e:
+            print(f"写入备份清单错误: {e}")
+            return None
+
+    def get_batches(self):
+        """获取全部批次，从新到旧排列
+
+        Returns:
+            list: [(批次ID, 文件夹路径, 备份文件夹, 时间, 文件数量, 总大小)]
+        """
+        if self.conn is None:
+            return []
+        try:
+            with self.lock:
+                return self.conn.execute(
+                    "SELECT batches.id, batches.folder, batches.backup_dir, batches.created_at, "
+                    "COUNT(items.id), COALESCE(SUM(items.size), 0) "
+                    "FROM batches JOIN items ON items.batch_id = batches.id "
+                    "GROUP BY batches.id ORDER BY batches.id DESC"
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"读取备份清单错误: {e}")
+            return []
+
+    def find_items(self, batch_id=None, path_prefix=None, since=None, until=None):
+        """按条件查找备份文件夹中的文件
+
+        Args:
+            batch_id: 只查找该批次的文件
+            path_prefix: 只查找原路径以该前缀开头的文件（如某个子目录）
+            since: 移动时间下限（含），格式为"YYYY-MM-DD HH:MM:SS"（UTC）
+            until: 移动时间上限（不含），格式同上
+
+        Returns:
+            list: [(记录ID, 原路径, 备份文件夹中的路径, 内容哈希, 大小, 备份文件夹)]
+        """
+        if self.conn is None:
+            return []
+        conditions = []
+        params = []
+        if batch_id is not None:
+            conditions.append("items.batch_id = ?")
+            params.append(batch_id)
+        if path_prefix:
+            # 用范围条件代替LIKE，可以使用原路径上的索引
+            conditions.append("original_path >= ? AND original_path < ?")
+            params.extend((path_prefix, path_prefix + '\uffff'))
+        if since is not None:
+            conditions.append("recycled_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("recycled_at < ?")
+            params.append(until)
+        sql = (
+            "SELECT items.id, items.original_path, items.recycled_path, items.content_hash, items.size, "
+            "batches.backup_dir FROM items JOIN batches ON batches.id = items.batch_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY items.id"
+        try:
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"读取备份清单错误: {e}")
+            return []
+
+    def get_referenced(self, recycled_paths, digests):
+        """查找仍被清单引用的备份路径和内容哈希
+
+        Args:
+            recycled_paths: 备份文件夹中的路径
+            digests: 内容哈希
+
+        Returns:
+            tuple: (仍被引用的路径集合, 仍被引用的内容哈希集合)
+        """
+        if self.conn is None:
+            return set(recycled_paths), set(digests)
+        try:
+            with self.lock:
+                paths = {
+                    path for path in set(recycled_paths)
+                    if self.conn.execute("SELECT 1 FROM items WHERE recycled_path = ? LIMIT 1", (path,)).fetchone()
+                }
+                hashes = {
+                    digest for digest in set(digests)
+                    if self.conn.execute("SELECT 1 FROM items WHERE content_hash = ? LIMIT 1", (digest,)).fetchone()
+                }
+            return paths, hashes
+        except sqlite3.Error as e:
+            print(f"读取备份清单错误: {e}")
+            return set(recycled_paths), set(digests)
+
+    def count_references(self, digests):
+        """统计每个内容哈希被清单中多少条记录引用
+
+        Args:
+            digests: 内容哈希
+
+        Returns:
+            dict: {内容哈希: 引用数量}，没有被引用的哈希不在其中；无法读取清单时返回None
+        """
+        if self.conn is None:
+            return None
+        try:
+            with self.lock:
+                counts = {}
+                for digest in set(digests):
+                    count = self.conn.execute(
+                        "SELECT COUNT(*) FROM items WHERE content_hash = ?", (digest,)
+                    ).fetchone()[0]
+                    if count:
+                        counts[digest] = count
+            return counts
+        except sqlite3.Error as e:
+            print(f"读取备份清单错误: {e}")
+            return None
+
+    def remove_items(self, item_ids):
+        """在一个事务中删除已恢复的文件记录，并删除变为空的批次
+
+        Args:
+            item_ids: 记录ID列表
+        """
+        if self.conn is None or not item_ids:
+            return
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in item_ids])
+                self.conn.execute(
+                    "DELETE FROM batches WHERE NOT EXISTS (SELECT 1 FROM items WHERE items.batch_id = batches.id)"
+                )
+        except sqlite3.Error as e:
+            print(f"更新备份清单错误: {e}")
+
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn:
+            with self.lock:
+                self.conn.close()
+                self.conn = None
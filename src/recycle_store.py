@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+# 内容文件所在的子文件夹名
+OBJECTS_DIR_NAME = ".objects"
+# 计算内容哈希时每次读取的数据量
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(file_path):
+    """计算文件内容的哈希，作为内容文件的名称
+
+    内容文件名需要在不同运行之间保持一致，因此固定使用标准库中的BLAKE2，不随可选依赖变化
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class RecycleStore:
+    """按内容寻址的备份文件夹
+
+    每种内容只在".objects"子文件夹中保存一份，以内容哈希命名；备份文件夹根目录下用原文件名
+    建立指向内容文件的硬链接，方便直接浏览。内容相同的文件不再占用额外空间，
+    同名但内容不同的文件使用带哈希后缀的名称，不会覆盖或删除已有的备份。
+    存入时原文件保持不动，由调用方把备份信息写入应用日志后再删除，程序中途退出时总能找到文件的备份
+    """
+
+    def __init__(self, backup_dir):
+        """初始化备份文件夹
+
+        Args:
+            backup_dir: 备份文件夹路径
+        """
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, OBJECTS_DIR_NAME)
+
+    def blob_path(self, digest, filename):
+        """内容文件的路径，保留原文件的扩展名"""
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def stage(self, file_path):
+        """把文件存入备份文件夹，原文件保持不动
+
+        内容不存在时以硬链接（不支持时复制）建立内容文件，然后以原文件名建立可浏览的硬链接。
+        调用方把返回的备份信息写入应用日志后再删除原文件，无法删除时调用unstage撤销，
+        备份文件夹中的硬链接不会继续与仍在使用的原文件共用
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            tuple: (备份文件夹中可浏览的路径, 内容哈希, 文件大小)
+        """
+        size = os.path.getsize(file_path)
+        digest = content_hash(file_path)
+        filename = os.path.basename(file_path)
+        blob = self.blob_path(digest, filename)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if not os.path.exists(blob):
+            self._add_blob(file_path, blob)
+        return self._link_entry(blob, filename, digest), digest, size
+
+    @staticmethod
+    def _add_blob(file_path, blob):
+        """以硬链接建立内容文件，跨文件系统或不支持硬链接时复制"""
+        try:
+            os.link(file_path, blob)
+            return
+        except FileExistsError:
+            # 另一个线程同时存入了相同的内容
+            return
+        except OSError:
+            pass
+        # 先复制为临时文件再改名，中途退出时不会留下不完整的内容文件
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(blob))
+        os.close(fd)
+        try:
+            shutil.copy2(file_path, temp_path)
+            os.rename(temp_path, blob)
+        except FileExistsError:
+            pass
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _link_entry(self, blob, filename, digest):
+        """在备份文件夹根目录下为内容文件建立可浏览的硬链接
+
+        Returns:
+            str: 硬链接路径，同名文件内容不同且带哈希后缀的名称也被占用，或文件系统不支持硬链接时返回内容文件路径
+        """
+        stem, ext = os.path.splitext(filename)
+        for name in (filename, f"{stem}~{digest[:8]}{ext}"):
+            entry = os.path.join(self.backup_dir, name)
+            try:
+                os.link(blob, entry)
+                return entry
+            except FileExistsError:
+                if os.path.samefile(entry, blob):
+                    return entry
+            except OSError:
+                # FAT32等文件系统不支持硬链接，只保留内容文件
+                return blob
+        return blob
+
+    def restore(self, entry_path, digest, original_path, last_reference=False):
+        """把备份的文件恢复到原位置，原位置已有文件时不覆盖（抛出FileExistsError）
+
+        内容文件可能被多个原文件共用，恢复的文件必须互相独立，因此默认复制内容文件。
+        last_reference为True表示清单中已没有其他记录引用该内容，此时以硬链接恢复，
+        随后由release删除内容文件和可浏览的硬链接，恢复的文件不再与任何文件共用。
+        内容文件已不存在时，只有可浏览路径中的文件内容哈希一致才移回。
+        没有内容哈希的记录为按原文件名直接移动到备份文件夹的旧备份，直接移回
+
+        Args:
+            entry_path: 备份文件夹中可浏览的路径
+            digest: 内容哈希，None表示旧备份
+            original_path: 原文件路径
+            last_reference: 是否为引用该内容的最后一条记录
+        """
+        if not digest:
+            os.rename(entry_path, original_path)
+            return
+        blob = self.blob_path(digest, original_path)
+        if not os.path.exists(blob):
+            # 同名的可浏览路径可能已是另一张图片
+            if content_hash(entry_path) != digest:
+                raise FileNotFoundError(f"备份文件内容不一致: {entry_path}")
+            os.rename(entry_path, original_path)
+            return
+        if last_reference:
+            try:
+                os.link(blob, original_path)
+                return
+            except FileExistsError:
+                raise
+            except OSError:
+                # 跨文件系统或不支持硬链接时复制
+                pass
+        self._copy_new(blob, original_path)
+
+    @staticmethod
+    def _copy_new(source, target):
+        """复制文件及其修改时间，目标已存在时不覆盖（抛出FileExistsError）"""
+        # 使用'x'模式，原位置已有文件时不覆盖
+        with open(source, 'rb') as src, open(target, 'xb') as dst:
+            try:
+                shutil.copyfileobj(src, dst, READ_CHUNK_SIZE)
+            except BaseException:
+                # 不留下不完整的文件
+                dst.close()
+                os.remove(target)
+                raise
+        shutil.copystat(source, target)
+
+    def unstage(self, file_path, entry_path, digest):
+        """原文件无法删除时撤销stage，备份文件夹中不再留下与原文件共用的硬链接
+
+        只处理与原文件是同一个文件的硬链接：可浏览的硬链接直接删除；内容文件没有其他硬链接时删除，
+        同时存入的相同内容的文件也链接到它时替换为独立的副本
+
+        Args:
+            file_path: 原文件路径
+            entry_path: stage返回的可浏览路径
+            digest: 内容哈希
+        """
+        blob = self.blob_path(digest, file_path)
+        if entry_path != blob and os.path.exists(entry_path) and os.path.samefile(entry_path, file_path):
+            os.remove(entry_path)
+        if not os.path.exists(blob) or not os.path.samefile(blob, file_path):
+            return
+        # 原文件和内容文件之外还有其他硬链接
+        if os.stat(file_path).st_nlink > 2:
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(blob))
+            os.close(fd)
+            try:
+                shutil.copy2(file_path, temp_path)
+                os.replace(temp_path, blob)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        else:
+            os.remove(blob)
+            try:
+                os.rmdir(os.path.dirname(blob))
+            except OSError:
+                pass
+
+    def release(self, entry_path, digest, filename, remove_entry=True, remove_blob=True):
+        """删除不再被清单引用的可浏览硬链接和内容文件
+
+        Args:
+            entry_path: 备份文件夹中可浏览的路径
+            digest: 内容哈希
+            filename: 原文件名，用于确定内容文件的扩展名
+            remove_entry: 是否删除可浏览的硬链接
+            remove_blob: 是否删除内容文件
+        """
+        blob = self.blob_path(digest, filename)
+        if remove_entry and entry_path != blob and os.path.exists(entry_path) \
+                and os.path.exists(blob) and os.path.samefile(entry_path, blob):
+            os.remove(entry_path)
+        if remove_blob and os.path.exists(blob):
+            os.remove(blob)
+            # 删除变为空的哈希前缀文件夹
+            try:
+                os.rmdir(os.path.dirname(blob))
+            except OSError:
+                pass
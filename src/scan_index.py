@@ -0,0 +1,323 @@
+import os
+import sqlite3
+import threading
+import time
+from .utils import parse_image_name
+
+
+# 目录修改时间距离扫描时刻小于该值（纳秒）时不信任缓存，
+# 避免同一时间粒度内的后续修改被漏掉（FAT等文件系统的时间精度只有2秒）
+RACY_MTIME_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class ScanIndex:
+    """持久化的扫描索引，按文件夹记录每个目录的修改时间及其中的图片信息
+
+    再次打开同一文件夹时，只有修改时间发生变化的目录才需要重新扫描，
+    其余目录直接使用索引中的记录。QQ缓存文件写入后不会被修改，
+    因此目录修改时间（文件增删时更新）足以判断目录内容是否变化
+    """
+
+    def __init__(self, db_path):
+        """初始化扫描索引
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self.conn = None
+        # 扫描在后台线程中进行，连接允许跨线程使用并由锁保护
+        self.lock = threading.Lock()
+        self.init_database()
+
+    def init_database(self):
+        """初始化数据库，创建索引表"""
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS folders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT UNIQUE,
+                    scanned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS dirs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    folder_id INTEGER,
+                    path TEXT,
+                    mtime_ns INTEGER,
+                    subdirs TEXT,
+                    UNIQUE (folder_id, path)
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    dir_id INTEGER,
+                    name TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    group_hash TEXT,
+                    PRIMARY KEY (dir_id, name)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    folder_id INTEGER,
+                    method TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    hash INTEGER,
+                    PRIMARY KEY (folder_id, method, path)
+                ) WITHOUT ROWID;
+            ''')
+            # 旧版本的哈希表没有修改时间，添加后旧记录的修改时间为空，下次查找时重新计算
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(image_hashes)")]
+            if "mtime_ns" not in columns:
+                self.conn.execute("ALTER TABLE image_hashes ADD COLUMN mtime_ns INTEGER")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"扫描索引初始化错误: {e}")
+
+    @staticmethod
+    def normalize_path(path):
+        """规范化路径，作为索引中的键"""
+        return os.path.normcase(os.path.abspath(path))
+
+    def _get_folder_id(self, folder_path, create=False):
+        """获取文件夹在索引中的ID
+
+        Args:
+            folder_path: 文件夹路径
+            create: 不存在时是否创建
+
+        Returns:
+            int: 文件夹ID，不存在且不创建时返回None
+        """
+        key = self.normalize_path(folder_path)
+        row = self.conn.execute("SELECT id FROM folders WHERE path = ?", (key,)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        cursor = self.conn.execute("INSERT INTO folders (path) VALUES (?)", (key,))
+        return cursor.lastrowid
+
+    def load_folder(self, folder_path):
+        """读取文件夹的全部索引记录
+
+        Args:
+            folder_path: 文件夹路径
+
+        Returns:
+            dict: {规范化的目录路径: (mtime_ns, 图片列表[(filename, size, mtime_ns, inode)], 子目录名列表)}
+        """
+        snapshot = {}
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return snapshot
+                folder_id = self._get_folder_id(folder_path)
+                if folder_id is None:
+                    return snapshot
+
+                dir_paths = {}
+                for dir_id, path, mtime_ns, subdirs in self.conn.execute(
+                    "SELECT id, path, mtime_ns, subdirs FROM dirs WHERE folder_id = ?", (folder_id,)
+                ):
+                    files = []
+                    snapshot[path] = (mtime_ns, files, subdirs.split('\n') if subdirs else [])
+                    dir_paths[dir_id] = files
+
+                for dir_id, name, size, mtime_ns, inode in self.conn.execute(
+                    "SELECT files.dir_id, files.name, files.size, files.mtime_ns, files.inode "
+                    "FROM files JOIN dirs ON files.dir_id = dirs.id WHERE dirs.folder_id = ?",
+                    (folder_id,)
+                ):
+                    dir_paths[dir_id].append((name, size, mtime_ns, inode))
+        except sqlite3.Error as e:
+            print(f"读取扫描索引错误: {e}")
+            return {}
+        return snapshot
+
+    def save_dirs(self, folder_path, changed_dirs, removed_dirs=()):
+        """在一个事务中写入重新扫描过的目录，并删除已不存在的目录
+
+        Args:
+            folder_path: 文件夹路径
+            changed_dirs: {目录路径: (mtime_ns, 图片列表[(filename, size, mtime_ns, inode)], 子目录名列表)}
+            removed_dirs: 已不存在的目录路径列表（其下所有子目录一并删除）
+        """
+        if not changed_dirs and not removed_dirs:
+            return
+        now_ns = time.time_ns()
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return
+                with self.conn:
+                    folder_id = self._get_folder_id(folder_path, create=True)
+                    self.conn.execute(
+                        "UPDATE folders SET scanned_at = CURRENT_TIMESTAMP WHERE id = ?", (folder_id,)
+                    )
+
+                    for dir_path in removed_dirs:
+                        key = self.normalize_path(dir_path)
+                        # 转义LIKE通配符，匹配该目录下的所有子目录
+                        escaped = key.rstrip(os.sep).replace('!', '!!').replace('%', '!%').replace('_', '!_')
+                        like = escaped + os.sep + '%'
+                        self.conn.execute(
+                            "DELETE FROM files WHERE dir_id IN (SELECT id FROM dirs WHERE folder_id = ? "
+                            "AND (path = ? OR path LIKE ? ESCAPE '!'))",
+                            (folder_id, key, like)
+                        )
+                        self.conn.execute(
+                            "DELETE FROM dirs WHERE folder_id = ? AND (path = ? OR path LIKE ? ESCAPE '!')",
+                            (folder_id, key, like)
+                        )
+
+                    for dir_path, (mtime_ns, files, subdirs) in changed_dirs.items():
+                        # 刚被修改过的目录下次仍需重新扫描
+                        if now_ns - mtime_ns < RACY_MTIME_WINDOW_NS:
+                            mtime_ns = 0
+                        key = self.normalize_path(dir_path)
+                        self.conn.execute(
+                            "INSERT INTO dirs (folder_id, path, mtime_ns, subdirs) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (folder_id, path) DO UPDATE SET "
+                            "mtime_ns = excluded.mtime_ns, subdirs = excluded.subdirs",
+                            (folder_id, key, mtime_ns, '\n'.join(subdirs))
+                        )
+                        dir_id = self.conn.execute(
+                            "SELECT id FROM dirs WHERE folder_id = ? AND path = ?", (folder_id, key)
+                        ).fetchone()[0]
+                        self.conn.execute("DELETE FROM files WHERE dir_id = ?", (dir_id,))
+                        self.conn.executemany(
+                            "INSERT INTO files (dir_id, name, size, mtime_ns, inode, group_hash) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            [
+                                (dir_id, name, size, file_mtime_ns, inode, self._group_hash(name))
+                                for name, size, file_mtime_ns, inode in files
+                            ]
+                        )
+        except sqlite3.Error as e:
+            print(f"写入扫描索引错误: {e}")
+
+    @staticmethod
+    def _group_hash(filename):
+        """从文件名解析分组哈希，不属于_0/_720分组的文件返回None"""
+        parsed = parse_image_name(filename)
+        return parsed[0] if parsed else None
+
+    @staticmethod
+    def _to_signed(value):
+        """SQLite整数为有符号64位，无符号哈希需要转换后保存"""
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+    def load_hashes(self, folder_path, method):
+        """读取文件夹中已计算的感知哈希
+
+        Args:
+            folder_path: 文件夹路径
+            method: 哈希方法
+
+        Returns:
+            dict: {file_path: (size, mtime_ns, 64位无符号哈希)}
+        """
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return {}
+                folder_id = self._get_folder_id(folder_path)
+                if folder_id is None:
+                    return {}
+                return {
+                    path: (size, mtime_ns, value & ((1 << 64) - 1))
+                    for path, size, mtime_ns, value in self.conn.execute(
+                        "SELECT path, size, mtime_ns, hash FROM image_hashes WHERE folder_id = ? AND method = ?",
+                        (folder_id, method)
+                    )
+                }
+        except sqlite3.Error as e:
+            print(f"读取图片哈希错误: {e}")
+            return {}
+
+    def save_hashes(self, folder_path, method, entries):
+        """在一个事务中保存感知哈希
+
+        Args:
+            folder_path: 文件夹路径
+            method: 哈希方法
+            entries: {file_path: (size, mtime_ns, 64位无符号哈希)}
+        """
+        if not entries:
+            return
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return
+                with self.conn:
+                    folder_id = self._get_folder_id(folder_path, create=True)
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO image_hashes (folder_id, method, path, size, mtime_ns, hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (folder_id, method, path, size, mtime_ns, self._to_signed(value))
+                            for path, (size, mtime_ns, value) in entries.items()
+                        ]
+                    )
+        except sqlite3.Error as e:
+            print(f"保存图片哈希错误: {e}")
+
+    def delete_hashes(self, folder_path, method, file_paths):
+        """删除已不存在的图片的哈希
+
+        Args:
+            folder_path: 文件夹路径
+            method: 哈希方法
+            file_paths: 文件路径列表
+        """
+        if not file_paths:
+            return
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return
+                with self.conn:
+                    folder_id = self._get_folder_id(folder_path)
+                    if folder_id is None:
+                        return
+                    self.conn.executemany(
+                        "DELETE FROM image_hashes WHERE folder_id = ? AND method = ? AND path = ?",
+                        [(folder_id, method, path) for path in file_paths]
+                    )
+        except sqlite3.Error as e:
+            print(f"删除图片哈希错误: {e}")
+
+    def clear_folder(self, folder_path):
+        """删除文件夹的全部索引记录
+
+        Args:
+            folder_path: 文件夹路径
+        """
+        try:
+            with self.lock:
+                if self.conn is None:
+                    return
+                with self.conn:
+                    folder_id = self._get_folder_id(folder_path)
+                    if folder_id is None:
+                        return
+                    self.conn.execute(
+                        "DELETE FROM files WHERE dir_id IN (SELECT id FROM dirs WHERE folder_id = ?)",
+                        (folder_id,)
+                    )
+                    self.conn.execute("DELETE FROM dirs WHERE folder_id = ?", (folder_id,))
+                    self.conn.execute("DELETE FROM image_hashes WHERE folder_id = ?", (folder_id,))
+                    self.conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        except sqlite3.Error as e:
+            print(f"清除扫描索引错误: {e}")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,298 @@
+import os
+import time
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .utils import is_image_file
+from .scan_index import ScanIndex
+
+
+# 备份模式创建的回收站文件夹后缀，递归扫描时自动跳过
+RECYCLE_SUFFIX = "-recycle"
+
+
+class DirectoryScanner:
+    """目录扫描器，基于os.scandir单次遍历目录并逐条产出图片记录
+
+    os.scandir返回的DirEntry自带文件类型信息（Windows下还缓存了stat结果），
+    因此每个文件只需一次stat即可拿到大小，避免listdir + isfile + getsize的多次系统调用。
+    递归模式下每个子目录作为一个任务提交到有界线程池并行扫描。
+    设置了扫描索引时，修改时间未变化的目录直接使用索引记录，不再列出目录内容
+    """
+
+    def __init__(self, max_workers=8, scan_index=None):
+        """初始化目录扫描器
+
+        Args:
+            max_workers: 递归扫描时的最大线程数
+            scan_index: 持久化扫描索引（ScanIndex实例），None表示不使用索引
+        """
+        self.max_workers = max_workers
+        self.scan_index = scan_index
+        self.dirs_cached = 0
+        self.skipped_files = []
+        self.files_scanned = 0
+        self.entries_scanned = 0
+        self.dirs_scanned = 0
+        self.start_time = None
+        self.end_time = None
+
+    def reset_stats(self):
+        """重置扫描统计信息"""
+        self.skipped_files = []
+        self.files_scanned = 0
+        self.entries_scanned = 0
+        self.dirs_scanned = 0
+        self.dirs_cached = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def _iter_directory(self, dir_path, chunk_size=None):
+        """扫描单个目录（不递归），每累计chunk_size个图片就产出一次部分结果
+
+        可在工作线程中调用，不修改扫描器状态
+
+        Args:
+            dir_path: 目录路径
+            chunk_size: 每批图片数量，None表示扫描完整个目录后一次性产出
+
+        Yields:
+            tuple: (图片列表[(filename, size, mtime_ns, inode)], 子目录名列表,
+                    跳过的文件列表[(filename, 错误信息)], 目录项数量)
+        """
+        files = []
+        subdirs = []
+        skipped = []
+        entries = 0
+
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                entries += 1
+                try:
+                    # DirEntry.is_dir/is_file优先使用目录项中的类型信息，不额外产生系统调用
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError as e:
+                    skipped.append((entry.name, str(e)))
+                    continue
+
+                # 检查文件后缀
+                if not is_image_file(entry.name):
+                    continue
+
+                try:
+                    st = entry.stat()
+                    files.append((entry.name, st.st_size, st.st_mtime_ns, st.st_ino))
+                except OSError as e:
+                    skipped.append((entry.name, str(e)))
+                    continue
+
+                if chunk_size and len(files) >= chunk_size:
+                    yield files, subdirs, skipped, entries
+                    files, subdirs, skipped, entries = [], [], [], 0
+
+        yield files, subdirs, skipped, entries
+
+    def _scan_directory(self, dir_path):
+        """完整扫描单个目录（不递归），供线程池任务调用
+
+        Returns:
+            tuple: 与_iter_directory产出的格式相同
+        """
+        return next(self._iter_directory(dir_path))
+
+    def _scan_directory_cached(self, dir_path, snapshot):
+        """扫描单个目录，目录修改时间与索引记录一致时直接返回索引中的内容
+
+        Args:
+            dir_path: 目录路径
+            snapshot: ScanIndex.load_folder返回的索引快照，None表示不使用索引
+
+        Returns:
+            tuple: (图片列表, 子目录名列表, 跳过的文件列表, 目录项数量, 目录修改时间, 是否来自索引)
+        """
+        mtime_ns = None
+        if snapshot is not None:
+            # 先读取目录修改时间再列出内容，列出过程中发生的修改会在下次扫描时被发现
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            cached = snapshot.get(ScanIndex.normalize_path(dir_path))
+            if cached and cached[0] == mtime_ns:
+                return cached[1], cached[2], [], 0, mtime_ns, True
+        files, subdirs, skipped, entries = self._scan_directory(dir_path)
+        return files, subdirs, skipped, entries, mtime_ns, False
+
+    def _track_change(self, dir_path, snapshot, mtime_ns, files, subdirs, changed, removed):
+        """记录重新扫描过的目录，以及相对索引已被删除的子目录"""
+        changed[dir_path] = (mtime_ns, files, subdirs)
+        cached = snapshot.get(ScanIndex.normalize_path(dir_path))
+        if cached:
+            current = set(subdirs)
+            for name in cached[2]:
+                if name not in current:
+                    removed.append(os.path.join(dir_path, name))
+
+    def _record_result(self, dir_path, files, skipped, entries):
+        """累计单个目录的扫描统计，并把文件转换为图片记录
+
+        Returns:
+            list: [(file_path, size, filename, mtime_ns)]
+        """
+        self.entries_scanned += entries
+        self.files_scanned += len(files)
+        self.skipped_files.extend(skipped)
+        return [
+            (os.path.join(dir_path, filename), size, filename, mtime_ns)
+            for filename, size, mtime_ns, _ in files
+        ]
+
+    @staticmethod
+    def is_excluded(dir_name, exclude=None):
+        """判断子目录是否需要跳过
+
+        Args:
+            dir_name: 子目录名称
+            exclude: 排除规则列表，支持通配符（如 "Thumb*"）
+
+        Returns:
+            bool: 是否跳过该目录
+        """
+        if dir_name.endswith(RECYCLE_SUFFIX):
+            return True
+        if exclude:
+            for pattern in exclude:
+                if fnmatch.fnmatch(dir_name, pattern):
+                    return True
+        return False
+
+    def iter_batches(self, folder_path, recursive=False, max_depth=None, exclude=None, chunk_size=None):
+        """扫描文件夹，按目录逐批产出图片记录
+
+        Args:
+            folder_path: 文件夹路径
+            recursive: 是否递归扫描子目录
+            max_depth: 最大递归深度，0表示只扫描根目录，None表示不限制
+            exclude: 需要跳过的子目录名称或通配符列表（"-recycle"文件夹总是被跳过）
+            chunk_size: 非递归模式下每批的最大图片数量，便于调用方在扫描大目录时逐步处理
+
+        Yields:
+            tuple: (目录路径, [(file_path, size, filename, mtime_ns)])
+        """
+        self.reset_stats()
+        snapshot = self.scan_index.load_folder(folder_path) if self.scan_index else None
+        changed = {}
+        removed = []
+        try:
+            if not recursive:
+                self.dirs_scanned = 1
+                yield from self._iter_flat(folder_path, chunk_size, snapshot, changed, removed)
+                return
+
+            yield from self._iter_tree(folder_path, max_depth, exclude, snapshot, changed, removed)
+        finally:
+            self.end_time = time.perf_counter()
+            # 被取消时同样保存已扫描完成的目录
+            if self.scan_index:
+                self.scan_index.save_dirs(folder_path, changed, removed)
+
+    def _iter_flat(self, folder_path, chunk_size, snapshot, changed, removed):
+        """扫描单个文件夹（不递归），大目录按chunk_size分批产出"""
+        if snapshot is not None:
+            mtime_ns = os.stat(folder_path).st_mtime_ns
+            cached = snapshot.get(ScanIndex.normalize_path(folder_path))
+            if cached and cached[0] == mtime_ns:
+                # 目录未变化，直接分批产出索引中的记录
+                self.dirs_cached = 1
+                files = cached[1]
+                step = chunk_size or len(files) or 1
+                for i in range(0, max(len(files), 1), step):
+                    yield folder_path, self._record_result(folder_path, files[i:i + step], [], 0)
+                return
+
+        all_files = []
+        all_subdirs = []
+        for files, subdirs, skipped, entries in self._iter_directory(folder_path, chunk_size):
+            all_files.extend(files)
+            all_subdirs.extend(subdirs)
+            yield folder_path, self._record_result(folder_path, files, skipped, entries)
+
+        if snapshot is not None:
+            self._track_change(folder_path, snapshot, mtime_ns, all_files, all_subdirs, changed, removed)
+
+    def _iter_tree(self, folder_path, max_depth, exclude, snapshot, changed, removed):
+        """使用有界线程池并行扫描目录树，每个目录一个任务"""
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        try:
+            future = executor.submit(self._scan_directory_cached, folder_path, snapshot)
+            pending[future] = (folder_path, 0)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path, depth = pending.pop(future)
+                    try:
+                        files, subdirs, skipped, entries, mtime_ns, cached = future.result()
+                    except OSError as e:
+                        # 根目录无法读取时直接报错，子目录出错则记录后跳过
+                        if dir_path == folder_path:
+                            raise
+                        self.skipped_files.append((dir_path, str(e)))
+                        continue
+
+                    if cached:
+                        self.dirs_cached += 1
+                    elif snapshot is not None:
+                        self._track_change(dir_path, snapshot, mtime_ns, files, subdirs, changed, removed)
+
+                    if max_depth is None or depth < max_depth:
+                        for name in subdirs:
+                            if self.is_excluded(name, exclude):
+                                continue
+                            sub_path = os.path.join(dir_path, name)
+                            future = executor.submit(self._scan_directory_cached, sub_path, snapshot)
+                            pending[future] = (sub_path, depth + 1)
+
+                    self.dirs_scanned += 1
+                    yield dir_path, self._record_result(dir_path, files, skipped, entries)
+        finally:
+            # 提前结束（出错或调用方停止迭代）时取消尚未开始的任务
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def scan(self, folder_path, recursive=False, max_depth=None, exclude=None):
+        """扫描文件夹，逐条产出图片记录
+
+        Args:
+            folder_path: 文件夹路径
+            recursive: 是否递归扫描子目录
+            max_depth: 最大递归深度
+            exclude: 需要跳过的子目录名称或通配符列表
+
+        Yields:
+            tuple: (file_path, size, filename, mtime_ns)
+        """
+        for _, records in self.iter_batches(folder_path, recursive, max_depth, exclude):
+            yield from records
+
+    def get_stats(self):
+        """获取最近一次扫描的统计信息
+
+        Returns:
+            dict: 包含文件数、目录项数、目录数、使用索引的目录数、耗时（秒）和吞吐量（目录项/秒）
+        """
+        if self.start_time is None:
+            elapsed = 0.0
+        else:
+            end_time = self.end_time if self.end_time is not None else time.perf_counter()
+            elapsed = end_time - self.start_time
+
+        rate = self.entries_scanned / elapsed if elapsed > 0 else 0.0
+        return {
+            "files": self.files_scanned,
+            "entries": self.entries_scanned,
+            "dirs": self.dirs_scanned,
+            "dirs_cached": self.dirs_cached,
+            "skipped": len(self.skipped_files),
+            "elapsed": elapsed,
+            "rate": rate
+        }
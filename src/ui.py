@@ -29,7 +29,10 @@ class UIManager:
         # 2. 筛选区域
         self._create_filter_frame(main_frame)
         
-        # 3. Log区域
+        # 3. 进度区域
+        self._create_progress_frame(main_frame)
+        
+        # 4. Log区域
         self._create_log_frame(main_frame)
 
     def _create_path_selection_frame(self, parent):
@@ -49,7 +52,22 @@ class UIManager:
         browse_btn = ttk.Button(button_frame, text="浏览", command=self.callbacks.get('browse_folder'))
         browse_btn.pack(side=tk.LEFT, padx=5)
         
+        duplicates_btn = ttk.Button(button_frame, text="查找重复", command=self.callbacks.get('find_duplicates'))
+        duplicates_btn.pack(side=tk.LEFT, padx=5)
+        
+        similar_btn = ttk.Button(button_frame, text="查找相似", command=self.callbacks.get('find_similar'))
+        similar_btn.pack(side=tk.LEFT, padx=5)
+        
+        policy_btn = ttk.Button(button_frame, text="规则清理", command=self.callbacks.get('apply_cleanup_policy'))
+        policy_btn.pack(side=tk.LEFT, padx=5)
+        
+        # 递归扫描子文件夹选项
+        recursive_var = tk.BooleanVar(value=False)
+        recursive_check = ttk.Checkbutton(path_frame, text="包含子文件夹", variable=recursive_var)
+        recursive_check.grid(row=1, column=1, padx=5, sticky=tk.W)
+        
         self.widgets['path_var'] = path_var
+        self.widgets['recursive_var'] = recursive_var
 
     def _create_filter_frame(self, parent):
         """创建图片筛选区域"""
@@ -110,6 +128,7 @@ class UIManager:
         ttk.Button(action_frame, text="保留 (Enter)", command=self.callbacks.get('keep_image')).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="删除 (Delete)", command=self.callbacks.get('delete_image')).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="撤销 (Ctrl+Z)", command=self.callbacks.get('undo_action')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="重做 (Ctrl+Y)", command=self.callbacks.get('redo_action')).pack(side=tk.LEFT, padx=5)
         
         # 待操作数量标签
         pending_label = ttk.Label(action_frame, text="待操作: 0", font=('Arial', 9))
@@ -118,19 +137,36 @@ class UIManager:
         # 应用按钮
         ttk.Button(action_frame, text="应用 (Ctrl+A)", command=self.callbacks.get('apply_operations')).pack(side=tk.RIGHT, padx=5)
         
-        # 备份/直接操作下拉选择框
+        # 备份/归档/直接操作下拉选择框
         switch_frame = ttk.Frame(action_frame)
         switch_frame.pack(side=tk.RIGHT, padx=10)
         
         ttk.Label(switch_frame, text="操作模式:").pack(side=tk.LEFT, padx=2)
         backup_var = tk.StringVar(value="备份")
-        mode_combobox = ttk.Combobox(switch_frame, textvariable=backup_var, values=["备份", "直接操作"], state="readonly", width=10)
+        mode_combobox = ttk.Combobox(switch_frame, textvariable=backup_var, values=["备份", "归档", "直接操作"], state="readonly", width=10)
         mode_combobox.pack(side=tk.LEFT, padx=2)
         
         self.widgets['pending_label'] = pending_label
         self.widgets['backup_var'] = backup_var
         self.widgets['mode_combobox'] = mode_combobox
 
+    def _create_progress_frame(self, parent):
+        """创建后台任务进度区域"""
+        progress_frame = ttk.Frame(parent)
+        progress_frame.pack(fill=tk.X, pady=2)
+        
+        progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=1)
+        progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        progress_label = ttk.Label(progress_frame, text="", width=36, font=('Arial', 9))
+        progress_label.pack(side=tk.LEFT, padx=5)
+        
+        cancel_btn = ttk.Button(progress_frame, text="取消", command=self.callbacks.get('cancel_task'))
+        cancel_btn.pack(side=tk.RIGHT, padx=5)
+        
+        self.widgets['progress_bar'] = progress_bar
+        self.widgets['progress_label'] = progress_label
+
     def _create_log_frame(self, parent):
         """创建日志区域"""
         log_frame = ttk.LabelFrame(parent, text="操作日志", padding="5")
@@ -169,6 +205,14 @@ class UIManager:
         """设置路径输入框的值"""
         self.widgets['path_var'].set(path)
 
+    def is_recursive_scan(self):
+        """获取是否递归扫描子文件夹"""
+        return self.widgets['recursive_var'].get()
+
+    def set_recursive_scan(self, value):
+        """设置是否递归扫描子文件夹"""
+        self.widgets['recursive_var'].set(value)
+
     def update_image_label(self, text):
         """更新图片索引标签"""
         self.widgets['image_label'].config(text=text)
@@ -185,6 +229,22 @@ class UIManager:
         """
         self.widgets['pending_label'].config(text=f"待操作: {count}")
 
+    def update_progress(self, done, total, text=""):
+        """更新进度条
+        
+        Args:
+            done: 已完成数量
+            total: 总数量
+            text: 进度条旁显示的文字
+        """
+        progress_bar = self.widgets['progress_bar']
+        progress_bar.config(maximum=max(total, 1), value=done)
+        self.widgets['progress_label'].config(text=text)
+
+    def reset_progress(self):
+        """清空进度条"""
+        self.update_progress(0, 1)
+
     def log_message(self, message):
         """添加日志消息
         
@@ -204,9 +264,11 @@ class UIManager:
         self.root.bind("<Delete>", lambda e: self.callbacks.get('delete_image')())
         self.root.bind("<Return>", lambda e: self.callbacks.get('keep_image')())
         self.root.bind("<Control-z>", lambda e: self.callbacks.get('undo_action')())
+        self.root.bind("<Control-y>", lambda e: self.callbacks.get('redo_action')())
         self.root.bind("<Control-a>", lambda e: self.callbacks.get('apply_operations')())
 
-    def bind_canvas_events(self, mouse_wheel_handler, mouse_down_handler, mouse_drag_handler, mouse_up_handler):
+    def bind_canvas_events(self, mouse_wheel_handler, mouse_down_handler, mouse_drag_handler, mouse_up_handler,
+                           resize_handler=None):
         """绑定画布鼠标事件
         
         Args:
@@ -214,12 +276,15 @@ class UIManager:
             mouse_down_handler: 鼠标按下事件处理器
             mouse_drag_handler: 鼠标拖动事件处理器
             mouse_up_handler: 鼠标释放事件处理器
+            resize_handler: 画布大小变化事件处理器
         """
         canvas = self.widgets['canvas']
         canvas.bind("<MouseWheel>", mouse_wheel_handler)
         canvas.bind("<Button-1>", mouse_down_handler)
         canvas.bind("<B1-Motion>", mouse_drag_handler)
         canvas.bind("<ButtonRelease-1>", mouse_up_handler)
+        if resize_handler:
+            canvas.bind("<Configure>", resize_handler)
 
     def show_error(self, title, message):
         """显示错误对话框"""
@@ -241,6 +306,18 @@ class UIManager:
         """
         return messagebox.askyesno(title, message)
 
+    def ask_yes_no_cancel(self, title, message):
+        """显示是/否/取消对话框
+        
+        Args:
+            title: 对话框标题
+            message: 提示信息
+            
+        Returns:
+            bool: 是返回True，否返回False，取消返回None
+        """
+        return messagebox.askyesnocancel(title, message)
+
     def ask_directory(self):
         """打开目录选择对话框
         
@@ -58,4 +58,23 @@ def delete_file(file_path):
         return True
     except Exception as e:
         print(f"删除文件失败: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def parse_image_name(filename):
+    """解析QQ缓存图片文件名，提取分组哈希和尺寸后缀
+    
+    第一种类型的图片以 "{file_hash}_0.ext" 或 "{file_hash}_720.ext" 命名
+    
+    Args:
+        filename: 文件名
+        
+    Returns:
+        tuple: (file_hash, suffix)，不匹配该命名模式时返回None
+    """
+    name_parts = filename.rsplit('.', 1)
+    if len(name_parts) == 2:
+        base_name = name_parts[0]
+        if '_0' in base_name or '_720' in base_name:
+            file_hash, suffix = base_name.rsplit('_', 1)
+            return file_hash, suffix
+    return None